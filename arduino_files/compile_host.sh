@@ -0,0 +1,19 @@
+#!/usr/bin/env bash
+set -e
+
+# Builds StepDetector.cpp + NeuralNetwork.cpp for the computer (not the board)
+# as a shared library used by real_time/firmware_lib.py.
+#
+# Usage: ./compile_host.sh [output.so]
+
+DIR="$(cd "$(dirname "$0")" && pwd)"
+OUTPUT="${1:-$DIR/host/libstepdetector.so}"
+CXX="${CXX:-g++}"
+
+echo "🔧 Compiling $OUTPUT ..."
+"$CXX" -O2 -shared -fPIC -std=c++11 \
+  -I "$DIR/host" -I "$DIR" \
+  "$DIR/StepDetector.cpp" "$DIR/NeuralNetwork.cpp" "$DIR/host/step_detector_capi.cpp" \
+  -o "$OUTPUT"
+
+echo "✅ Build complete!"
@@ -0,0 +1,14 @@
+// Minimal Arduino.h for building StepDetector.cpp / NeuralNetwork.cpp on the
+// host (see compile_host.sh). Only what those two files use.
+#ifndef ARDUINO_H_HOST_SHIM
+#define ARDUINO_H_HOST_SHIM
+
+#include <math.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <cmath>
+
+// abs() of a float, like the Arduino core (the C abs() would truncate to int)
+using std::abs;
+
+#endif // ARDUINO_H_HOST_SHIM
@@ -0,0 +1,61 @@
+// C ABI over the firmware StepDetector / NeuralNetwork, for Python (ctypes).
+// Whole arrays are processed per call so the per-sample cost stays in C++.
+#include "StepDetector.h"
+#include "NeuralNetwork.h"
+
+#include <string.h>
+
+enum {
+    STATE_LOOKING_FOR_FIRST_MAX = 0,
+    STATE_LOOKING_FOR_MIN = 1,
+    STATE_LOOKING_FOR_SECOND_MAX = 2
+};
+
+static uint8_t state_code(StepDetector* detector) {
+    const char* state = detector->getCurrentState();
+    if (strcmp(state, "LOOKING_FOR_MIN") == 0) return STATE_LOOKING_FOR_MIN;
+    if (strcmp(state, "LOOKING_FOR_SECOND_MAX") == 0) return STATE_LOOKING_FOR_SECOND_MAX;
+    return STATE_LOOKING_FOR_FIRST_MAX;
+}
+
+extern "C" {
+
+void* sd_create(float alpha, int window_size) {
+    StepDetector* detector = new StepDetector();
+    detector->setAlpha(alpha);
+    detector->setWindowSize(window_size);
+    return detector;
+}
+
+void sd_destroy(void* handle) {
+    delete static_cast<StepDetector*>(handle);
+}
+
+const char* sd_state(void* handle) {
+    return static_cast<StepDetector*>(handle)->getCurrentState();
+}
+
+// Feeds n samples. steps[i] = 1 if process() returned true for sample i and,
+// if states is not NULL, states[i] = state after the sample (STATE_* codes).
+// Returns the number of steps detected.
+long sd_process_array(void* handle, const float* ax, const float* ay, const float* az,
+                      long n, uint8_t* steps, uint8_t* states) {
+    StepDetector* detector = static_cast<StepDetector*>(handle);
+    long count = 0;
+    for (long i = 0; i < n; i++) {
+        bool step = detector->process(ax[i], ay[i], az[i]);
+        steps[i] = step ? 1 : 0;
+        count += step;
+        if (states != NULL) states[i] = state_code(detector);
+    }
+    return count;
+}
+
+// Step probability of n rows of 11 already scaled features.
+void nn_predict_array(const float* features, long n, float* probabilities) {
+    for (long i = 0; i < n; i++) {
+        probabilities[i] = neuralNet.predict(features + 11 * i);
+    }
+}
+
+}
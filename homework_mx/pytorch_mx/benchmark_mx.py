@@ -0,0 +1,264 @@
+# CPU timings of the MX emulation kernels against the reference code paths.
+#
+#   python benchmark_mx.py quantize --size 4096 --formats fp8_e4m3 int8
+#   python benchmark_mx.py elemwise
+#   python benchmark_mx.py lut --formats fp4_e2m1 fp6_e2m3
+#   python benchmark_mx.py cache --size 2048
+#   python benchmark_mx.py int_matmul --size 2048 --block-size 0
+#   python benchmark_mx.py ragged
+#   python benchmark_mx.py inplace --size 1024
+#   python benchmark_mx.py softmax --size 1024
+#   python benchmark_mx.py norm --size 1024
+
+from __future__ import print_function
+import argparse
+import time
+
+import torch
+import torch.nn.functional as F
+
+from mx import Linear, LayerNorm, RMSNorm, BatchNorm2d, GroupNorm, gelu, softmax
+from mx.specs import finalize_mx_specs
+from mx.formats import _get_format_params
+from mx.mx_ops import quantize_mx_op, _quantize_mx, _quantize_mx_lut, _lut_encode
+from mx.elemwise_ops import _quantize_elemwise, _quantize_elemwise_core
+from mx.int_matmul import (
+    INT_MATMUL_MIN_BLOCK, use_int_matmul, int_operand_op, int_matmul_op)
+
+
+def timeit(fn, repeats):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def report(name, baseline, candidates):
+    print(f"{name:<28} {'reference':<10} {baseline * 1e3:9.1f} ms")
+    for label, seconds in candidates:
+        print(f"{'':<28} {label:<10} {seconds * 1e3:9.1f} ms  ({baseline / seconds:.2f}x)")
+
+
+def bench_quantize(args):
+    x = torch.randn(args.size, args.size)
+    for fmt in args.formats:
+        def run(**kwargs):
+            return lambda: _quantize_mx(x, 8, fmt, block_size=args.block_size,
+                                        axes=[-1], round=args.round, **kwargs)
+        assert torch.equal(run()(), run(fused_cpu=True)()), fmt
+        report(f"quantize_mx {fmt}", timeit(run(), args.repeats),
+               [("fused", timeit(run(fused_cpu=True), args.repeats)),
+                ("bits", timeit(run(exp_method="bits"), args.repeats)),
+                ("fused+bits", timeit(run(fused_cpu=True, exp_method="bits"), args.repeats))])
+
+
+def bench_elemwise(args):
+    x = torch.randn(args.size, args.size)
+    for fmt in ["bfloat16", "fp8_e4m3"]:
+        def run(**kwargs):
+            return lambda: _quantize_elemwise(x, fmt, round=args.round, **kwargs)
+        report(f"quantize_elemwise {fmt}", timeit(run(), args.repeats),
+               [("bits", timeit(run(exp_method="bits"), args.repeats))])
+
+
+def bench_lut(args):
+    x = torch.randn(args.size, args.size)
+    for fmt in args.formats:
+        ebits, mbits, emax, max_norm, _ = _get_format_params(fmt)
+        # Element step only, on values already divided by a block scale
+        scaled = x * (2**emax / 4)
+        core = lambda: _quantize_elemwise_core(
+            scaled, mbits, ebits, max_norm, round=args.round,
+            saturate_normals=True, exp_method="bits")
+        lut = lambda: _lut_encode(scaled, fmt, round=args.round)
+        assert torch.equal(core(), lut()[0]), fmt
+        report(f"elemwise_core {fmt}", timeit(core, args.repeats),
+               [("lut", timeit(lut, args.repeats))])
+
+        mx = lambda: _quantize_mx(x, 8, fmt, block_size=args.block_size, axes=[-1],
+                                  round=args.round, exp_method="bits")
+        mx_lut = lambda: _quantize_mx_lut(x, 8, fmt, block_size=args.block_size,
+                                          axes=[-1], round=args.round)
+        report(f"quantize_mx {fmt}", timeit(mx, args.repeats),
+               [("lut", timeit(mx_lut, args.repeats))])
+
+
+def bench_cache(args):
+    x = torch.randn(8, args.size)
+    for fmt in args.formats:
+        specs = {"w_elem_format": fmt, "a_elem_format": fmt, "bfloat": 16,
+                 "block_size": args.block_size, "round_mx_output": args.round}
+        layers = []
+        for cache_weights in (False, True):
+            mx_specs = finalize_mx_specs(dict(specs, cache_weights=cache_weights))
+            layer = Linear(args.size, args.size, mx_specs=mx_specs).eval()
+            layers.append(layer)
+        layers[1].load_state_dict(layers[0].state_dict())
+
+        with torch.no_grad():
+            assert torch.equal(layers[0](x), layers[1](x)), fmt
+            report(f"linear eval {fmt}", timeit(lambda: layers[0](x), args.repeats),
+                   [("cached", timeit(lambda: layers[1](x), args.repeats))])
+
+
+def bench_int_matmul(args):
+    x = torch.randn(8 * args.size, args.size)
+    w = torch.randn(args.size, args.size)
+    for fmt in args.formats:
+        specs = {"w_elem_format": fmt, "a_elem_format": fmt, "bfloat": 16,
+                 "block_size": args.block_size, "round_mx_output": args.round,
+                 "exp_method": "bits", "cache_weights": True}
+        mx_specs = finalize_mx_specs(dict(specs, int_matmul=True))
+        if not use_int_matmul(mx_specs, fmt, fmt, x):
+            print(f"int_matmul {fmt}: needs an int format and block size 0 "
+                  f"or >= {INT_MATMUL_MIN_BLOCK}")
+            continue
+
+        # Operand quantization and matmul only
+        emulated = lambda: F.linear(
+            quantize_mx_op(x, mx_specs, fmt, axes=[-1], round=args.round),
+            quantize_mx_op(w, mx_specs, fmt, axes=[-1], round=args.round))
+        int_mm = lambda: int_matmul_op(
+            int_operand_op(x, mx_specs, fmt, round=args.round),
+            int_operand_op(w, mx_specs, fmt, round=args.round))
+        assert torch.allclose(emulated(), int_mm(), rtol=1e-4, atol=1e-3), fmt
+        report(f"mx matmul {fmt}", timeit(emulated, args.repeats),
+               [("int_mm", timeit(int_mm, args.repeats))])
+
+        # Whole layer, weights cached in both
+        layers = [Linear(args.size, args.size, mx_specs=finalize_mx_specs(specs)).eval()]
+        layers.append(Linear(args.size, args.size, mx_specs=mx_specs).eval())
+        layers[1].load_state_dict(layers[0].state_dict())
+        with torch.no_grad():
+            report(f"linear eval {fmt}", timeit(lambda: layers[0](x), args.repeats),
+                   [("int_mm", timeit(lambda: layers[1](x), args.repeats))])
+
+
+def bench_ragged(args):
+    # Block axes that are not a multiple of the block size
+    cases = [("conv input C=3", (32, 3, 112, 112), 1),
+             ("conv weight C=1", (64, 1, 5, 5), 1),
+             ("linear K+8", (args.size, args.size + 8), -1)]
+    for name, shape, axis in cases:
+        x = torch.randn(shape)
+
+        def padded():
+            X = x.movedim(axis, -1)
+            length = X.shape[-1]
+            X = F.pad(X, (0, -length % args.block_size))
+            X = _quantize_mx(X, 8, "fp8_e4m3", block_size=args.block_size,
+                             axes=[-1], round=args.round)
+            return X[..., :length].movedim(-1, axis)
+        ragged = lambda: _quantize_mx(x, 8, "fp8_e4m3", block_size=args.block_size,
+                                      axes=[axis], round=args.round)
+        assert torch.equal(padded(), ragged()), name
+        report(f"quantize_mx {name}", timeit(padded, args.repeats),
+               [("no pad", timeit(ragged, args.repeats))])
+
+
+def bench_inplace(args):
+    x = torch.randn(16, args.size, 256)
+    for name in ["gelu", "softmax", "layernorm"]:
+        fns = []
+        for vec_inplace in (False, True):
+            mx_specs = finalize_mx_specs({"bfloat": 16, "round": args.round,
+                                          "vec_inplace": vec_inplace})
+            if name == "gelu":
+                fns.append(lambda s=mx_specs: gelu(x, mx_specs=s))
+            elif name == "softmax":
+                fns.append(lambda s=mx_specs: softmax(x, dim=-1, mx_specs=s))
+            else:
+                fns.append(lambda l=LayerNorm(256, mx_specs=mx_specs): l(x))
+
+        with torch.no_grad():
+            assert torch.equal(fns[0](), fns[1]()), name
+            report(f"{name} forward", timeit(fns[0], args.repeats),
+                   [("inplace", timeit(fns[1], args.repeats))])
+
+
+def bench_softmax(args):
+    # Attention scores, softmax over the keys
+    x = torch.randn(16, args.size, args.size) * 4
+    g = torch.randn_like(x)
+    fns = []
+    for softmax_fused in (False, True):
+        mx_specs = finalize_mx_specs({"bfloat": 16, "round": args.round,
+                                      "softmax_fused": softmax_fused})
+        fns.append(lambda s=mx_specs: softmax(x, dim=-1, mx_specs=s))
+
+    with torch.no_grad():
+        assert torch.equal(fns[0](), fns[1]())
+        report("softmax forward", timeit(fns[0], args.repeats),
+               [("fused", timeit(fns[1], args.repeats))])
+
+    def train(fn):
+        x.requires_grad_()
+        fn().backward(g)
+        x.requires_grad_(False)
+        x.grad = None
+    report("softmax forward+backward", timeit(lambda: train(fns[0]), args.repeats),
+           [("fused", timeit(lambda: train(fns[1]), args.repeats))])
+
+
+def bench_norm(args):
+    cases = [("layernorm", lambda s: LayerNorm(1024, mx_specs=s), (16, args.size, 1024)),
+             ("rmsnorm", lambda s: RMSNorm(1024, mx_specs=s), (16, args.size, 1024)),
+             ("batchnorm2d", lambda s: BatchNorm2d(64, mx_specs=s), (32, 64, 56, 56)),
+             ("groupnorm", lambda s: GroupNorm(8, 64, mx_specs=s), (32, 64, 56, 56))]
+    for name, layer, shape in cases:
+        x = torch.randn(shape)
+        g = torch.randn(shape)
+        fns = []
+        for norm_fused in (False, True):
+            mx_specs = finalize_mx_specs({"bfloat": 16, "round": args.round,
+                                          "norm_fused": norm_fused})
+            fns.append(layer(mx_specs))
+
+        def train(fn):
+            x.requires_grad_()
+            fn(x).backward(g)
+            x.requires_grad_(False)
+            x.grad = None
+        with torch.no_grad():
+            assert torch.equal(fns[0](x), fns[1](x)), name
+        report(f"{name} forward+backward", timeit(lambda: train(fns[0]), args.repeats),
+               [("fused", timeit(lambda: train(fns[1]), args.repeats))])
+
+
+BENCHMARKS = {
+    "quantize": bench_quantize,
+    "elemwise": bench_elemwise,
+    "lut": bench_lut,
+    "cache": bench_cache,
+    "int_matmul": bench_int_matmul,
+    "ragged": bench_ragged,
+    "inplace": bench_inplace,
+    "softmax": bench_softmax,
+    "norm": bench_norm,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MX CPU kernel benchmarks")
+    parser.add_argument("benchmarks", nargs="*", help=f"any of {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--size", type=int, default=4096, help="inputs are size x size")
+    parser.add_argument("--block-size", type=int, default=32)
+    parser.add_argument("--formats", nargs="+", default=["fp8_e4m3", "fp6_e2m3", "fp4_e2m1", "int8"])
+    parser.add_argument("--round", default="nearest")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark '{name}'")
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    print(f"torch {torch.__version__}, {torch.get_num_threads()} threads")
+    for name in args.benchmarks or BENCHMARKS:
+        BENCHMARKS[name](args)
+
+
+if __name__ == "__main__":
+    main()
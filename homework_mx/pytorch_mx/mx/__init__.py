@@ -8,6 +8,7 @@ from .specs import add_mx_args, finalize_mx_specs
 from .specs import get_mx_specs, get_backwards_mx_specs
 
 from .quantize import quantize_bfloat
+from .mx_tensor import MXTensor
 
 from .linear import Linear, linear
 from .matmul import matmul
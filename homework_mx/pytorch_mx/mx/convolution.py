@@ -13,6 +13,7 @@ from .mx_ops import quantize_mx_op
 from .elemwise_ops import quantize_elemwise_op
 from .specs import apply_mx_specs, get_backwards_mx_specs
 from .specs import mx_assert_test
+from .weight_cache import WeightCache
 
 f_conv1d = torch.nn.functional.conv1d
 f_conv2d = torch.nn.functional.conv2d
@@ -124,6 +125,7 @@ class ConvFunction(torch.autograd.Function):
         groups=1,
         mx_specs=None,
         name=None,
+        weight_cache=None,
     ):
         # input: input tensor (minibatch x in_channels x ...)
         # weight: weight tensor (out_channels x in_channels/groups x ...)
@@ -153,17 +155,33 @@ class ConvFunction(torch.autograd.Function):
             input, mx_specs=mx_specs, round=mx_specs["round_output"]
         )
 
-        # element-wise quantize for weight and bias
-        bf_weight = quantize_elemwise_op(
-            weight, mx_specs=mx_specs, round=mx_specs["round_weight"]
-        )
+        def quantize_weights():
+            # element-wise quantize for weight and bias
+            bf_weight = quantize_elemwise_op(
+                weight, mx_specs=mx_specs, round=mx_specs["round_weight"]
+            )
 
-        if bias is not None:
-            bf_bias = quantize_elemwise_op(
-                bias, mx_specs=mx_specs, round=mx_specs["round_weight"]
+            if bias is not None:
+                bf_bias = quantize_elemwise_op(
+                    bias, mx_specs=mx_specs, round=mx_specs["round_weight"]
+                )
+            else:
+                bf_bias = None
+
+            # MX quantize the weight along in_channels
+            qid_weight = quantize_mx_op(
+                bf_weight,
+                mx_specs,
+                elem_format=mx_specs['w_elem_format'],
+                axes=[1],
             )
+            return bf_weight, bf_bias, qid_weight
+
+        if weight_cache is not None:
+            bf_weight, bf_bias, qid_weight = weight_cache.get(
+                [weight, bias], mx_specs, quantize_weights)
         else:
-            bf_bias = None
+            bf_weight, bf_bias, qid_weight = quantize_weights()
 
         # save context after quantize
         if mx_specs["quantize_backprop"]:
@@ -185,12 +203,6 @@ class ConvFunction(torch.autograd.Function):
             elem_format=mx_specs['a_elem_format'],
             axes=[1],
         )
-        qid_weight = quantize_mx_op(
-            bf_weight,
-            mx_specs,
-            elem_format=mx_specs['w_elem_format'],
-            axes=[1],
-        )
 
         # compute output
         output = fwd_func(
@@ -308,7 +320,7 @@ class ConvFunction(torch.autograd.Function):
                 round=ctx.mx_specs["round_grad_weight"],
             )
 
-        return (grad_input, grad_weight, grad_bias, None, None, None, None, None, None)
+        return (grad_input, grad_weight, grad_bias, None, None, None, None, None, None, None)
 
 
 def conv1d(
@@ -420,6 +432,7 @@ class Conv1d(torch.nn.Conv1d):
 
         self.name = name
         self.mx_specs = apply_mx_specs(mx_specs)
+        self.weight_cache = WeightCache()
 
         super().__init__(
             in_channels,
@@ -454,6 +467,7 @@ class Conv1d(torch.nn.Conv1d):
             self.groups,
             self.mx_specs,
             self.name,
+            self.weight_cache if self.mx_specs["cache_weights"] else None,
         )
 
 
@@ -476,6 +490,7 @@ class Conv2d(torch.nn.Conv2d):
 
         self.name = name
         self.mx_specs = apply_mx_specs(mx_specs)
+        self.weight_cache = WeightCache()
 
         super(Conv2d, self).__init__(
             in_channels,
@@ -510,6 +525,7 @@ class Conv2d(torch.nn.Conv2d):
             self.groups,
             self.mx_specs,
             self.name,
+            self.weight_cache if self.mx_specs["cache_weights"] else None,
         )
 
 
@@ -532,6 +548,7 @@ class Conv3d(torch.nn.Conv3d):
 
         self.name = name
         self.mx_specs = apply_mx_specs(mx_specs)
+        self.weight_cache = WeightCache()
 
         super(Conv3d, self).__init__(
             in_channels,
@@ -566,4 +583,5 @@ class Conv3d(torch.nn.Conv3d):
             self.groups,
             self.mx_specs,
             self.name,
+            self.weight_cache if self.mx_specs["cache_weights"] else None,
         )
@@ -16,11 +16,27 @@ Usage Notes:
 Exposed Methods:
     quantize_elemwise_op - quantizes a tensor to bfloat or other
                            custom float format
+    clear_workspace - frees the scratch buffers of in-place quantization
+
+Exponent methods:
+    "log2" - floor(log2(|x|)) with torch.log2 and powers of two with
+             torch.pow (the original implementation)
+    "bits" - exponents read from the IEEE-754 exponent field of int32
+             views and powers of two built from bits. Exact: torch.log2
+             rounds up for values a few ulps below a power of two
+             (e.g. 4 * (1 - 2**-24)), where the two methods differ; the
+             bits method then matches the C++/CUDA kernels. Only used for
+             float32 inputs, other dtypes fall back to "log2".
 """
 import torch
 
 from .formats import RoundingMode, _get_format_params
 from .formats import _get_min_norm, _get_max_norm
+from .formats import FP32_EXPONENT_BIAS
+
+FP32_MANTISSA_BITS = 23
+FP32_EXP_FIELD = 0x7F800000
+EXP_METHODS = ("log2", "bits")
 
 
 # -------------------------------------------------------------------------
@@ -42,6 +58,45 @@ def _safe_rshift(x, bits, exp):
         return x / (2**bits) * (2 ** exp)
 
 
+def _use_bits(A, exp_method):
+    if exp_method not in EXP_METHODS:
+        raise Exception("Unrecognized exp_method %s" % (exp_method))
+    return exp_method == "bits" and A.dtype == torch.float32
+
+
+def _floor_log2(A):
+    """
+    floor(log2(A)) of a non-negative float32 tensor from its exponent
+    field, exact for normals and subnormals. 0 -> -Inf, Inf/NaN pass through.
+    """
+    biased = A.view(torch.int32) >> FP32_MANTISSA_BITS
+    exp = (biased - FP32_EXPONENT_BIAS).type(A.dtype)
+
+    subnorm = biased == 0
+    if subnorm.any():
+        # 2**64 makes fp32 subnormals normal without rounding
+        scaled = (A * 2.0**64).view(torch.int32) >> FP32_MANTISSA_BITS
+        exp = torch.where(subnorm, (scaled - FP32_EXPONENT_BIAS - 64).type(A.dtype), exp)
+        exp = exp.masked_fill(A == 0, -float("Inf"))
+
+    special = biased == 2 * FP32_EXPONENT_BIAS + 1
+    if special.any():
+        exp = torch.where(special, A, exp)
+    return exp
+
+
+def _pow2_floor_log2(A, min_exp):
+    """
+    2**clip(floor(log2(|A|)), min_exp, 127) for a float32 tensor, built by
+    masking the exponent field (two integer ops, no transcendentals).
+    Zeros and subnormals get 2**min_exp, Inf/NaN get 2**127.
+    """
+    field = A.view(torch.int32) & FP32_EXP_FIELD
+    field.clamp_(min=(min_exp + FP32_EXPONENT_BIAS) << FP32_MANTISSA_BITS,
+                 max=(2 * FP32_EXPONENT_BIAS) << FP32_MANTISSA_BITS)
+    return field.view(A.dtype)
+
+
 def _round_mantissa(A, bits, round, clamp=False):
     """
     Rounds mantissa to nearest bits depending on the rounding method 'round'
@@ -76,12 +131,55 @@ def _round_mantissa(A, bits, round, clamp=False):
     return A
 
 
+def _round_mantissa_(A, round, sign=None, tmp=None):
+    """In-place _round_mantissa (without clamp), same operations in the
+    same order so the results are bit-identical. sign and tmp are
+    optional scratch tensors shaped like A"""
+    sign = torch.sign(A, out=sign) if sign is not None else torch.sign(A)
+    if round == "floor":
+        A.abs_().floor_()
+    elif round == "nearest":
+        A.abs_().add_(0.5).floor_()
+    elif round == "even":
+        # find 0.5, 2.5, 4.5 ...
+        maskA = torch.abs(A, out=tmp) if tmp is not None else torch.abs(A)
+        maskA.sub_(0.5).remainder_(2).eq_(0)
+        A.abs_().add_(0.5).floor_().sub_(maskA)
+    else:
+        raise Exception("Unrecognized round method %s" % (round))
+    return A.mul_(sign)
+
+
+# -------------------------------------------------------------------------
+# Workspace for the in-place quantizer
+# -------------------------------------------------------------------------
+_WORKSPACE = {}
+
+
+def _workspace(A, slot):
+    """Scratch tensor shaped like A. Each (slot, dtype, device) keeps one
+    buffer, grown to the largest tensor seen, so repeated calls reuse
+    memory instead of allocating. Contents are only valid until the
+    next call with the same slot."""
+    key = (slot, A.dtype, A.device)
+    buf = _WORKSPACE.get(key)
+    if buf is None or buf.numel() < A.numel():
+        buf = torch.empty(A.numel(), dtype=A.dtype, device=A.device)
+        _WORKSPACE[key] = buf
+    return buf[:A.numel()].view(A.shape)
+
+
+def clear_workspace():
+    """Frees the buffers held for in-place quantization"""
+    _WORKSPACE.clear()
+
+
 # -------------------------------------------------------------------------
 # Main funcs
 # -------------------------------------------------------------------------
 def _quantize_elemwise_core(A, bits, exp_bits, max_norm, round='nearest',
                             saturate_normals=False, allow_denorm=True,
-                            custom_cuda=False):
+                            custom_cuda=False, exp_method="log2"):
     """ Core function used for element-wise quantization
     Arguments:
       A         {PyTorch tensor} -- A tensor to be quantized
@@ -96,6 +194,7 @@ def _quantize_elemwise_core(A, bits, exp_bits, max_norm, round='nearest',
       allow_denorm     {bool}    -- If False, flush denorm numbers in the
                                     elem_format to zero.
       custom_cuda      {str}     -- If True, use custom CUDA kernels
+      exp_method       {str}     -- "log2" or "bits", see the module docstring
     Returns:
       quantized tensor {PyTorch tensor} -- A tensor that has been quantized
     """
@@ -131,23 +230,32 @@ def _quantize_elemwise_core(A, bits, exp_bits, max_norm, round='nearest',
     else:
         out = A
 
-    if exp_bits != 0:
-        private_exp = torch.floor(torch.log2(
-            torch.abs(A) + (A == 0).type(A.dtype)))
-
-        # The minimum representable exponent for 8 exp bits is -126
-        min_exp = -(2**(exp_bits-1)) + 2
-        private_exp = private_exp.clip(min=min_exp)
+    # The minimum representable exponent for 8 exp bits is -126
+    min_exp = -(2**(exp_bits-1)) + 2
+
+    if exp_bits != 0 and _use_bits(A, exp_method):
+        # Same scaling as _safe_lshift/_safe_rshift with 2**private_exp
+        # built once from bits. Zeros get 2**min_exp instead of 2**0, the
+        # result is 0 either way; Inf/NaN are fixed up below as before.
+        pow2_exp = _pow2_floor_log2(A, min_exp)
+        out = out / pow2_exp * (2**(bits - 2))
+        out = _round_mantissa(out, bits, round, clamp=False)
+        out = out / (2**(bits - 2)) * pow2_exp
     else:
-        private_exp = None
+        if exp_bits != 0:
+            private_exp = torch.floor(torch.log2(
+                torch.abs(A) + (A == 0).type(A.dtype)))
+            private_exp = private_exp.clip(min=min_exp)
+        else:
+            private_exp = None
 
-    # Scale up so appropriate number of bits are in the integer portion of the number
-    out = _safe_lshift(out, bits - 2, private_exp)
+        # Scale up so appropriate number of bits are in the integer portion of the number
+        out = _safe_lshift(out, bits - 2, private_exp)
 
-    out = _round_mantissa(out, bits, round, clamp=False)
+        out = _round_mantissa(out, bits, round, clamp=False)
 
-    # Undo scaling
-    out = _safe_rshift(out, bits - 2, private_exp)
+        # Undo scaling
+        out = _safe_rshift(out, bits - 2, private_exp)
 
     # Set values > max_norm to Inf if desired, else clamp them
     if saturate_normals or exp_bits == 0:
@@ -170,8 +278,74 @@ def _quantize_elemwise_core(A, bits, exp_bits, max_norm, round='nearest',
     return out
 
 
+def _inplace_supported(A, round, custom_cuda):
+    """Cases handled by _quantize_elemwise_core_"""
+    return (
+        torch.is_tensor(A)
+        and not A.is_sparse
+        and A.is_floating_point()
+        and A.dim() > 0
+        and round in RoundingMode.string_enums()
+        and not custom_cuda
+        # In-place ops on tensors autograd tracks are not allowed
+        and not (A.requires_grad and torch.is_grad_enabled())
+    )
+
+
+def _quantize_elemwise_core_(A, bits, exp_bits, max_norm, round='nearest',
+                             allow_denorm=True, exp_method="log2"):
+    """In-place _quantize_elemwise_core for saturate_normals=False and
+    exp_bits > 0 (bfloat and fp formats). Bit-identical. Temporaries come
+    from the workspace. A must be a tensor the caller owns."""
+    assert exp_bits > 0 and round in RoundingMode.string_enums()
+    exp = _workspace(A, 0)
+    sign = _workspace(A, 1)
+    tmp = _workspace(A, 2)
+
+    # Flush values < min_norm to zero if denorms are not allowed
+    if not allow_denorm:
+        min_norm = _get_min_norm(exp_bits)
+        A.mul_(torch.abs(A, out=tmp).ge_(min_norm))
+
+    # The minimum representable exponent for 8 exp bits is -126
+    min_exp = -(2**(exp_bits-1)) + 2
+
+    if _use_bits(A, exp_method):
+        # As in _pow2_floor_log2. Infs get 2**127 and stay Inf through
+        # the steps below, so they need no fix-up.
+        torch.bitwise_and(A.view(torch.int32), FP32_EXP_FIELD,
+                          out=exp.view(torch.int32))
+        exp.view(torch.int32).clamp_(
+            min=(min_exp + FP32_EXPONENT_BIAS) << FP32_MANTISSA_BITS,
+            max=(2 * FP32_EXPONENT_BIAS) << FP32_MANTISSA_BITS)
+        infs = None
+    else:
+        # Infs get 2**Inf and turn into NaN, restore them at the end
+        infs = torch.isinf(A)
+        infs = (infs, A[infs]) if infs.any() else None
+
+        torch.abs(A, out=exp).add_(A == 0)
+        exp.log2_().floor_().clamp_(min=min_exp)
+        torch.pow(2, exp, out=exp)
+
+    # Same as _safe_lshift, _round_mantissa and _safe_rshift
+    A.div_(exp).mul_(2**(bits - 2))
+    _round_mantissa_(A, round, sign=sign, tmp=tmp)
+    A.div_(2**(bits - 2)).mul_(exp)
+
+    # Set values > max_norm to Inf
+    big = torch.abs(A, out=tmp) > max_norm
+    if big.any():
+        A.copy_(torch.where(big, torch.sign(A) * float("Inf"), A))
+
+    if infs is not None:
+        A[infs[0]] = infs[1]
+    return A
+
+
 def _quantize_elemwise(A, elem_format, round='nearest', custom_cuda=False,
-                       saturate_normals=False, allow_denorm=True):
+                       saturate_normals=False, allow_denorm=True,
+                       exp_method="log2"):
     """ Quantize values to a defined format. See _quantize_elemwise_core()
     """
     if elem_format == None:
@@ -183,12 +357,13 @@ def _quantize_elemwise(A, elem_format, round='nearest', custom_cuda=False,
             A, mbits, ebits, max_norm,
             round=round, allow_denorm=allow_denorm,
             saturate_normals=saturate_normals,
-            custom_cuda=custom_cuda)
+            custom_cuda=custom_cuda, exp_method=exp_method)
 
     return output
 
 
-def _quantize_bfloat(A, bfloat, round='nearest', custom_cuda=False, allow_denorm=True):
+def _quantize_bfloat(A, bfloat, round='nearest', custom_cuda=False, allow_denorm=True,
+                     exp_method="log2"):
     """ Quantize values to bfloatX format
     Arguments:
       bfloat      {int}       -- Total number of bits for bfloatX format,
@@ -203,11 +378,13 @@ def _quantize_bfloat(A, bfloat, round='nearest', custom_cuda=False, allow_denorm
 
     return _quantize_elemwise_core(
             A, bits=bfloat-7, exp_bits=8, max_norm=max_norm, round=round,
-            allow_denorm=allow_denorm, custom_cuda=custom_cuda)
+            allow_denorm=allow_denorm, custom_cuda=custom_cuda,
+            exp_method=exp_method)
 
 
 def _quantize_fp(A, exp_bits=None, mantissa_bits=None,
-                 round='nearest', custom_cuda=False, allow_denorm=True):
+                 round='nearest', custom_cuda=False, allow_denorm=True,
+                 exp_method="log2"):
     """ Quantize values to IEEE fpX format. The format defines NaN/Inf
         and subnorm numbers in the same way as FP32 and FP16.
     Arguments:
@@ -225,18 +402,20 @@ def _quantize_fp(A, exp_bits=None, mantissa_bits=None,
     output = _quantize_elemwise_core(
             A, bits=mantissa_bits + 2, exp_bits=exp_bits,
             max_norm=max_norm, round=round, allow_denorm=allow_denorm,
-            custom_cuda=custom_cuda)
+            custom_cuda=custom_cuda, exp_method=exp_method)
 
     return output
 
 
-def quantize_elemwise_op(A, mx_specs, round=None):
+def quantize_elemwise_op(A, mx_specs, round=None, inplace=False):
     """A function used for element-wise quantization with mx_specs
     Arguments:
       A          {PyTorch tensor} -- a tensor that needs to be quantized
       mx_specs {dictionary}     -- dictionary to specify mx_specs
       round      {str}            -- Rounding mode, choose from (floor, nearest, even)
                                      (default: "nearest")
+      inplace    {bool}           -- A is a temporary owned by the caller:
+                                     quantize it in place when possible
     Returns:
       quantized value {PyTorch tensor} -- a tensor that has been quantized
     """
@@ -250,18 +429,35 @@ def quantize_elemwise_op(A, mx_specs, round=None):
         and mx_specs['bfloat_subnorms'] == True:
         return A.to(torch.bfloat16)
 
+    inplace = inplace and \
+        _inplace_supported(A, round, mx_specs['custom_cuda'])
+
     if mx_specs['bfloat'] > 0 and mx_specs['fp'] > 0:
         raise ValueError("Cannot set both [bfloat] and [fp] in mx_specs.")
+    elif 9 < mx_specs['bfloat'] < 32 and inplace:
+        bits = mx_specs['bfloat'] - 7
+        A = _quantize_elemwise_core_(
+            A, bits, 8, _get_max_norm(8, bits), round=round,
+            allow_denorm=mx_specs['bfloat_subnorms'],
+            exp_method=mx_specs['exp_method'])
+    elif mx_specs['fp'] > 6 and inplace:
+        bits = mx_specs['fp'] - 4
+        A = _quantize_elemwise_core_(
+            A, bits, 5, _get_max_norm(5, bits), round=round,
+            allow_denorm=mx_specs['bfloat_subnorms'],
+            exp_method=mx_specs['exp_method'])
     elif mx_specs['bfloat'] > 9:
         A = _quantize_bfloat(A, bfloat=mx_specs['bfloat'], round=round,
                              custom_cuda=mx_specs['custom_cuda'],
-                             allow_denorm=mx_specs['bfloat_subnorms'])
+                             allow_denorm=mx_specs['bfloat_subnorms'],
+                             exp_method=mx_specs['exp_method'])
     elif mx_specs['bfloat'] > 0 and mx_specs['bfloat'] <= 9:
         raise ValueError("Cannot set [bfloat] <= 9 in mx_specs.")
     elif mx_specs['fp'] > 6:
         A = _quantize_fp(A, exp_bits=5, mantissa_bits=mx_specs['fp'] - 6,
                          round=round, custom_cuda=mx_specs['custom_cuda'],
-                         allow_denorm=mx_specs['bfloat_subnorms'])
+                         allow_denorm=mx_specs['bfloat_subnorms'],
+                         exp_method=mx_specs['exp_method'])
     elif mx_specs['fp'] > 0 and mx_specs['fp'] <= 6:
         raise ValueError("Cannot set [fp] <= 6 in mx_specs.")
     return A
@@ -10,6 +10,8 @@ from .vector_ops import *
 from .specs import apply_mx_specs, get_backwards_mx_specs
 from .specs import mx_assert_test
 from .norm_utils import _norm_forward, _norm_backward
+from .norm_utils import _norm_fused_supported, _norm_forward_fused
+from .norm_utils import _norm_backward_fused
 
 f_group_norm = F.group_norm
 
@@ -32,14 +34,22 @@ class GroupNormFunction(torch.autograd.Function):
 
         sum_axes = list(range(1, x.ndim))
 
+        ctx.norm_fused = _norm_fused_supported(
+                mx_specs, x, bf_weight, bf_bias)
+        norm_forward = _norm_forward_fused if ctx.norm_fused \
+            else _norm_forward
+
         output, x_shift, x_norm, x_std_inv, _, _ = \
-                _norm_forward(
+                norm_forward(
                         x, sum_axes, bf_weight, bf_bias, eps,
                         mx_specs,
                         groups=num_groups,
                         weight_axis=1)
 
-        # stash for backprop
+        # stash for backprop, the fused backward recomputes x_norm
+        if ctx.norm_fused:
+            ctx.fwd_mx_specs = mx_specs
+            x_norm = None
         if mx_specs['quantize_backprop']:
             ctx.save_for_backward(x_shift, x_norm, x_std_inv, bf_weight)
         else:
@@ -55,6 +65,15 @@ class GroupNormFunction(torch.autograd.Function):
         # get stashed intermediate
         x_shift, x_norm, x_std_inv, weight = ctx.saved_tensors
 
+        if ctx.norm_fused:
+            grad_input, grad_weight, grad_bias = _norm_backward_fused(
+                    grad_output, list(range(1, grad_output.ndim)),
+                    weight, x_shift, x_std_inv,
+                    ctx.mx_specs, ctx.fwd_mx_specs,
+                    groups=ctx.num_groups, weight_axis=1)
+            return (grad_input, None, grad_weight, grad_bias,
+                    None, None, None)
+
         grad_output = vec_quantize(grad_output, mx_specs=ctx.mx_specs)
 
         # grad_bias
@@ -0,0 +1,141 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Name:    int_matmul.py
+
+Integer-domain matmul for MX integer element formats.
+
+LinearFunction and MatMulFunction dequantize both MX operands to fp32
+and multiply them with torch.matmul. When both operands use an integer
+element format, every element is an integer code times the power-of-two
+scale of its block. This engine keeps the codes as int8, multiplies them
+one K-block at a time with an int32-accumulating matmul (exact), and
+applies the product of the two block scales to each partial result:
+
+    out[m, n] = sum_k  2**(ea[m, k] + eb[n, k]) * (Ca[m, k] @ Cb[n, k])
+
+where k runs over the blocks of the dot product dimension.
+
+Exposed Methods:
+    use_int_matmul - whether the engine applies to a matmul
+    int_operand_op - MX-quantizes a tensor along its last dim to codes
+    int_matmul_op - multiplies two operands from int_operand_op
+
+Usage Notes:
+ - Enabled by the "int_matmul" spec for int8/int4/int2 operands with
+   "shared_exp_method" max, fp32 inputs and blocks of at least
+   INT_MATMUL_MIN_BLOCK elements (or block_size 0). With smaller blocks
+   the per-block scaling passes over the output cost more than the int8
+   matmul saves, so the fp32 path is kept.
+ - The operands are quantized like quantize_mx_op(..., exp_method="bits").
+   Each block product is exact; the fp32 sum over blocks is in a
+   different order than torch.matmul, so results match the emulated path
+   to fp32 rounding (about K * 2**-24 relative to sum |a * b|).
+ - Block products are converted to fp32, which is exact while
+   block_size * (2**(mbits-1) - 1)**2 < 2**24 (up to 1040 for int8).
+"""
+
+import torch
+import torch.nn.functional as F
+
+from .formats import ElemFormat, _get_format_params
+from .mx_ops import _lut_encode, _lut_shared_exponents
+
+INT_FORMATS = (ElemFormat.int8, ElemFormat.int4, ElemFormat.int2)
+
+INT_MATMUL_MIN_BLOCK = 256
+
+
+def _int_mm(a, b):
+    """a (M, K) int8 @ b (K, N) int8 -> (M, N) int32"""
+    if a.is_cpu and hasattr(torch, "_int_mm"):
+        return torch._int_mm(a, b)
+    # fp32 products of int8 codes are exact up to 2**24
+    return torch.matmul(a.float(), b.float()).int()
+
+
+def use_int_matmul(mx_specs, elem_format1, elem_format2, *tensors):
+    """ True if the "int_matmul" engine applies to these operands """
+    if not mx_specs["int_matmul"]:
+        return False
+    if mx_specs["shared_exp_method"] != "max":
+        return False
+    block_size = mx_specs["block_size"]
+    if 0 < block_size < INT_MATMUL_MIN_BLOCK:
+        return False
+
+    for fmt in (elem_format1, elem_format2):
+        if type(fmt) is str:
+            fmt = ElemFormat.from_str(fmt)
+        if fmt not in INT_FORMATS:
+            return False
+    return all(t.dtype == torch.float32 for t in tensors)
+
+
+def int_operand_op(A, mx_specs, elem_format, round="nearest"):
+    """
+    MX-quantizes A along its last dim (the dot product dim) to int8 codes.
+    Args:
+        A           {tensor}     -- (..., rows, K) fp32
+        mx_specs    {MxSpecs}    -- block_size, scale_bits, flushing
+        elem_format {ElemFormat} -- int8, int4 or int2
+    Returns:
+        codes  {int8 tensor} -- (..., blocks, rows, block_size)
+        scales {tensor}      -- (..., blocks, rows), 2**exponent of each
+                                block, so that the values are codes * scales
+    """
+    if type(elem_format) is str:
+        elem_format = ElemFormat.from_str(elem_format)
+    _, mbits, emax, _, _ = _get_format_params(elem_format)
+    scale_bits = mx_specs["scale_bits"] or 8
+
+    length = A.shape[-1]
+    block_size = mx_specs["block_size"]
+    if block_size == 0 or block_size > length:
+        block_size = max(length, 1)
+    n_blocks = -(-length // block_size)
+
+    A = F.pad(A, (0, n_blocks * block_size - length))
+    A = A.reshape(*A.shape[:-1], n_blocks, block_size)
+    A, shared_exp = _lut_shared_exponents(
+        A, scale_bits, emax, [-1], mx_specs["mx_flush_fp32_subnorms"])
+
+    # Elements are k * 2**-(mbits-2) for integer k (sign-magnitude 1.xxx)
+    A, _ = _lut_encode(A / (2**shared_exp), elem_format, round=round)
+    codes = (A * 2**(mbits - 2)).type(torch.int8)
+    scales = 2**(shared_exp.squeeze(-1) - (mbits - 2))
+    return codes.movedim(-2, -3).contiguous(), scales.movedim(-1, -2).contiguous()
+
+
+def int_matmul_op(a, b):
+    """
+    Multiplies two operands from int_operand_op quantized with the same
+    block size along the same K. Leading dims broadcast like torch.matmul.
+    Args:
+        a {tuple} -- (codes, scales) of the (..., M, K) left operand
+        b {tuple} -- (codes, scales) of the (..., N, K) right operand,
+                     i.e. of the transposed right matrix
+    Returns:
+        {tensor} -- (..., M, N) fp32
+    """
+    a_codes, a_scales = a
+    b_codes, b_scales = b
+    assert a_codes.shape[-3] == b_codes.shape[-3] and \
+        a_codes.shape[-1] == b_codes.shape[-1], \
+        "int_matmul_op operands are blocked differently"
+
+    n_blocks, M, N = a_codes.shape[-3], a_codes.shape[-2], b_codes.shape[-2]
+    batch = torch.broadcast_shapes(a_codes.shape[:-3], b_codes.shape[:-3])
+    a_codes = a_codes.expand(*batch, *a_codes.shape[-3:]).reshape(-1, *a_codes.shape[-3:])
+    b_codes = b_codes.expand(*batch, *b_codes.shape[-3:]).reshape(-1, *b_codes.shape[-3:])
+    a_scales = a_scales.expand(*batch, n_blocks, M).reshape(-1, n_blocks, M, 1)
+    b_scales = b_scales.expand(*batch, n_blocks, N).reshape(-1, n_blocks, 1, N)
+
+    out = torch.zeros(a_codes.shape[0], M, N, device=a_codes.device)
+    for i in range(out.shape[0]):
+        for k in range(n_blocks):
+            partial = _int_mm(a_codes[i, k], b_codes[i, k].t()).float()
+            partial.mul_(a_scales[i, k])
+            out[i].addcmul_(partial, b_scales[i, k])
+    return out.view(*batch, M, N)
@@ -10,6 +10,8 @@ from .vector_ops import *
 from .specs import apply_mx_specs, get_backwards_mx_specs
 from .specs import mx_assert_test
 from .norm_utils import _norm_forward, _norm_backward_LN, _norm_backward
+from .norm_utils import _norm_fused_supported, _norm_forward_fused
+from .norm_utils import _norm_backward_LN_fused
 
 torch_layer_norm = F.layer_norm
 
@@ -25,10 +27,18 @@ class LayerNormFunction(torch.autograd.Function):
         bf_weight = vec_quantize(weight, mx_specs=mx_specs)
         bf_bias = vec_quantize(bias, mx_specs=mx_specs)
 
-        output, _, x_norm, _, _, x_vare = \
-                _norm_forward(
-                        x, -1, bf_weight, bf_bias, eps,
-                        mx_specs)
+        ctx.norm_fused = _norm_fused_supported(
+                mx_specs, x, bf_weight, bf_bias)
+        if ctx.norm_fused:
+            output, _, x_norm, _, _, x_vare = \
+                    _norm_forward_fused(
+                            x, -1, bf_weight, bf_bias, eps,
+                            mx_specs, keep_x_norm=True)
+        else:
+            output, _, x_norm, _, _, x_vare = \
+                    _norm_forward(
+                            x, -1, bf_weight, bf_bias, eps,
+                            mx_specs)
 
         # stash for backprop
         if mx_specs['quantize_backprop']:
@@ -47,6 +57,11 @@ class LayerNormFunction(torch.autograd.Function):
         # get stashed intermediate
         x_norm, x_vare, weight = ctx.saved_tensors
 
+        if ctx.norm_fused:
+            grad_input, grad_weight, grad_bias = _norm_backward_LN_fused(
+                    grad_output, weight, x_norm, x_vare, ctx.mx_specs)
+            return (grad_input, grad_weight, grad_bias, None, None, None)
+
         grad_output = vec_quantize(grad_output, mx_specs=ctx.mx_specs)
         # grad_bias
         grad_bias = vec_reduce_sum(grad_output, sum_axes,
@@ -103,6 +118,23 @@ class RMSNormFunction(torch.autograd.Function):
 
         x = vec_quantize(x, mx_specs=mx_specs)
 
+        ctx.norm_fused = _norm_fused_supported(mx_specs, x, weight, bias)
+        if ctx.norm_fused:
+            bf_weight = vec_quantize(weight, mx_specs=mx_specs)
+            bf_bias = vec_quantize(bias, mx_specs=mx_specs)
+            output, _, x_norm, x_rms_inv, _, _ = \
+                    _norm_forward_fused(
+                            x, -1, bf_weight, bf_bias, eps,
+                            mx_specs, center=False, keep_x_norm=True)
+
+            if mx_specs['quantize_backprop']:
+                ctx.save_for_backward(x_norm, x_rms_inv, bf_weight)
+            else:
+                ctx.save_for_backward(x_norm, x_rms_inv, weight)
+
+            ctx.mx_specs = get_backwards_mx_specs(mx_specs)
+            return output
+
         # x2 (N, L, H)
         x2 = vec_mul(x, x, mx_specs=mx_specs)
 
@@ -144,6 +176,12 @@ class RMSNormFunction(torch.autograd.Function):
         # get stashed intermediate
         x_norm, x_rms_inv, weight = ctx.saved_tensors
 
+        if ctx.norm_fused:
+            grad_input, grad_weight, grad_bias = _norm_backward_LN_fused(
+                    grad_output, weight, x_norm, x_rms_inv, ctx.mx_specs,
+                    center=False)
+            return (grad_input, grad_weight, grad_bias, None, None, None)
+
         grad_output = vec_quantize(grad_output, mx_specs=ctx.mx_specs)
         # grad_bias
         grad_bias = vec_reduce_sum(grad_output, sum_axes,
@@ -11,6 +11,8 @@ from .elemwise_ops import quantize_elemwise_op
 from .specs import apply_mx_specs, get_backwards_mx_specs
 from .specs import mx_assert_test
 from .matmul_precision import set_matmul_precision
+from .weight_cache import WeightCache
+from .int_matmul import use_int_matmul, int_operand_op, int_matmul_op
 
 f_linear = F.linear
 torch_matmul = torch.matmul
@@ -25,65 +27,97 @@ class LinearFunction(torch.autograd.Function):
         mx_specs=None,
         prequantized_weights=False,
         name=None,
+        weight_cache=None,
     ):
         # element-wise quantize for input
         bf_in = quantize_elemwise_op(
             input, mx_specs=mx_specs, round=mx_specs["round_output"]
         )
+        int_engine = use_int_matmul(mx_specs, mx_specs['a_elem_format'],
+                                    mx_specs['w_elem_format'], bf_in, weight)
 
-        # element-wise quantize for weight and bias
-        if not prequantized_weights:
-            bf_weight = quantize_elemwise_op(
-                weight, mx_specs=mx_specs, round=mx_specs["round_weight"]
-            )
-        else:
-            assert(weight.dtype == torch.bfloat16)
-            bf_weight = weight
-
-        if bias is not None:
-            ctx.has_bias = True
+        def quantize_weights():
+            # element-wise quantize for weight and bias
             if not prequantized_weights:
-                bf_bias = quantize_elemwise_op(
-                    bias, mx_specs=mx_specs, round=mx_specs["round_weight"]
+                bf_weight = quantize_elemwise_op(
+                    weight, mx_specs=mx_specs, round=mx_specs["round_weight"]
                 )
             else:
-                assert(bias.dtype == torch.bfloat16)
-                bf_bias = bias
+                assert(weight.dtype == torch.bfloat16)
+                bf_weight = weight
+
+            if bias is not None:
+                if not prequantized_weights:
+                    bf_bias = quantize_elemwise_op(
+                        bias, mx_specs=mx_specs, round=mx_specs["round_weight"]
+                    )
+                else:
+                    assert(bias.dtype == torch.bfloat16)
+                    bf_bias = bias
+            else:
+                bf_bias = None
+
+            # MX quantize the weight along input size
+            if int_engine:
+                qis_weight = int_operand_op(
+                    bf_weight,
+                    mx_specs,
+                    elem_format=mx_specs['w_elem_format'],
+                    round=mx_specs["round_mx_output"],
+                )
+            else:
+                qis_weight = quantize_mx_op(
+                    bf_weight,
+                    mx_specs,
+                    elem_format=mx_specs['w_elem_format'],
+                    axes=[-1],
+                    round=mx_specs["round_mx_output"],
+                )
+            return bf_weight, bf_bias, qis_weight
+
+        if weight_cache is not None:
+            bf_weight, bf_bias, qis_weight = weight_cache.get(
+                [weight, bias], mx_specs, quantize_weights,
+                int_engine=int_engine)
         else:
-            ctx.has_bias = False
-            bf_bias = None
+            bf_weight, bf_bias, qis_weight = quantize_weights()
+        ctx.has_bias = bias is not None
 
         if mx_specs["quantize_backprop"]:
             ctx.save_for_backward(bf_in, bf_weight)
         else:
             ctx.save_for_backward(input, weight)
 
-        # MX quantize everything along input size
-        qis_input = quantize_mx_op(
-            bf_in,
-            mx_specs,
-            elem_format=mx_specs['a_elem_format'],
-            axes=[-1],
-            round=mx_specs["round_mx_output"],
-        )
-        qis_weight = quantize_mx_op(
-            bf_weight,
-            mx_specs,
-            elem_format=mx_specs['w_elem_format'],
-            axes=[-1],
-            round=mx_specs["round_mx_output"],
-        )
+        if int_engine:
+            # int8 codes of the input, multiplied block by block
+            qis_input = int_operand_op(
+                bf_in.reshape(-1, bf_in.shape[-1]),
+                mx_specs,
+                elem_format=mx_specs['a_elem_format'],
+                round=mx_specs["round_mx_output"],
+            )
+            output = int_matmul_op(qis_input, qis_weight)
+            output = output.view(*bf_in.shape[:-1], weight.shape[0])
+        else:
+            # MX quantize everything along input size
+            qis_input = quantize_mx_op(
+                bf_in,
+                mx_specs,
+                elem_format=mx_specs['a_elem_format'],
+                axes=[-1],
+                round=mx_specs["round_mx_output"],
+            )
 
-        # In case of prequantized weights, the output of quantize_mx_op will return bfloat16 output.
-        # while qtzd_i/p can be anything. Thus we match the dtypes here.
-        if qis_weight.dtype == torch.bfloat16 and qis_input.dtype != torch.bfloat16:
-            qis_weight = qis_weight.to(qis_input.dtype)
+            # In case of prequantized weights, the output of quantize_mx_op will return bfloat16 output.
+            # while qtzd_i/p can be anything. Thus we match the dtypes here.
+            if qis_weight.dtype == torch.bfloat16 and qis_input.dtype != torch.bfloat16:
+                qis_weight = qis_weight.to(qis_input.dtype)
 
-        # compute output
-        with set_matmul_precision(qis_input, qis_weight,
-                                mx_specs['a_elem_format'],
-                                mx_specs['w_elem_format']):
-            output = f_linear(qis_input, qis_weight)
+            # compute output
+            with set_matmul_precision(qis_input, qis_weight,
+                                    mx_specs['a_elem_format'],
+                                    mx_specs['w_elem_format']):
+                output = f_linear(qis_input, qis_weight)
         
         output = quantize_elemwise_op(
             output, mx_specs=mx_specs, round=mx_specs["round_output"]
@@ -197,7 +231,7 @@ class LinearFunction(torch.autograd.Function):
                 round=ctx.mx_specs["round_grad_weight"],
             )
 
-        return (grad_input, grad_weight, grad_bias, None, None, None, None)
+        return (grad_input, grad_weight, grad_bias, None, None, None, None, None)
 
 
 def linear(
@@ -207,6 +241,7 @@ def linear(
     mx_specs=None,
     prequantized_weights=False,
     name=None,
+    weight_cache=None,
 ):
     mx_assert_test(mx_specs)
     if mx_specs is None:
@@ -215,7 +250,7 @@ def linear(
     mx_specs = apply_mx_specs(mx_specs)
 
     return LinearFunction.apply(input, weight, bias, mx_specs, 
-                                prequantized_weights, name)
+                                prequantized_weights, name, weight_cache)
 
 
 class Linear(torch.nn.Linear):
@@ -233,6 +268,7 @@ class Linear(torch.nn.Linear):
         self.name = name
         self.prequantized_weights = False
         self.mx_specs = apply_mx_specs(mx_specs)
+        self.weight_cache = WeightCache()
         super().__init__(in_features, out_features, bias)
 
     def apply_mx_specs(self, mx_specs):
@@ -288,4 +324,5 @@ class Linear(torch.nn.Linear):
             mx_specs=self.mx_specs,
             prequantized_weights=self.prequantized_weights,
             name=self.name,
+            weight_cache=self.weight_cache if self.mx_specs["cache_weights"] else None,
         )
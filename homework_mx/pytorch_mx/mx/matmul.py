@@ -11,6 +11,7 @@ from .elemwise_ops import quantize_elemwise_op
 from .specs import apply_mx_specs, get_backwards_mx_specs
 from .specs import mx_assert_test
 from .matmul_precision import set_matmul_precision
+from .int_matmul import use_int_matmul, int_operand_op, int_matmul_op
 
 torch_matmul = torch.matmul
 torch_addmm = torch.addmm
@@ -64,26 +65,43 @@ class MatMulFunction(torch.autograd.Function):
         else:
             ctx.save_for_backward(in1, in2)
 
-        # quantize along the dot product dimension
-        qin1 = quantize_mx_op(
-            bf_in1,
-            mx_specs,
-            elem_format=qin1_elem_format,
-            axes=[-1],
-            round=mx_specs["round_mx_output"],
-        )
-        qin2 = quantize_mx_op(
-            bf_in2,
-            mx_specs,
-            elem_format=qin2_elem_format,
-            axes=[-2],
-            round=mx_specs["round_mx_output"],
-        )
+        if use_int_matmul(mx_specs, qin1_elem_format, qin2_elem_format,
+                          bf_in1, bf_in2) and min(in1.ndim, in2.ndim) >= 2:
+            # int8 codes along the dot product dimension
+            qin1 = int_operand_op(
+                bf_in1,
+                mx_specs,
+                elem_format=qin1_elem_format,
+                round=mx_specs["round_mx_output"],
+            )
+            qin2 = int_operand_op(
+                bf_in2.transpose(-1, -2),
+                mx_specs,
+                elem_format=qin2_elem_format,
+                round=mx_specs["round_mx_output"],
+            )
+            out = int_matmul_op(qin1, qin2)
+        else:
+            # quantize along the dot product dimension
+            qin1 = quantize_mx_op(
+                bf_in1,
+                mx_specs,
+                elem_format=qin1_elem_format,
+                axes=[-1],
+                round=mx_specs["round_mx_output"],
+            )
+            qin2 = quantize_mx_op(
+                bf_in2,
+                mx_specs,
+                elem_format=qin2_elem_format,
+                axes=[-2],
+                round=mx_specs["round_mx_output"],
+            )
 
-        with set_matmul_precision(qin1, qin2,
-                        qin1_elem_format,
-                        qin2_elem_format):
-            out = torch_matmul(qin1, qin2)
+            with set_matmul_precision(qin1, qin2,
+                            qin1_elem_format,
+                            qin2_elem_format):
+                out = torch_matmul(qin1, qin2)
         
         out = quantize_elemwise_op(
             out, mx_specs=mx_specs, round=mx_specs["round_output"]
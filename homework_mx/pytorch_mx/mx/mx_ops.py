@@ -22,6 +22,11 @@ Internal Methods:
     _reshape_to_blocks - tiles a tensor by splitting one dim into two
     _undo_reshape_to_blocks - undos the above reshaping
     _quantize_mx - quantizes a tensor to MX format
+    _quantize_mx_fused_cpu - single-pass CPU version of _quantize_mx
+    _lut_tables - decision boundaries and decode table of a narrow format
+    _lut_encode, _lut_decode - table-driven element quantization to codes
+    _lut_shared_exponents - scale exponents of the table-driven paths
+    _quantize_mx_lut - _quantize_mx through the tables, also returns codes
 """
 
 import os
@@ -39,14 +44,30 @@ from .formats import (
 from .elemwise_ops import (
         _safe_lshift, _safe_rshift,
         _round_mantissa,
-        _quantize_elemwise_core
+        _round_mantissa_,
+        _quantize_elemwise_core,
+        _use_bits, _floor_log2, _pow2_floor_log2
 )
 
+# Elements processed per step by _quantize_mx_fused_cpu. Chunks stay in
+# cache, so every op after the first read of a chunk hits L2 instead of DRAM.
+FUSED_CHUNK_ELEMS = 1 << 16
+
+# Formats with at most 8 bits per element, handled by the lookup tables
+LUT_FORMATS = (
+    ElemFormat.int8, ElemFormat.int4, ElemFormat.int2,
+    ElemFormat.fp8_e5m2, ElemFormat.fp8_e4m3,
+    ElemFormat.fp6_e3m2, ElemFormat.fp6_e2m3, ElemFormat.fp4_e2m1,
+)
+# _lut_encode looks values up by their top 32 - LUT_CELL_BITS bits
+LUT_CELL_BITS = 15
+_LUT_CACHE = {}
+
 
 # -------------------------------------------------------------------------
 # Helper funcs
 # -------------------------------------------------------------------------
-def _shared_exponents(A, method="max", axes=None, ebits=0):
+def _shared_exponents(A, method="max", axes=None, ebits=0, exp_method="log2"):
     """
     Get shared exponents for the passed matrix A.
     Args:
@@ -56,6 +77,7 @@ def _shared_exponents(A, method="max", axes=None, ebits=0):
                                  "none" uses an exponent for each value (i.e., no sharing)
       axes   {list(int)}      -- List of integers which specifies the axes across which
                                  shared exponents are calculated.
+      exp_method {str}        -- "log2" or "bits", see elemwise_ops.py
     Returns:
       shared_exp {PyTorch tensor} -- Tensor of shared exponents
     """
@@ -73,11 +95,11 @@ def _shared_exponents(A, method="max", axes=None, ebits=0):
         raise Exception("Unrecognized shared exponent selection method %s" % (method))
 
     # log2(shared_exp) and truncate to integer
-    shared_exp = torch.floor(
-        torch.log2(
-            shared_exp + FP32_MIN_NORMAL * (shared_exp == 0).type(shared_exp.dtype)
-        )
-    )
+    shared_exp = shared_exp + FP32_MIN_NORMAL * (shared_exp == 0).type(shared_exp.dtype)
+    if _use_bits(shared_exp, exp_method):
+        shared_exp = _floor_log2(shared_exp)
+    else:
+        shared_exp = torch.floor(torch.log2(shared_exp))
 
     # Restrict to [-emax, emax] range
     if ebits > 0:
@@ -106,6 +128,13 @@ def _reshape_to_blocks(A, axes, block_size):
     assert all(x >= 0 for x in axes)
     axes = sorted(axes)
 
+    # Fast path: a single innermost axis of whole blocks is a plain view
+    if len(axes) == 1 and axes[0] == A.ndim - 1 and \
+            A.shape[-1] % block_size == 0 and A.shape[-1] > 0:
+        orig_shape = A.shape + (1,)
+        A = A.view(*A.shape[:-1], A.shape[-1] // block_size, block_size)
+        return A, axes, orig_shape, orig_shape
+
     # Add extra dimension for tiles
     for i in range(len(axes)):
         axes[i] += i  # Shift axes due to added dimensions
@@ -156,6 +185,9 @@ def _reshape_to_blocks(A, axes, block_size):
 
 def _undo_reshape_to_blocks(A, padded_shape, orig_shape, axes):
     # Undo tile reshaping
+    if list(padded_shape) == list(orig_shape) and len(axes) == 1 and \
+            axes[0] == len(orig_shape) - 2:
+        return A.view(orig_shape[:-1])
     A = A.view(padded_shape)
     # Undo padding
     if not list(padded_shape) == list(orig_shape):
@@ -167,6 +199,321 @@ def _undo_reshape_to_blocks(A, padded_shape, orig_shape, axes):
     return A
 
 
+def _quantize_blocks_(X, out, scale_bits, ebits, mbits, emax, max_norm,
+                      round, flush_fp32_subnorms, exp_method):
+    """Quantizes the (n_blocks, block_size) tensor X into out.
+    Mirrors the non-CUDA branch of _quantize_mx followed by
+    _quantize_elemwise_core(allow_denorm=True, saturate_normals=True),
+    with every full-size step done in place on out.
+    """
+    bits = _use_bits(X, exp_method)
+    shared_exp = torch.max(torch.abs(X), dim=-1, keepdim=True).values
+    shared_exp = shared_exp + FP32_MIN_NORMAL * (shared_exp == 0).type(shared_exp.dtype)
+    shared_exp = _floor_log2(shared_exp) if bits else torch.floor(torch.log2(shared_exp))
+
+    if flush_fp32_subnorms:
+        torch.mul(X, (shared_exp > -FP32_EXPONENT_BIAS).type(X.dtype), out=out)
+        X = out
+
+    shared_exp = shared_exp - emax
+    scale_emax = 2**(scale_bits-1) - 1
+    shared_exp[shared_exp > scale_emax] = float("NaN")
+    shared_exp[shared_exp < -scale_emax] = -scale_emax
+    scale = 2**shared_exp
+
+    torch.div(X, scale, out=out)
+
+    # Elementwise quantization. A (= out here) can't hold an Inf: the
+    # shared exponent bounds |A| by 2**(emax+1), and a block with an
+    # Inf gets a NaN scale, so the Inf/NaN fix-ups of the core are no-ops.
+    if ebits != 0:
+        min_exp = -(2**(ebits-1)) + 2
+        if bits:
+            private_exp = _pow2_floor_log2(out, min_exp)
+        else:
+            private_exp = torch.abs(out)
+            private_exp.add_((out == 0).type(out.dtype))
+            private_exp.log2_().floor_()
+            private_exp.clamp_(min=min_exp)
+            torch.pow(2, private_exp, out=private_exp)
+        out.div_(private_exp)
+    out.mul_(2**(mbits - 2))
+
+    _round_mantissa_(out, round)
+
+    out.div_(2**(mbits - 2))
+    if ebits != 0:
+        out.mul_(private_exp)
+    out.clamp_(min=-max_norm, max=max_norm)
+
+    return out.mul_(scale)
+
+
+def _quantize_mx_fused_cpu(A, scale_bits, elem_format, axis, block_size=0,
+                           round="nearest", flush_fp32_subnorms=False,
+                           exp_method="log2", chunk_elems=FUSED_CHUNK_ELEMS):
+    """Bit-identical CPU version of _quantize_mx for one shared axis.
+    The block axis is made innermost and contiguous, then the tensor is
+    processed a chunk of whole blocks at a time with in-place ops, so each
+    element is read from and written to memory once instead of once per
+    op. A ragged last block is quantized on its own (no padding copy).
+    """
+    ebits, mbits, emax, max_norm, _ = _get_format_params(elem_format)
+    params = (scale_bits, ebits, mbits, emax, max_norm, round,
+              flush_fp32_subnorms, exp_method)
+
+    X = A.movedim(axis, -1)
+    moved_shape = X.shape
+    length = X.shape[-1]
+    X = X.contiguous().view(-1, length)
+    out = torch.empty_like(X)
+
+    # block_size 0 (or longer than the axis) shares one exponent per axis
+    if block_size == 0 or block_size >= length:
+        block_size = length
+    full = length // block_size * block_size
+
+    # Chunk whole rows when they fit, otherwise whole blocks of one row
+    cols = min(full, max(block_size, chunk_elems // block_size * block_size))
+    rows_per_chunk = max(1, chunk_elems // length) if cols == full else 1
+
+    for r0 in range(0, X.shape[0], rows_per_chunk):
+        r1 = min(X.shape[0], r0 + rows_per_chunk)
+        for c0 in range(0, full, cols):
+            c1 = min(full, c0 + cols)
+            src = X[r0:r1, c0:c1]
+            dst = out[r0:r1, c0:c1]
+            if dst.is_contiguous():
+                _quantize_blocks_(src.view(-1, block_size),
+                                  dst.view(-1, block_size), *params)
+            else:
+                blocks = src.reshape(-1, block_size)
+                dst.copy_(_quantize_blocks_(
+                    blocks, torch.empty_like(blocks), *params).view(dst.shape))
+        if full < length:
+            tail = X[r0:r1, full:]
+            out[r0:r1, full:] = _quantize_blocks_(
+                tail, torch.empty_like(tail), *params)
+
+    out = out.view(moved_shape).movedim(-1, axis)
+    return out if axis == A.ndim - 1 else out.contiguous()
+
+
+def _fused_cpu_supported(A, axes, shared_exp_method, round):
+    """Cases handled by _quantize_mx_fused_cpu"""
+    return (
+        A.device.type == "cpu"
+        and A.dtype == torch.float32
+        and A.numel() > 0
+        and len(axes) == 1
+        and shared_exp_method == "max"
+        and round in RoundingMode.string_enums()
+        # out= ops are not differentiable
+        and not (A.requires_grad and torch.is_grad_enabled())
+    )
+
+
+def _lut_magnitudes(ebits, mbits, max_norm):
+    """Non-negative representable values in code order: for floats the
+    exponent and mantissa fields read as one unsigned integer, for ints
+    the magnitude (in units of 2**-(mbits-2))"""
+    if ebits == 0:
+        return [k * 2.0**(2 - mbits) for k in range(2**(mbits - 1))]
+
+    man_bits = mbits - 2
+    bias = 2**(ebits - 1) - 1
+    values = []
+    for k in range(2**(ebits + man_bits)):
+        exp, man = k >> man_bits, k & (2**man_bits - 1)
+        if exp == 0:
+            value = man * 2.0**(1 - bias - man_bits)
+        else:
+            value = (2**man_bits + man) * 2.0**(exp - bias - man_bits)
+        if value > max_norm:
+            break
+        values.append(value)
+    return values
+
+
+def _lut_boundaries(elem_format, round):
+    """
+    Magnitudes where the quantized value of elem_format changes.
+    Found by bisecting the fp32 encodings between consecutive representable
+    values against _quantize_elemwise_core (exact exponents, MX settings),
+    so they reproduce its float rounding quirks too: |x| + 0.5 rounds up
+    for the fp32 value just below a 0.5 tie, which moves the "nearest"
+    boundary down one ulp and gives "even" an isolated point that rounds
+    up below a tie that rounds down.
+    Returns:
+      boundaries {tensor} -- ascending fp32 magnitudes
+      mags       {tensor} -- magnitude code from each boundary on
+      magnitudes {tensor} -- non-negative representable values
+    """
+    ebits, mbits, _, max_norm, _ = _get_format_params(elem_format)
+    magnitudes = torch.tensor(_lut_magnitudes(ebits, mbits, max_norm),
+                              dtype=torch.float32)
+
+    def quantize(x):
+        return _quantize_elemwise_core(
+            x, mbits, ebits, max_norm, round=round, allow_denorm=True,
+            saturate_normals=True, exp_method="bits")
+
+    assert torch.equal(quantize(magnitudes), magnitudes)
+
+    # Invariant: lo quantizes below magnitudes[k+1], hi quantizes to it
+    lo = magnitudes[:-1].view(torch.int32).clone()
+    hi = magnitudes[1:].view(torch.int32).clone()
+    while bool((hi - lo > 1).any()):
+        mid = lo + (hi - lo) // 2
+        up = quantize(mid.view(torch.float32)) >= magnitudes[1:]
+        hi = torch.where(up, mid, hi)
+        lo = torch.where(up, lo, mid)
+
+    # Look for isolated points around the bisected boundaries and the
+    # exact ties (v[k] + v[k+1]) / 2: keep every encoding whose result
+    # differs from that of the encoding before it
+    ties = (magnitudes[:-1] + magnitudes[1:]) / 2
+    near = torch.cat([hi, ties.view(torch.int32)])
+    near = (near[:, None] + torch.arange(-2, 3, dtype=torch.int32)).flatten().unique()
+    q = quantize(near.view(torch.float32))
+    change = q != quantize((near - 1).view(torch.float32))
+    mags = torch.searchsorted(magnitudes, q[change])
+    return near[change].view(torch.float32), mags, magnitudes
+
+
+def _lut_tables(elem_format, round, device="cpu"):
+    """
+    Lookup tables of a narrow element format for one rounding mode (cached).
+    An fp32 value is looked up by its top 32 - LUT_CELL_BITS bits (sign,
+    exponent and leading mantissa bits), a "cell". No cell holds more than
+    one boundary of _lut_boundaries, so a cell's code is cell_codes[cell],
+    plus one when the low LUT_CELL_BITS bits reach cell_thresholds[cell].
+    Codes are sign-magnitude: sign bit, then the exponent and mantissa
+    fields for floats or the integer magnitude for ints.
+    Returns:
+      cell_codes      {int32 tensor} -- code at the start of each cell
+      cell_thresholds {int32 tensor} -- low bits of the boundary in each
+                                        cell, 2**LUT_CELL_BITS if none
+      decode          {tensor}       -- fp32 value of each of the 2**n_bits
+                                        codes (Inf/NaN encodings give NaN)
+      n_bits          {int}          -- bits per code
+    """
+    if type(elem_format) is str:
+        elem_format = ElemFormat.from_str(elem_format)
+    assert elem_format in LUT_FORMATS, \
+        "No lookup tables for %s" % elem_format
+    key = (elem_format, round, str(device))
+    if key in _LUT_CACHE:
+        return _LUT_CACHE[key]
+
+    ebits, mbits, _, _, _ = _get_format_params(elem_format)
+    n_bits = mbits if ebits == 0 else ebits + mbits - 1
+    sign = 2**(n_bits - 1)
+    boundaries, mags, magnitudes = _lut_boundaries(elem_format, round)
+
+    # Positive cells, the negative ones are the same with the sign bit set
+    n_cells = 2**(31 - LUT_CELL_BITS)
+    starts = (torch.arange(n_cells, dtype=torch.int32) << LUT_CELL_BITS)
+    index = torch.bucketize(starts.view(torch.float32), boundaries, right=True)
+    cell_codes = torch.cat([torch.zeros(1, dtype=mags.dtype), mags])[index]
+
+    bits = boundaries.view(torch.int32)
+    inner = (bits & (2**LUT_CELL_BITS - 1)) != 0
+    cells = bits[inner] >> LUT_CELL_BITS
+    assert len(cells.unique()) == len(cells), "cell holds two boundaries"
+    assert torch.equal(cell_codes[cells] + 1, mags[inner])
+    cell_thresholds = torch.full((n_cells,), 2**LUT_CELL_BITS, dtype=torch.int32)
+    cell_thresholds[cells] = bits[inner] & (2**LUT_CELL_BITS - 1)
+
+    cell_codes = torch.cat([cell_codes, cell_codes + sign]).type(torch.int32)
+    cell_thresholds = torch.cat([cell_thresholds, cell_thresholds])
+
+    mag = torch.arange(sign)
+    decode = torch.full((sign,), float("NaN"))
+    decode[mag < len(magnitudes)] = magnitudes
+    decode = torch.cat([decode, -decode])
+
+    tables = tuple(t.to(device) for t in (cell_codes, cell_thresholds, decode))
+    _LUT_CACHE[key] = tables + (n_bits,)
+    return _LUT_CACHE[key]
+
+
+def _lut_encode(A, elem_format, round="nearest"):
+    """Quantizes an fp32 tensor that is already divided by its MX scale.
+    Same values as _quantize_elemwise_core(A, ..., saturate_normals=True,
+    exp_method="bits") with three table lookups per element instead of
+    the exponent/shift/round/unshift sequence. NaNs are not propagated
+    (in MX they are carried by the scale).
+    Returns:
+      (quantized {tensor}, codes {uint8 tensor}) -- codes as in _lut_tables
+    """
+    assert A.dtype == torch.float32, "_lut_encode requires fp32"
+    cell_codes, cell_thresholds, decode, _ = _lut_tables(
+        elem_format, round, A.device)
+
+    bits = A.reshape(-1).view(torch.int32)
+    cell = bits >> LUT_CELL_BITS
+    cell &= 2**(32 - LUT_CELL_BITS) - 1
+    codes = cell_codes.index_select(0, cell)
+    low = bits & (2**LUT_CELL_BITS - 1)
+    codes += low.ge_(cell_thresholds.index_select(0, cell))
+
+    out = decode.index_select(0, codes)
+    return out.view(A.shape), codes.type(torch.uint8).view(A.shape)
+
+
+def _lut_decode(codes, elem_format):
+    """Element values of codes produced by _lut_encode"""
+    decode = _lut_tables(elem_format, "nearest", codes.device)[2]
+    return decode[codes.long()]
+
+
+def _lut_shared_exponents(A, scale_bits, emax, axes, flush_fp32_subnorms):
+    """Scale exponents of _quantize_mx: exact shared exponents offset by
+    the element emax, clamped to the scale range, NaN on overflow.
+    Returns (A, shared_exp), A flushed as requested"""
+    shared_exp = _shared_exponents(A, axes=axes, exp_method="bits")
+    if flush_fp32_subnorms:
+        A = A * (shared_exp > -FP32_EXPONENT_BIAS).type(A.dtype)
+
+    shared_exp = shared_exp - emax
+    scale_emax = 2**(scale_bits-1) - 1
+    shared_exp[shared_exp > scale_emax] = float("NaN")
+    shared_exp[shared_exp < -scale_emax] = -scale_emax
+    return A, shared_exp
+
+
+def _quantize_mx_lut(A, scale_bits, elem_format, axes=None, block_size=0,
+                     round="nearest", flush_fp32_subnorms=False):
+    """_quantize_mx for the LUT_FORMATS through the lookup tables.
+    Bit-identical to _quantize_mx(..., exp_method="bits") on fp32 inputs.
+    Returns:
+      (quantized {tensor}, codes {uint8 tensor}) -- both shaped like A;
+      A == _lut_decode(codes) * 2**shared_exp of each block
+    """
+    assert A.dtype == torch.float32, "_quantize_mx_lut requires fp32"
+    axes = [axes] if type(axes) == int else axes
+    axes = [x + A.ndim if x < 0 else x for x in axes]
+    emax = _get_format_params(elem_format)[2]
+
+    if block_size > 0:
+        A, axes, orig_shape, padded_shape = _reshape_to_blocks(
+            A, axes, block_size
+        )
+    shared_exp_axes = [x + 1 for x in axes] if block_size > 0 else axes
+
+    A, shared_exp = _lut_shared_exponents(
+        A, scale_bits, emax, shared_exp_axes, flush_fp32_subnorms)
+
+    A, codes = _lut_encode(A / (2**shared_exp), elem_format, round=round)
+    A = A * (2**shared_exp)
+
+    if block_size:
+        A = _undo_reshape_to_blocks(A, padded_shape, orig_shape, axes)
+        codes = _undo_reshape_to_blocks(codes, padded_shape, orig_shape, axes)
+    return A, codes
+
+
 # -------------------------------------------------------------------------
 # Main funcs
 # -------------------------------------------------------------------------
@@ -180,8 +527,12 @@ def _quantize_mx(
     round="nearest",
     flush_fp32_subnorms=False,
     custom_cuda=False,
+    fused_cpu=False,
+    exp_method="log2",
 ):
     """Function used for MX* quantization
+    fused_cpu selects _quantize_mx_fused_cpu for the CPU cases it supports,
+    exp_method how exponents are computed ("log2" or "bits", see elemwise_ops.py)
     """
     # Shortcut for no quantization
     if elem_format == None:
@@ -198,6 +549,13 @@ def _quantize_mx(
 
     ebits, mbits, emax, max_norm, _ = _get_format_params(elem_format)
 
+    if fused_cpu and not custom_cuda and \
+            _fused_cpu_supported(A, axes, shared_exp_method, round):
+        return _quantize_mx_fused_cpu(
+            A, scale_bits, elem_format, axes[0], block_size=block_size,
+            round=round, flush_fp32_subnorms=flush_fp32_subnorms,
+            exp_method=exp_method)
+
     # Use quantize_mx_by_tile when there is only a single shared axis and
     # - The block size is small, OR
     # - The shared axis is not the innermost
@@ -224,6 +582,28 @@ def _quantize_mx(
             return A
 
 
+    # A ragged last block is quantized on its own and the full blocks
+    # through a view, instead of padding the whole tensor; both are written
+    # into one preallocated output
+    if block_size > 0 and len(axes) == 1 and not custom_cuda:
+        axis = axes[0]
+        length = A.shape[axis]
+        full = length // block_size * block_size
+        if full < length:
+            kwargs = dict(shared_exp_method=shared_exp_method, axes=axes,
+                          round=round, flush_fp32_subnorms=flush_fp32_subnorms,
+                          exp_method=exp_method)
+            tail = _quantize_mx(A.narrow(axis, full, length - full),
+                                scale_bits, elem_format, block_size=0, **kwargs)
+            if full == 0:
+                return tail
+            out = torch.empty(A.shape, dtype=tail.dtype, device=A.device)
+            out.narrow(axis, full, length - full).copy_(tail)
+            out.narrow(axis, 0, full).copy_(
+                _quantize_mx(A.narrow(axis, 0, full), scale_bits, elem_format,
+                             block_size=block_size, **kwargs))
+            return out
+
     # Perform tiling to the hardware vector size
     if block_size > 0:
         A, axes, orig_shape, padded_shape = _reshape_to_blocks(
@@ -268,6 +648,7 @@ def _quantize_mx(
         # Get shared exponents
         shared_exp = _shared_exponents(
             A, method=shared_exp_method, axes=shared_exp_axes, ebits=0,
+            exp_method=exp_method,
         )
 
         # Flush subnormal FP32 inputs to zero
@@ -287,7 +668,7 @@ def _quantize_mx(
         A = _quantize_elemwise_core(
                 A, mbits, ebits, max_norm, round=round,
                 allow_denorm=True, saturate_normals=True,
-                custom_cuda=custom_cuda)
+                custom_cuda=custom_cuda, exp_method=exp_method)
 
         A = A * (2**shared_exp)
 
@@ -328,4 +709,6 @@ def quantize_mx_op(
             axes=axes, round=round,
             shared_exp_method=mx_specs["shared_exp_method"],
             flush_fp32_subnorms=mx_specs["mx_flush_fp32_subnorms"],
-            custom_cuda=mx_specs["custom_cuda"])
+            custom_cuda=mx_specs["custom_cuda"],
+            fused_cpu=mx_specs["mx_fused_cpu"],
+            exp_method=mx_specs["exp_method"])
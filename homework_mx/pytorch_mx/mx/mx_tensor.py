@@ -0,0 +1,284 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Name:    mx_tensor.py
+
+Packed storage for MX-quantized tensors.
+
+quantize_mx_op returns a float32 tensor holding the quantized values, so
+an MX tensor still takes 32 bits per element. MXTensor keeps what the
+format actually stores: the element codes bit-packed (2, 4, 6 or 8 bits
+each) and one E8M0 scale byte per block along the quantized axis. The
+values are rebuilt on demand with dequantize().
+
+Classes:
+    MXTensor
+
+Usage Notes:
+ - Storage only: MXTensor is not a torch.Tensor and carries no autograd
+   history. Use it for stored weights and stashed activations.
+ - dequantize() is bit-identical to
+   _quantize_mx(A, scale_bits, elem_format, axes=[axis], block_size=...,
+                exp_method="bits"), whatever exp_method the specs hold
+ - Element codes are the sign-magnitude encodings of mx_ops._lut_tables.
+   The scale byte is the shared exponent + 127; 0xFF marks a NaN block.
+ - Use state_dict()/from_state_dict() with torch.save/torch.load. They
+   hold only tensors, strings and ints, so weights_only loading works.
+"""
+
+import math
+import torch
+
+from .specs import mx_assert_test
+from .formats import ElemFormat, FP32_EXPONENT_BIAS, _get_format_params
+from .mx_ops import (
+        LUT_FORMATS,
+        _lut_tables,
+        _lut_encode,
+        _lut_shared_exponents,
+)
+
+E8M0_NAN = 0xFF
+
+
+# -------------------------------------------------------------------------
+# Bit packing
+# -------------------------------------------------------------------------
+def _group(n_bits):
+    """Codes per group and bytes per group, the smallest group that fills
+    whole bytes (e.g. 4 codes in 3 bytes for 6 bits)"""
+    codes = 8 // math.gcd(8, n_bits)
+    return codes, codes * n_bits // 8
+
+
+def _pack_codes(codes, n_bits):
+    """Packs the last dim of a uint8 code tensor, n_bits per code, first
+    code in the low bits. The last dim is padded to a whole group."""
+    if n_bits == 8:
+        return codes.contiguous()
+    per_group, group_bytes = _group(n_bits)
+    pad = -codes.shape[-1] % per_group
+    codes = torch.nn.functional.pad(codes.long(), (0, pad))
+    codes = codes.view(*codes.shape[:-1], -1, per_group)
+
+    shifts = torch.arange(per_group, device=codes.device) * n_bits
+    words = (codes << shifts).sum(dim=-1, keepdim=True)
+    shifts = torch.arange(group_bytes, device=codes.device) * 8
+    packed = (words >> shifts) & 0xFF
+    return packed.flatten(-2).type(torch.uint8)
+
+
+def _unpack_codes(packed, n_bits, length):
+    """Inverse of _pack_codes, returns the first length codes"""
+    if n_bits == 8:
+        return packed[..., :length]
+    per_group, group_bytes = _group(n_bits)
+    packed = packed.long().view(*packed.shape[:-1], -1, group_bytes)
+
+    shifts = torch.arange(group_bytes, device=packed.device) * 8
+    words = (packed << shifts).sum(dim=-1, keepdim=True)
+    shifts = torch.arange(per_group, device=packed.device) * n_bits
+    codes = (words >> shifts) & (2**n_bits - 1)
+    return codes.flatten(-2)[..., :length].type(torch.uint8)
+
+
+# -------------------------------------------------------------------------
+# MXTensor
+# -------------------------------------------------------------------------
+class MXTensor:
+    """
+    A tensor quantized to an MX format, stored packed.
+    The quantized axis is kept innermost: codes has shape
+    (*other dims, packed bytes) and scales (*other dims, blocks), where
+    "other dims" are the dims of the original tensor without axis.
+    """
+
+    def __init__(self, codes, scales, shape, axis, block_size, elem_format):
+        """
+        Args:
+            codes       {uint8 tensor} -- packed element codes
+            scales      {uint8 tensor} -- E8M0 scale of each block
+            shape       {list(int)}    -- shape of the original tensor
+            axis        {int}          -- quantized axis (non-negative)
+            block_size  {int}          -- elements per block along axis
+            elem_format {ElemFormat}   -- element format
+        """
+        if type(elem_format) is str:
+            elem_format = ElemFormat.from_str(elem_format)
+        self.codes = codes
+        self.scales = scales
+        self.shape = torch.Size(shape)
+        self.axis = axis
+        self.block_size = block_size
+        self.elem_format = elem_format
+        self.n_bits = _lut_tables(elem_format, "nearest")[3]
+
+    @classmethod
+    def from_tensor(cls, A, elem_format, block_size=32, axis=-1,
+                    scale_bits=8, round="nearest", flush_fp32_subnorms=False):
+        """
+        Quantizes A to elem_format with one shared scale per block_size
+        elements along axis (block_size 0 shares it over the whole axis).
+        """
+        if type(elem_format) is str:
+            elem_format = ElemFormat.from_str(elem_format)
+        assert elem_format in LUT_FORMATS, \
+            "MXTensor does not support %s" % elem_format
+        assert 0 < scale_bits <= 8, "E8M0 scales hold at most 8 bits"
+
+        A = A.detach().float()
+        axis = axis + A.ndim if axis < 0 else axis
+        length = A.shape[axis]
+        if block_size == 0 or block_size > length:
+            block_size = max(length, 1)
+        n_blocks = -(-length // block_size)
+
+        X = A.movedim(axis, -1)
+        X = torch.nn.functional.pad(X, (0, n_blocks * block_size - length))
+        X = X.reshape(*X.shape[:-1], n_blocks, block_size)
+
+        emax = _get_format_params(elem_format)[2]
+        X, shared_exp = _lut_shared_exponents(
+            X, scale_bits, emax, [-1], flush_fp32_subnorms)
+        _, codes = _lut_encode(X / (2**shared_exp), elem_format, round=round)
+
+        n_bits = _lut_tables(elem_format, round)[3]
+        codes = _pack_codes(codes.flatten(-2), n_bits)
+        scales = (shared_exp.squeeze(-1) + FP32_EXPONENT_BIAS).nan_to_num(E8M0_NAN)
+        return cls(codes, scales.type(torch.uint8), A.shape, axis,
+                   block_size, elem_format)
+
+    @classmethod
+    def from_mx_specs(cls, A, mx_specs, elem_format, block_size=None,
+                      axis=-1, round="nearest"):
+        """
+        from_tensor with the settings of quantize_mx_op. The lookup tables
+        compute exponents from the IEEE bits, so the result always matches
+        quantize_mx_op with exp_method="bits": mx_specs["exp_method"] is
+        ignored ("log2" can be off by one next to powers of two).
+        """
+        mx_assert_test(mx_specs)
+        if block_size is None:
+            block_size = mx_specs["block_size"]
+        scale_bits = mx_specs["scale_bits"] or 8
+        return cls.from_tensor(
+            A, elem_format, block_size=block_size, axis=axis,
+            scale_bits=scale_bits, round=round,
+            flush_fp32_subnorms=mx_specs["mx_flush_fp32_subnorms"])
+
+    # ---------------------------------------------------------------------
+    # Accessors
+    # ---------------------------------------------------------------------
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def device(self):
+        return self.codes.device
+
+    @property
+    def n_blocks(self):
+        return self.scales.shape[-1]
+
+    @property
+    def nbytes(self):
+        """ Bytes of packed codes and scales """
+        return self.codes.numel() + self.scales.numel()
+
+    def __repr__(self):
+        return "MXTensor(shape=%s, elem_format=%s, block_size=%d, axis=%d, " \
+               "nbytes=%d)" % (list(self.shape), self.elem_format.name,
+                               self.block_size, self.axis, self.nbytes)
+
+    def unpack(self):
+        """ Element codes as uint8, shape (*other dims, blocks, block_size) """
+        codes = _unpack_codes(self.codes, self.n_bits,
+                              self.n_blocks * self.block_size)
+        return codes.view(*codes.shape[:-1], self.n_blocks, self.block_size)
+
+    def scale_exponents(self):
+        """ Shared exponent of each block as float (NaN for NaN blocks) """
+        exp = self.scales.float() - FP32_EXPONENT_BIAS
+        return exp.masked_fill(self.scales == E8M0_NAN, float("NaN"))
+
+    def dequantize(self, dtype=torch.float32):
+        decode = _lut_tables(self.elem_format, "nearest", self.device)[2]
+        A = decode[self.unpack().long()]
+        A = A * (2**self.scale_exponents()).unsqueeze(-1)
+        A = A.flatten(-2)[..., :self.shape[self.axis]]
+        return A.movedim(-1, self.axis).contiguous().type(dtype)
+
+    def to(self, device):
+        return MXTensor(self.codes.to(device), self.scales.to(device),
+                        self.shape, self.axis, self.block_size,
+                        self.elem_format)
+
+    # ---------------------------------------------------------------------
+    # Slicing
+    # ---------------------------------------------------------------------
+    def __getitem__(self, key):
+        """
+        Basic indexing (ints, slices, Ellipsis) like on the original tensor.
+        Along the quantized axis only step-1 slices on block boundaries are
+        allowed, since the scales are shared within a block.
+        """
+        key = key if isinstance(key, tuple) else (key,)
+        if any(k is Ellipsis for k in key):
+            i = key.index(Ellipsis)
+            fill = (slice(None),) * (self.ndim - len(key) + 1)
+            key = key[:i] + fill + key[i + 1:]
+        key = key + (slice(None),) * (self.ndim - len(key))
+        if len(key) != self.ndim:
+            raise IndexError("too many indices for MXTensor of dim %d" % self.ndim)
+        for k in key:
+            if not isinstance(k, (int, slice)):
+                raise TypeError("MXTensor supports int and slice indices only")
+
+        axis_key = key[self.axis]
+        other_key = key[:self.axis] + key[self.axis + 1:]
+        if isinstance(axis_key, int):
+            raise IndexError("cannot index into the quantized axis of an MXTensor")
+
+        codes = self.codes[other_key]
+        scales = self.scales[other_key]
+        shape = [len(range(*k.indices(n))) for k, n in zip(key, self.shape)
+                 if isinstance(k, slice)]
+        axis = sum(isinstance(k, slice) for k in key[:self.axis])
+
+        length = self.shape[self.axis]
+        start, stop, step = axis_key.indices(length)
+        if (start, stop, step) != (0, length, 1):
+            if step != 1 or start % self.block_size or \
+                    (stop % self.block_size and stop != length):
+                raise IndexError("MXTensor slices along the quantized axis "
+                                 "must be on block boundaries")
+            stop = max(start, stop)
+            first, last = start // self.block_size, -(-stop // self.block_size)
+            blocks = _unpack_codes(codes, self.n_bits,
+                                   self.n_blocks * self.block_size)
+            blocks = blocks[..., first * self.block_size:last * self.block_size]
+            codes = _pack_codes(blocks, self.n_bits)
+            scales = scales[..., first:last]
+
+        return MXTensor(codes, scales, shape, axis, self.block_size,
+                        self.elem_format)
+
+    # ---------------------------------------------------------------------
+    # Serialization
+    # ---------------------------------------------------------------------
+    def state_dict(self):
+        return {
+            "codes": self.codes,
+            "scales": self.scales,
+            "shape": list(self.shape),
+            "axis": self.axis,
+            "block_size": self.block_size,
+            "elem_format": self.elem_format.name,
+        }
+
+    @classmethod
+    def from_state_dict(cls, state):
+        return cls(state["codes"], state["scales"], state["shape"],
+                   state["axis"], state["block_size"], state["elem_format"])
@@ -7,6 +7,8 @@ import torch
 import torch.nn.functional as F
 
 from .vector_ops import *
+from .vector_ops import _quantize_, _quantize_keeps_dtype
+from .mx_ops import FUSED_CHUNK_ELEMS
 
 def _get_group_shape(x, axis, groups):
     """ Compute the shape to reshape to when doing GroupNorm.
@@ -256,3 +258,289 @@ def _norm_backward_LN(grad_output, axes, weight,
 
     grad_input = dx
     return grad_input
+
+
+#-------------------------------------------------------------------------
+# Fused norm engine (norm_fused)
+#
+# The functions below run the steps of _norm_forward/_norm_backward/
+# _norm_backward_LN and of RMSNorm in place in a couple of buffers,
+# with the same quantization points in the same order, so the results
+# are bit-identical. When dim 0 is not reduced, they go through the
+# tensor a chunk of dim 0 at a time so each chunk stays in cache.
+# BatchNorm and GroupNorm save x_shift and x_std_inv for backward and
+# recompute x_norm from them.
+#-------------------------------------------------------------------------
+def _norm_fused_supported(mx_specs, x, *tensors):
+    """ Cases handled by the fused norm engine """
+    return (
+        mx_specs['norm_fused']
+        and x.numel() > 0
+        and x.dtype in (torch.float32, torch.float16, torch.bfloat16)
+        and all(t.dtype == x.dtype for t in tensors)
+        and _quantize_keeps_dtype(mx_specs)
+    )
+
+
+def _norm_chunks(x, axes):
+    """ Slices of dim 0 that are normalized one at a time """
+    if 0 in axes:
+        return [slice(None)]
+    rows = max(1, FUSED_CHUNK_ELEMS // (x.numel() // x.shape[0]))
+    return [slice(i, i + rows) for i in range(0, x.shape[0], rows)]
+
+
+def _norm_forward_fused(x, axes, weight, bias, eps, mx_specs,
+                        groups=None, weight_axis=None,
+                        use_running_stats=False,
+                        running_mean=None, running_var=None,
+                        center=True, keep_x_norm=False):
+    """ _norm_forward with the fused engine. Args as in _norm_forward, plus:
+            center: subtract the mean, False for RMSNorm
+            keep_x_norm: return x_norm (LayerNorm, RMSNorm) instead of
+                x_shift (BatchNorm, GroupNorm). The other one is None.
+
+        Returns the same tuple as _norm_forward
+    """
+    if type(axes) is not list:
+        assert(type(axes) is int)
+        axes = [axes]
+    axes = [a % x.ndim for a in axes]
+    orig_shape = x.shape
+
+    if weight_axis is not None:
+        w_shape = [1 for _ in range(x.ndim)]
+        w_shape[weight_axis] = x.shape[weight_axis]
+        weight = weight.view(w_shape)
+        bias = bias.view(w_shape)
+
+    rows = not groups and axes == [x.ndim - 1]
+    if groups:
+        _, grouped_shape = _get_group_shape(x, axes[0], groups)
+        x = x.view(grouped_shape)
+        axes = [a+1 for a in axes]
+    elif rows:
+        x = x.reshape(-1, x.shape[-1])
+        axes = [1]
+
+    if use_running_stats:
+        reduced_shape = list(x.shape)
+        reduced_shape[0] = 1
+        for i in axes:
+            reduced_shape[i] = 1
+        x_mean = vec_quantize(running_mean, mx_specs=mx_specs)
+        x_mean = x_mean.view(reduced_shape)
+        x_var = vec_quantize(running_var, mx_specs=mx_specs)
+        x_var = x_var.view(reduced_shape)
+        chunks = [slice(None)]
+    else:
+        chunks = _norm_chunks(x, axes)
+
+    # x_shift, then the output if keep_x_norm
+    buf1 = torch.empty(x.shape, dtype=x.dtype, device=x.device)
+    # x_shift**2, then x_norm, then the output if not keep_x_norm
+    buf2 = torch.empty_like(buf1)
+    stats = []
+
+    for c in chunks:
+        xc = x[c]
+        if center:
+            if not use_running_stats:
+                x_mean = vec_reduce_mean(xc, axes, keepdim=True,
+                                         mx_specs=mx_specs)
+            x_shift = _quantize_(torch.sub(xc, x_mean, out=buf1[c]),
+                                 mx_specs)
+        else:
+            x_shift = xc
+
+        if not use_running_stats:
+            x_shift_pow2 = _quantize_(
+                    torch.mul(x_shift, x_shift, out=buf2[c]), mx_specs)
+            x_var = vec_reduce_mean(x_shift_pow2, axes, keepdim=True,
+                                    mx_specs=mx_specs)
+
+        x_vare = vec_add(x_var, eps, mx_specs=mx_specs)
+        x_std = vec_sqrt(x_vare, mx_specs=mx_specs)
+        x_std_inv = vec_recip(x_std, mx_specs=mx_specs)
+        x_norm = _quantize_(torch.mul(x_shift, x_std_inv, out=buf2[c]),
+                            mx_specs)
+
+        output = buf1[c] if keep_x_norm else x_norm
+        if groups:
+            chunk_shape = (x_norm.shape[0],) + orig_shape[1:]
+            x_norm = x_norm.view(chunk_shape)
+            output = output.view(chunk_shape)
+        _quantize_(torch.mul(x_norm, weight, out=output), mx_specs)
+        _quantize_(output.add_(bias), mx_specs)
+
+        stats.append((x_mean if center else None, x_std_inv, x_vare))
+
+    x_mean, x_std_inv, x_vare = [
+            None if t[0] is None else torch.cat(t) for t in zip(*stats)]
+    if rows:
+        x_std_inv = x_std_inv.view(*orig_shape[:-1], 1)
+        x_vare = x_vare.view(*orig_shape[:-1], 1)
+        if center:
+            x_mean = x_mean.view(*orig_shape[:-1], 1)
+
+    output = (buf1 if keep_x_norm else buf2).view(orig_shape)
+    if keep_x_norm:
+        return output, None, buf2.view(orig_shape), x_std_inv, x_mean, x_vare
+    return output, buf1, None, x_std_inv, x_mean, x_vare
+
+
+def _norm_backward_fused(grad_output, axes, weight, x_shift, x_std_inv,
+                         mx_specs, fwd_mx_specs,
+                         groups=None, weight_axis=None):
+    """ BatchNorm/GroupNorm backward with the fused engine, from
+        x_shift and x_std_inv returned by _norm_forward_fused. Quantizes
+        grad_output and computes grad_weight and grad_bias over all dims
+        but weight_axis, recomputing x_norm with the forward specs
+        fwd_mx_specs, then grad_input as _norm_backward does.
+
+        Returns grad_input, grad_weight, grad_bias
+    """
+    if type(axes) is not list:
+        assert(type(axes) is int)
+        axes = [axes]
+    axes = [a % grad_output.ndim for a in axes]
+    sum_axes = [i for i in range(grad_output.ndim) if i != weight_axis]
+
+    w_shape = [1 for _ in range(grad_output.ndim)]
+    w_shape[weight_axis] = grad_output.shape[weight_axis]
+    weight = weight.view(w_shape)
+
+    orig_shape = grad_output.shape
+    if groups:
+        _, grouped_shape = _get_group_shape(grad_output, axes[0], groups)
+        axes = [a+1 for a in axes]
+    else:
+        grouped_shape = orig_shape
+
+    grad_output = vec_quantize(grad_output, mx_specs=mx_specs)
+    grad_bias = vec_reduce_sum(grad_output, sum_axes, mx_specs=mx_specs)
+
+    # x_norm as in _norm_forward, then grad_output * x_norm
+    buf = torch.mul(x_shift, x_std_inv)
+    buf = _quantize_(buf, fwd_mx_specs).view(orig_shape)
+    grad_weight = vec_reduce_sum(_quantize_(buf.mul_(grad_output), mx_specs),
+                                 sum_axes, mx_specs=mx_specs)
+
+    # grad_input is computed in buf
+    dx = buf.view(grouped_shape)
+    chunks = _norm_chunks(dx, axes)
+    tmp = torch.empty(grad_output[chunks[0]].shape, dtype=buf.dtype,
+                      device=buf.device)
+
+    for c in chunks:
+        x_shift_c = x_shift[c]
+        x_std_inv_c = x_std_inv[c]
+        n = x_shift_c.shape[0]
+
+        # dx_norm = grad * w
+        dx_norm = torch.mul(grad_output[c], weight, out=tmp[:n])
+        dx_norm = _quantize_(dx_norm, mx_specs).view(x_shift_c.shape)
+        # dx_shift = grad * w / x_std
+        dx_shift = _quantize_(torch.mul(dx_norm, x_std_inv_c, out=dx[c]),
+                              mx_specs)
+        dx_mean = vec_reduce_mean(-dx_shift, axes, keepdim=True,
+                                  mx_specs=mx_specs)
+
+        # dx_std = mean(grad * w * x_shift) / x_std**3
+        dx_std = _quantize_(dx_norm.mul_(x_shift_c), mx_specs)
+        dx_std = vec_reduce_mean(dx_std, axes, keepdim=True,
+                                 mx_specs=mx_specs)
+        x_vare_inv = vec_mul(x_std_inv_c, x_std_inv_c, mx_specs=mx_specs)
+        dx_std = vec_mul(dx_std, x_vare_inv, mx_specs=mx_specs)
+        dx_std = vec_mul(dx_std, x_std_inv_c, mx_specs=mx_specs)
+        # dx_shift2 = -dx_std * x_shift
+        dx_shift2 = _quantize_(torch.mul(x_shift_c, -dx_std, out=dx_norm),
+                               mx_specs)
+
+        # dx = dx_shift + dx_shift2 + dx_mean
+        _quantize_(dx_shift.add_(dx_shift2), mx_specs)
+        _quantize_(dx_shift.add_(dx_mean), mx_specs)
+
+    return buf.view(orig_shape), grad_weight, grad_bias
+
+
+def _norm_backward_LN_fused(grad_output, weight, x_norm, x_vare,
+                            mx_specs, center=True):
+    """ LayerNorm backward with the fused engine, from x_norm and x_vare
+        returned by _norm_forward_fused(..., keep_x_norm=True). Quantizes
+        grad_output and computes grad_weight and grad_bias, then
+        grad_input as _norm_backward_LN does. With center=False, x_vare
+        is x_rms_inv and grad_input is computed as in RMSNorm.
+
+        Returns grad_input, grad_weight, grad_bias
+    """
+    orig_shape = grad_output.shape
+    sum_axes = list(range(grad_output.ndim - 1))
+
+    grad_output = vec_quantize(grad_output, mx_specs=mx_specs)
+    grad_bias = vec_reduce_sum(grad_output, sum_axes, mx_specs=mx_specs)
+
+    buf = torch.empty(orig_shape, dtype=x_norm.dtype, device=x_norm.device)
+    grad_weight = _quantize_(torch.mul(grad_output, x_norm, out=buf),
+                             mx_specs)
+    grad_weight = vec_reduce_sum(grad_weight, sum_axes, mx_specs=mx_specs)
+
+    # Normalize rows
+    H = orig_shape[-1]
+    grad_output = grad_output.reshape(-1, H)
+    x_norm = x_norm.reshape(-1, H)
+    x_vare = x_vare.reshape(-1, 1)
+    dx = buf.view(-1, H)
+
+    if center:
+        x_std = vec_sqrt(x_vare, mx_specs=mx_specs)
+        x_std_inv = vec_div(1.0, x_std, mx_specs=mx_specs)
+        x_vare_inv = vec_div(1.0, x_vare, mx_specs=mx_specs)
+    else:
+        x_std_inv = x_vare
+
+    chunks = _norm_chunks(dx, [1])
+    tmp = torch.empty(dx[chunks[0]].shape, dtype=buf.dtype,
+                      device=buf.device)
+
+    for c in chunks:
+        x_norm_c = x_norm[c]
+        n = x_norm_c.shape[0]
+
+        # dx_norm = grad * w
+        dx_norm = torch.mul(grad_output[c], weight, out=dx[c])
+        dx_norm = _quantize_(dx_norm, mx_specs)
+
+        if not center:
+            # dx1 = dx_norm / x_rms
+            dx1 = _quantize_(dx_norm.mul_(x_std_inv[c]), mx_specs)
+            dx_norm2 = _quantize_(torch.mul(dx1, x_norm_c, out=tmp[:n]),
+                                  mx_specs)
+            dx_norm2 = vec_reduce_mean(dx_norm2, -1, keepdim=True,
+                                       mx_specs=mx_specs)
+            dx_norm3 = _quantize_(torch.mul(x_norm_c, dx_norm2, out=tmp[:n]),
+                                  mx_specs)
+            dx1.sub_(dx_norm3)
+            continue
+
+        # dx_shift = grad * w / x_std, in tmp while dx_norm is needed
+        dx_shift = _quantize_(torch.mul(dx_norm, x_std_inv[c], out=tmp[:n]),
+                              mx_specs)
+
+        # dx_std_tmp = mean(grad * w * x_shift) / x_var
+        dx_std_tmp = _quantize_(dx_norm.mul_(x_norm_c), mx_specs)
+        dx_std_tmp = _quantize_(dx_std_tmp.mul_(x_std[c]), mx_specs)
+        dx_std_tmp = vec_reduce_mean(dx_std_tmp, -1, keepdim=True,
+                                     mx_specs=mx_specs)
+        dx_std_tmp = vec_mul(dx_std_tmp, x_vare_inv[c], mx_specs=mx_specs)
+        # dx_shift2 = -dx_std_tmp * x_norm
+        dx_shift2 = _quantize_(torch.mul(x_norm_c, -dx_std_tmp, out=dx[c]),
+                               mx_specs)
+
+        # dx = dx_shift + dx_shift2 - mean(dx)
+        dx_c = _quantize_(dx_shift2.add_(dx_shift), mx_specs)
+        dx_mean = vec_reduce_mean(dx_c, -1, keepdim=True,
+                                  mx_specs=mx_specs)
+        _quantize_(dx_c.add_(-dx_mean), mx_specs)
+
+    return buf, grad_weight, grad_bias
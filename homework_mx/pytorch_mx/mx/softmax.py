@@ -8,6 +8,8 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from .vector_ops import *
+from .vector_ops import _quantize_, _quantize_keeps_dtype
+from .mx_ops import FUSED_CHUNK_ELEMS
 from .specs import apply_mx_specs, get_backwards_mx_specs
 from .specs import mx_assert_test
 
@@ -15,6 +17,95 @@ f_softmax = F.softmax
 LN_2_BF16 = 0.69140625   # ln(2) in bfloat16 precision
 
 
+#-------------------------------------------------------------------------
+# Fused softmax (softmax_fused)
+#-------------------------------------------------------------------------
+def _softmax_fused_supported(A, dim, mx_specs):
+    """ Cases handled by _softmax_forward_fused/_softmax_backward_fused """
+    return (
+        mx_specs['softmax_fused']
+        and dim == A.ndim - 1
+        and A.numel() > 0
+        and A.dtype in (torch.float32, torch.float16, torch.bfloat16)
+        and _quantize_keeps_dtype(mx_specs)
+    )
+
+
+def _softmax_forward_fused(input, mx_specs, chunk_elems=FUSED_CHUNK_ELEMS):
+    """ SoftmaxFunction.forward along the last dim. Each chunk of rows
+        goes through the same quantized steps in place in the output
+        buffer while it is in cache, so the results are bit-identical.
+        The max and the sum need the whole row before the next step is
+        quantized, so they are computed per chunk rather than online. """
+    round = mx_specs['round']
+    length = input.shape[-1]
+    X = input.reshape(-1, length)
+    out = torch.empty(X.shape, dtype=X.dtype, device=X.device)
+    rows = max(1, chunk_elems // length)
+
+    for r0 in range(0, X.shape[0], rows):
+        x = out[r0:r0 + rows]
+        x.copy_(X[r0:r0 + rows])
+        _quantize_(x, mx_specs, round)
+
+        # subtract the max
+        x.sub_(x.amax(-1, keepdim=True))
+        _quantize_(x, mx_specs, round)
+
+        # exponentiation, as vec_exp2/vec_exp
+        if mx_specs['softmax_exp2']:
+            _quantize_(x.exp2_(), mx_specs, round)
+        elif mx_specs['vec_use_exp2']:
+            _quantize_(x.mul_(LOG2_E_BF16), mx_specs, round)
+            _quantize_(x.exp2_(), mx_specs, round)
+        else:
+            _quantize_(x.exp_(), mx_specs, round)
+
+        # sum and divide, as vec_reduce_sum/vec_div
+        x_sum = _quantize_(x.sum(-1, keepdim=True), mx_specs, round)
+        if mx_specs['vec_use_recip']:
+            x.mul_(_quantize_(1. / x_sum, mx_specs, round))
+        else:
+            x.div_(x_sum)
+        _quantize_(x, mx_specs, round)
+
+    return out.view(input.shape)
+
+
+def _softmax_backward_fused(output, grad_output, mx_specs,
+                            chunk_elems=FUSED_CHUNK_ELEMS):
+    """ SoftmaxFunction.backward along the last dim, a chunk of rows at
+        a time like _softmax_forward_fused. Bit-identical. """
+    round = mx_specs['round']
+    length = output.shape[-1]
+    O = output.reshape(-1, length)
+    G = grad_output.reshape(-1, length)
+    out = torch.empty(G.shape, dtype=G.dtype, device=G.device)
+    rows = max(1, chunk_elems // length)
+    tmp = torch.empty(min(rows, G.shape[0]), length,
+                      dtype=G.dtype, device=G.device)
+
+    for r0 in range(0, G.shape[0], rows):
+        g = out[r0:r0 + rows]
+        o = O[r0:r0 + rows]
+        g.copy_(G[r0:r0 + rows])
+        _quantize_(g, mx_specs, round)
+
+        # dot product of grad_output and output
+        g_out = torch.mul(g, o, out=tmp[:g.shape[0]])
+        _quantize_(g_out, mx_specs, round)
+        g_sum = _quantize_(g_out.sum(-1, keepdim=True), mx_specs, round)
+
+        _quantize_(g.sub_(g_sum), mx_specs, round)
+        _quantize_(g.mul_(o), mx_specs, round)
+
+        # Adjust for exp2 constant
+        if mx_specs['softmax_exp2']:
+            _quantize_(g.mul_(LN_2_BF16), mx_specs, round)
+
+    return out.view(grad_output.shape)
+
+
 class SoftmaxFunction(torch.autograd.Function):
     @staticmethod
     def forward(ctx, input, dim=None, mx_specs=None, name=None):
@@ -23,6 +114,12 @@ class SoftmaxFunction(torch.autograd.Function):
 
         ctx.softmax_exp2 = mx_specs.get('softmax_exp2', False)
 
+        if _softmax_fused_supported(input, dim, mx_specs):
+            output = _softmax_forward_fused(input, mx_specs)
+            ctx.save_for_backward(output)
+            ctx.mx_specs = get_backwards_mx_specs(mx_specs)
+            return output
+
         input = vec_quantize(input, mx_specs=mx_specs)
 
         # compute max
@@ -58,6 +155,12 @@ class SoftmaxFunction(torch.autograd.Function):
         # load context
         output, = ctx.saved_tensors
 
+        if _softmax_fused_supported(output, ctx.dim, ctx.mx_specs) and \
+                grad_output.dtype == output.dtype:
+            grad_input = _softmax_backward_fused(output, grad_output,
+                                                 ctx.mx_specs)
+            return (grad_input, None, None, None)
+
         grad_output = vec_quantize(grad_output,
                                    mx_specs=ctx.mx_specs,
                                    round=ctx.mx_specs['round'])
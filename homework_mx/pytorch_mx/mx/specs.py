@@ -113,10 +113,17 @@ class MxSpecs(collections.UserDict):
             "round_mx_grad_output_grad_weight": "nearest",
 
             "softmax_exp2": False,
+            "softmax_fused": False,
+            "norm_fused": False,
             "vec_use_exp2": False,
             "vec_use_recip": False,
+            "vec_inplace": False,
 
             "custom_cuda": False,
+            "mx_fused_cpu": False,
+            "exp_method": "log2",
+            "cache_weights": False,
+            "int_matmul": False,
         }
 
         self.help_strings = {
@@ -157,10 +164,24 @@ class MxSpecs(collections.UserDict):
             "round_mx_grad_output_grad_weight": "",
 
             "softmax_exp2": "Softmax uses 2^x instead of e^x",
+            "softmax_fused": "Softmax over the last dim runs its quantized steps in place, "
+                             "a chunk of rows at a time (bit-identical)",
+            "norm_fused": "LayerNorm, RMSNorm, BatchNorm and GroupNorm run their quantized "
+                          "steps in place and save fewer tensors for backward (bit-identical)",
             "vec_use_exp2": "Use 2^x to compute e^x",
             "vec_use_recip": "Use 1/x to compute division",
+            "vec_inplace": "vec_* ops quantize their result in place, with scratch "
+                           "tensors from a reused workspace (elemwise_ops.clear_workspace)",
 
             "custom_cuda": "Enable custom CUDA kernels for quantization",
+            "mx_fused_cpu": "Use the fused single-pass CPU path for MX quantization "
+                            "(bit-identical to the default path)",
+            "exp_method": "How quantizers get floor(log2|x|) and 2**exp. Options: "
+                          "log2 (torch.log2/pow), bits (IEEE exponent field, exact)",
+            "cache_weights": "Linear/Conv layers reuse their quantized weights until "
+                             "the weights, an optimizer step or the specs change",
+            "int_matmul": "Linear/matmul with int element formats multiply the int8 "
+                          "codes per block with int32 accumulation (see int_matmul.py)",
         }
 
         for k in defaults:
@@ -0,0 +1,187 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Test that exponent extraction from the fp32 bit pattern (exp_method="bits")
+matches the torch.log2 path of the elemwise and MX quantizers.
+"""
+
+import pytest
+import torch
+import numpy as np
+
+from .common_lib import check_diff_quantize, all_encodings
+
+from mx.specs import finalize_mx_specs
+from mx.elemwise_ops import (
+    _floor_log2,
+    _pow2_floor_log2,
+    _quantize_elemwise,
+    _quantize_bfloat,
+    _quantize_fp,
+    quantize_elemwise_op,
+)
+from mx.mx_ops import _quantize_mx
+
+np.random.seed(0xd10)
+
+ELEM_FMTS = [
+    ("fp8_e5m2"),
+    ("fp8_e4m3"),
+    ("fp6_e3m2"),
+    ("fp6_e2m3"),
+    ("fp4_e2m1"),
+    ("int8"),
+]
+
+
+def _near_pow2(x):
+    """ |x| less than 2**-18 (relative) below a power of two, where float
+        log2 can round up to the next integer (up to 44 ulps for normals)
+        and the two exp methods differ """
+    m, _ = np.frexp(np.abs(x.numpy()))
+    return torch.as_tensor(m >= 1 - 2.0**-18)
+
+
+def _inputs():
+    # Every bfloat16 encoding plus random values over the whole fp32 range,
+    # without the values where the exp methods are documented to differ
+    rng = np.random.default_rng(0xd10)
+    x = all_encodings(8, 7)
+    r = rng.standard_normal(4096) * 2.0**rng.integers(-140, 120, size=4096)
+    r = torch.as_tensor(r, dtype=torch.float32)
+    return torch.cat([x, r[~_near_pow2(r)]])
+
+
+def _pow2_neighbours():
+    """ 1 to 44 ulps below every normal power of two, and just below the
+        powers of two in the subnormal range """
+    exps = torch.arange(2, 255, dtype=torch.int32) << 23
+    x = [(exps - d).view(torch.float32) for d in range(1, 45)]
+    x.append(torch.as_tensor([2**j - d for j in range(19, 24) for d in (1, 2)],
+                             dtype=torch.int32).view(torch.float32))
+    x = torch.cat(x)
+    return torch.cat([x, -x])
+
+
+@pytest.mark.parametrize("elem_format", ELEM_FMTS)
+@pytest.mark.parametrize("round", ('nearest', 'floor', 'even'))
+@pytest.mark.parametrize("allow_denorm", (True, False))
+def test_elemwise_bits(elem_format, round, allow_denorm):
+    x = _inputs()
+
+    y1 = _quantize_elemwise(x, elem_format, round=round,
+                            allow_denorm=allow_denorm)
+    y2 = _quantize_elemwise(x, elem_format, round=round,
+                            allow_denorm=allow_denorm, exp_method="bits")
+
+    check_diff_quantize(x, y1, y2, handle_infs=True)
+
+
+@pytest.mark.parametrize("bfloat", (16, 12, 10))
+@pytest.mark.parametrize("round", ('nearest', 'floor', 'even'))
+def test_bfloat_bits(bfloat, round):
+    x = _inputs()
+
+    y1 = _quantize_bfloat(x, bfloat, round=round)
+    y2 = _quantize_bfloat(x, bfloat, round=round, exp_method="bits")
+
+    check_diff_quantize(x, y1, y2, handle_infs=True)
+
+
+@pytest.mark.parametrize("bfloat", (16, 12, 10))
+@pytest.mark.parametrize("round", ('nearest', 'floor', 'even'))
+def test_bfloat_bits_near_pow2(bfloat, round):
+    """ Where the methods differ, bits gives the exact exponent: it matches
+        the log2 path in float64, where log2 does not round up """
+    x = _pow2_neighbours()
+    assert _near_pow2(x).all()
+
+    y1 = _quantize_bfloat(x.double(), bfloat, round=round).float()
+    y2 = _quantize_bfloat(x, bfloat, round=round, exp_method="bits")
+
+    assert torch.equal(y1, y2)
+
+
+def test_floor_log2_near_pow2():
+    x = _pow2_neighbours().abs()
+
+    _, e = np.frexp(x.numpy())
+    assert torch.equal(_floor_log2(x), torch.as_tensor(e - 1, dtype=torch.float32))
+
+
+@pytest.mark.parametrize("exp_bits, mantissa_bits", [(5, 12), (5, 2), (6, 3)])
+def test_fp_bits(exp_bits, mantissa_bits):
+    x = _inputs()
+
+    y1 = _quantize_fp(x, exp_bits, mantissa_bits)
+    y2 = _quantize_fp(x, exp_bits, mantissa_bits, exp_method="bits")
+
+    check_diff_quantize(x, y1, y2, handle_infs=True)
+
+
+@pytest.mark.parametrize("scale_bits", (8, 5))
+@pytest.mark.parametrize("elem_format", ELEM_FMTS)
+@pytest.mark.parametrize("block_size", (0, 32))
+@pytest.mark.parametrize("fused_cpu", (False, True))
+def test_mx_bits(scale_bits, elem_format, block_size, fused_cpu):
+    x = all_encodings(8, 9)
+
+    y1 = _quantize_mx(x, scale_bits, elem_format, block_size=block_size,
+                      axes=[-1])
+    y2 = _quantize_mx(x, scale_bits, elem_format, block_size=block_size,
+                      axes=[-1], fused_cpu=fused_cpu, exp_method="bits")
+
+    check_diff_quantize(x, y1, y2, handle_infs=True)
+
+
+def test_floor_log2_exact():
+    """ Values where float log2 rounds up to the next integer """
+    vals = [4 * (1 - 2.0**-24), 8 * (1 - 2.0**-24), 2.0**-149, 3e-42,
+            2.0**-126, 1.0, 3.0, 2.0**127 * 1.5]
+    x = torch.as_tensor(vals, dtype=torch.float32)
+
+    _, e = np.frexp(x.numpy())
+    assert torch.equal(_floor_log2(x), torch.as_tensor(e - 1, dtype=torch.float32))
+
+
+def test_floor_log2_special():
+    x = torch.as_tensor([0., float("Inf"), float("NaN")])
+    y = _floor_log2(x)
+
+    assert y[0] == float("-Inf")
+    assert y[1] == float("Inf")
+    assert torch.isnan(y[2])
+
+
+def test_pow2_floor_log2():
+    x = torch.as_tensor([0., -3., 1e-40, 2.0**-10, 5., float("Inf")])
+    y = _pow2_floor_log2(x, -8)
+
+    expected = [2.0**-8, 2., 2.0**-8, 2.0**-8, 4., 2.0**127]
+    assert torch.equal(y, torch.as_tensor(expected))
+
+
+def test_bits_spec():
+    mx_specs = finalize_mx_specs({"bfloat": 16, "exp_method": "bits"})
+    x = _inputs()
+
+    y1 = _quantize_bfloat(x, 16)
+    y2 = quantize_elemwise_op(x, mx_specs)
+
+    check_diff_quantize(x, y1, y2, handle_infs=True)
+
+
+def test_bits_fp16_input():
+    """ Non-fp32 inputs fall back to log2 """
+    x = torch.randn(64).half()
+
+    y1 = _quantize_elemwise(x, "fp8_e4m3")
+    y2 = _quantize_elemwise(x, "fp8_e4m3", exp_method="bits")
+
+    assert torch.equal(y1, y2)
+
+
+def test_bad_exp_method():
+    with pytest.raises(Exception):
+        _quantize_elemwise(torch.ones(4), "fp8_e4m3", exp_method="frexp")
@@ -0,0 +1,98 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Test that the fused CPU MX quantizer matches the reference path bit for bit.
+"""
+
+import pytest
+import torch
+import numpy as np
+
+from .common_lib import check_diff_quantize, all_encodings
+
+from mx.specs import finalize_mx_specs
+from mx.mx_ops import _quantize_mx, _quantize_mx_fused_cpu, quantize_mx_op
+
+np.random.seed(0xd10)
+
+ELEM_FMTS = [
+    ("fp8_e5m2"),
+    ("fp8_e4m3"),
+    ("fp6_e3m2"),
+    ("fp6_e2m3"),
+    ("fp4_e2m1"),
+    ("int8"),
+    ("int4"),
+    ("int2"),
+]
+
+
+@pytest.mark.parametrize("scale_bits", (8, 5))
+@pytest.mark.parametrize("elem_format", ELEM_FMTS)
+@pytest.mark.parametrize("block_size", (0, 8, 9, 64))
+@pytest.mark.parametrize("round", ('nearest', 'floor', 'even'))
+@pytest.mark.parametrize("flush_fp32_subnorms", (False, True))
+def test_fused_encoding(scale_bits, elem_format, block_size, round,
+                        flush_fp32_subnorms):
+    x = all_encodings(8, 9, device="cpu")
+
+    y1 = _quantize_mx(x, scale_bits, elem_format,
+                      block_size=block_size,
+                      axes=[-1],
+                      round=round,
+                      flush_fp32_subnorms=flush_fp32_subnorms)
+
+    y2 = _quantize_mx(x, scale_bits, elem_format,
+                      block_size=block_size,
+                      axes=[-1],
+                      round=round,
+                      flush_fp32_subnorms=flush_fp32_subnorms,
+                      fused_cpu=True)
+
+    check_diff_quantize(x, y1, y2, handle_infs=True)
+
+
+@pytest.mark.parametrize("size, axis", [
+    ((33, 70), 0),
+    ((33, 70), 1),
+    ((4, 3, 37), 1),
+    ((4, 3, 37), -1),
+    ((1, 3, 5, 5), 1),     # conv channels shorter than a block
+])
+@pytest.mark.parametrize("block_size", (0, 32))
+@pytest.mark.parametrize("chunk_elems", (64, 1 << 16))
+def test_fused_axes_and_chunks(size, axis, block_size, chunk_elems):
+    """ Ragged tail blocks, non-innermost axes and chunks smaller than a row """
+    x = torch.as_tensor(np.random.randn(*size) * 100, dtype=torch.float32)
+
+    y1 = _quantize_mx(x, 8, "fp6_e2m3", block_size=block_size, axes=[axis])
+    y2 = _quantize_mx_fused_cpu(x, 8, "fp6_e2m3", axis % x.ndim,
+                                block_size=block_size,
+                                chunk_elems=chunk_elems)
+
+    assert y2.is_contiguous()
+    check_diff_quantize(x, y1, y2, handle_infs=True)
+
+
+@pytest.mark.parametrize("val", [float("NaN"), float("Inf"), float("-Inf")])
+def test_fused_nans(val):
+    x = torch.as_tensor([[val, 0, 2**127, 0], [1, 2, 3, 4]], dtype=torch.float32)
+
+    y1 = _quantize_mx(x, 8, "fp8_e4m3", block_size=4, axes=[-1], round="floor")
+    y2 = _quantize_mx(x, 8, "fp8_e4m3", block_size=4, axes=[-1], round="floor",
+                      fused_cpu=True)
+
+    check_diff_quantize(x, y1, y2, handle_infs=True)
+
+
+def test_fused_spec():
+    mx_specs = finalize_mx_specs({"w_elem_format": "fp8_e4m3",
+                                  "block_size": 32,
+                                  "mx_fused_cpu": True})
+    x = torch.as_tensor(np.random.randn(16, 96), dtype=torch.float32)
+
+    y1 = _quantize_mx(x, 8, "fp8_e4m3", block_size=32, axes=[-1])
+    y2 = quantize_mx_op(x, mx_specs, elem_format="fp8_e4m3", axes=[-1])
+
+    check_diff_quantize(x, y1, y2)
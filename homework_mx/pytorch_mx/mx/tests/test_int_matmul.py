@@ -0,0 +1,148 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Test the integer-domain matmul engine against the emulated fp32 path.
+"""
+
+import copy
+import pytest
+import numpy as np
+import torch
+
+from .common_lib import check_diff
+
+from mx.specs import finalize_mx_specs
+from mx.mx_ops import _quantize_mx
+from mx.int_matmul import use_int_matmul, int_operand_op, int_matmul_op
+from mx import Linear, matmul
+
+np.random.seed(0xd10)
+torch.manual_seed(0xd10)
+
+ELEM_FMTS = ["int8", "int4", "int2"]
+
+
+def _specs(elem_format, block_size, int_matmul, **kwargs):
+    return finalize_mx_specs(dict({
+        "w_elem_format": elem_format,
+        "a_elem_format": elem_format,
+        "block_size": block_size,
+        "bfloat": 16,
+        "exp_method": "bits",
+        "int_matmul": int_matmul,
+    }, **kwargs))
+
+
+def _emulated(x, elem_format, block_size, round="nearest"):
+    return _quantize_mx(x, 8, elem_format, block_size=block_size, axes=[-1],
+                        round=round, exp_method="bits")
+
+
+@pytest.mark.parametrize("elem_format", ELEM_FMTS)
+@pytest.mark.parametrize("block_size", (0, 256, 300))
+@pytest.mark.parametrize("round", ("nearest", "floor", "even"))
+def test_int_matmul_op(elem_format, block_size, round):
+    x = torch.as_tensor(np.random.randn(19, 700) * 10, dtype=torch.float32)
+    w = torch.as_tensor(np.random.randn(23, 700), dtype=torch.float32)
+    mx_specs = _specs(elem_format, block_size, True)
+
+    y1 = _emulated(x, elem_format, block_size, round) @ \
+        _emulated(w, elem_format, block_size, round).t()
+    y2 = int_matmul_op(int_operand_op(x, mx_specs, elem_format, round=round),
+                       int_operand_op(w, mx_specs, elem_format, round=round))
+
+    check_diff(y1, y2, tol=1e-6)
+
+
+def test_int_operand_codes():
+    """ codes * scales gives back the MX-quantized values """
+    x = torch.as_tensor(np.random.randn(5, 600), dtype=torch.float32)
+    mx_specs = _specs("int4", 256, True)
+    codes, scales = int_operand_op(x, mx_specs, "int4")
+
+    assert codes.dtype == torch.int8 and codes.shape == (3, 5, 256)
+    assert codes.abs().max() <= 7
+    y = (codes.float() * scales.unsqueeze(-1)).movedim(0, 1).flatten(-2)
+    assert torch.equal(y[:, :600], _emulated(x, "int4", 256))
+
+
+@pytest.mark.parametrize("size1, size2", [
+    ((2, 3, 5, 600), (3, 600, 7)),
+    ((4, 9, 512), (512, 6)),
+    ((1, 8, 300), (2, 300, 8)),
+])
+def test_int_matmul_broadcast(size1, size2):
+    in1 = torch.randn(size1)
+    in2 = torch.randn(size2)
+    mx_specs = _specs("int8", 256, True)
+
+    y1 = _emulated(in1, "int8", 256) @ \
+        _emulated(in2.transpose(-1, -2), "int8", 256).transpose(-1, -2)
+    y2 = int_matmul_op(int_operand_op(in1, mx_specs, "int8"),
+                       int_operand_op(in2.transpose(-1, -2), mx_specs, "int8"))
+
+    assert y2.shape == y1.shape
+    check_diff(y1, y2, tol=1e-6)
+
+
+def test_int_matmul_nans():
+    x = torch.randn(4, 512)
+    x[1, 3] = float("NaN")
+    x[2, 300] = float("Inf")
+    w = torch.randn(5, 512)
+    mx_specs = _specs("int8", 256, True)
+
+    y = int_matmul_op(int_operand_op(x, mx_specs, "int8"),
+                      int_operand_op(w, mx_specs, "int8"))
+
+    assert torch.isnan(y[1:3]).all()
+    assert torch.isfinite(y[[0, 3]]).all()
+
+
+@pytest.mark.parametrize("elem_format", ELEM_FMTS)
+@pytest.mark.parametrize("cache_weights", (False, True))
+def test_int_linear(elem_format, cache_weights):
+    """ Same forward within fp32 rounding, the same backward """
+    layer = Linear(768, 40, mx_specs=_specs(elem_format, 256, False))
+    int_layer = copy.deepcopy(layer)
+    int_layer.apply_mx_specs(_specs(elem_format, 256, True,
+                                    cache_weights=cache_weights))
+    x1 = torch.randn(3, 5, 768, requires_grad=True)
+    x2 = x1.detach().clone().requires_grad_()
+
+    for _ in range(2):
+        y1 = layer(x1)
+        y2 = int_layer(x2)
+        check_diff(y1, y2, tol=1e-5)
+
+        g = torch.randn_like(y1)
+        y1.backward(g)
+        y2.backward(g)
+        assert torch.equal(x1.grad, x2.grad)
+        assert torch.equal(layer.weight.grad, int_layer.weight.grad)
+
+
+@pytest.mark.parametrize("mode_config", ("aa", "aw"))
+def test_int_matmul_function(mode_config):
+    in1 = torch.randn(2, 6, 512, requires_grad=True)
+    in2 = torch.randn(2, 512, 9, requires_grad=True)
+
+    y1 = matmul(in1, in2, mx_specs=_specs("int8", 0, False),
+                mode_config=mode_config)
+    y2 = matmul(in1, in2, mx_specs=_specs("int8", 0, True),
+                mode_config=mode_config)
+
+    check_diff(y1, y2, tol=1e-5)
+
+
+def test_use_int_matmul():
+    x = torch.randn(4, 512)
+    mx_specs = _specs("int8", 256, True)
+
+    assert use_int_matmul(mx_specs, "int8", "int4", x, x)
+    assert not use_int_matmul(mx_specs, "int8", "fp8_e4m3", x, x)
+    assert not use_int_matmul(mx_specs, "int8", None, x, x)
+    assert not use_int_matmul(mx_specs, "int8", "int8", x, x.bfloat16())
+    assert not use_int_matmul(_specs("int8", 32, True), "int8", "int8", x, x)
+    assert not use_int_matmul(_specs("int8", 256, False), "int8", "int8", x, x)
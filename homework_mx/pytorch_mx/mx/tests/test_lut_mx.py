@@ -0,0 +1,127 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Test the lookup-table MX quantizer against the reference path.
+"""
+
+import pytest
+import torch
+import numpy as np
+
+from .common_lib import check_diff_quantize, all_encodings
+
+from mx.formats import _get_format_params
+from mx.elemwise_ops import _quantize_elemwise_core
+from mx.mx_ops import (
+    _quantize_mx,
+    _quantize_mx_lut,
+    _lut_boundaries,
+    _lut_encode,
+    _lut_decode,
+)
+
+np.random.seed(0xd10)
+
+ELEM_FMTS = [
+    ("fp8_e5m2"),
+    ("fp8_e4m3"),
+    ("fp6_e3m2"),
+    ("fp6_e2m3"),
+    ("fp4_e2m1"),
+    ("int8"),
+    ("int4"),
+    ("int2"),
+]
+
+
+@pytest.mark.parametrize("scale_bits", (8, 5))
+@pytest.mark.parametrize("elem_format", ELEM_FMTS)
+@pytest.mark.parametrize("block_size", (0, 9, 32))
+@pytest.mark.parametrize("round", ('nearest', 'floor', 'even'))
+@pytest.mark.parametrize("flush_fp32_subnorms", (False, True))
+def test_lut_encoding(scale_bits, elem_format, block_size, round,
+                      flush_fp32_subnorms):
+    x = all_encodings(8, 9)
+
+    y1 = _quantize_mx(x, scale_bits, elem_format,
+                      block_size=block_size,
+                      axes=[-1],
+                      round=round,
+                      flush_fp32_subnorms=flush_fp32_subnorms,
+                      exp_method="bits")
+
+    y2, codes = _quantize_mx_lut(x, scale_bits, elem_format,
+                                 block_size=block_size,
+                                 axes=[-1],
+                                 round=round,
+                                 flush_fp32_subnorms=flush_fp32_subnorms)
+
+    assert codes.dtype == torch.uint8 and codes.shape == x.shape
+    check_diff_quantize(x, y1, y2, handle_infs=True)
+
+
+@pytest.mark.parametrize("elem_format", ELEM_FMTS)
+@pytest.mark.parametrize("round", ('nearest', 'floor', 'even'))
+def test_lut_boundaries(elem_format, round):
+    """ Every encoding within a few ulps of a boundary or tie, plus random
+        encodings over the whole scaled range """
+    ebits, mbits, emax, max_norm, _ = _get_format_params(elem_format)
+    boundaries, _, magnitudes = _lut_boundaries(elem_format, round)
+
+    near = torch.cat([boundaries, (magnitudes[:-1] + magnitudes[1:]) / 2,
+                      magnitudes]).view(torch.int32)
+    near = (near[:, None] + torch.arange(-16, 17, dtype=torch.int32)).flatten()
+    near = near[near >= 0]
+    top = torch.tensor(2.0**(emax + 2)).view(torch.int32).item()
+    rand = torch.as_tensor(np.random.randint(0, top, size=100000), dtype=torch.int32)
+    x = torch.cat([near, rand]).view(torch.float32)
+    x = torch.cat([x, -x])
+
+    y1 = _quantize_elemwise_core(x, mbits, ebits, max_norm, round=round,
+                                 saturate_normals=True, exp_method="bits")
+    y2, codes = _lut_encode(x, elem_format, round=round)
+
+    check_diff_quantize(x, y1, y2)
+    assert torch.equal(_lut_decode(codes, elem_format), y2)
+
+
+@pytest.mark.parametrize("elem_format, vals, codes", [
+    ("fp4_e2m1", [0, 0.5, 1.5, 6, -0.5, -6], [0, 1, 3, 7, 9, 15]),
+    ("fp8_e4m3", [2**-9, 1, 448, -448], [1, 0x38, 0x7E, 0xFE]),
+    ("fp8_e5m2", [2**-16, 57344, -1], [1, 0x7B, 0xBC]),
+    ("int4", [0.25, 1.75, -1.75], [1, 7, 15]),
+    ("int8", [1 / 64, 127 / 64, -1 / 64], [1, 127, 129]),
+])
+def test_lut_codes(elem_format, vals, codes):
+    """ Codes are the sign-magnitude encodings of the format """
+    x = torch.as_tensor(vals, dtype=torch.float32)
+    y, c = _lut_encode(x, elem_format)
+
+    assert torch.equal(y, x)
+    assert c.tolist() == codes
+
+
+def test_lut_nans():
+    x = torch.as_tensor([[float("NaN"), 1, 2, 3], [float("Inf"), 0, 0, 0],
+                         [1, 2, 3, 4]], dtype=torch.float32)
+
+    y1 = _quantize_mx(x, 8, "fp8_e4m3", block_size=4, axes=[-1], exp_method="bits")
+    y2, _ = _quantize_mx_lut(x, 8, "fp8_e4m3", block_size=4, axes=[-1])
+
+    check_diff_quantize(x, y1, y2, handle_infs=True)
+
+
+@pytest.mark.parametrize("size, axes", [
+    ((33, 70), [0]),
+    ((4, 3, 37), [1]),
+    ((4, 6, 40), [1, 2]),
+])
+def test_lut_axes(size, axes):
+    x = torch.as_tensor(np.random.randn(*size) * 100, dtype=torch.float32)
+
+    y1 = _quantize_mx(x, 8, "fp6_e2m3", block_size=8, axes=axes, exp_method="bits")
+    y2, codes = _quantize_mx_lut(x, 8, "fp6_e2m3", block_size=8, axes=axes)
+
+    assert codes.shape == x.shape
+    check_diff_quantize(x, y1, y2)
@@ -0,0 +1,159 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Test the packed MXTensor storage against the reference MX quantizer.
+"""
+
+import io
+import pytest
+import torch
+import numpy as np
+
+from .common_lib import check_diff_quantize, all_encodings
+
+from mx.specs import finalize_mx_specs
+from mx.mx_ops import _quantize_mx, quantize_mx_op
+from mx.mx_tensor import MXTensor, _pack_codes, _unpack_codes
+
+np.random.seed(0xd10)
+
+ELEM_FMTS = [
+    ("fp8_e5m2", 8),
+    ("fp8_e4m3", 8),
+    ("fp6_e3m2", 6),
+    ("fp6_e2m3", 6),
+    ("fp4_e2m1", 4),
+    ("int8", 8),
+    ("int4", 4),
+    ("int2", 2),
+]
+
+
+@pytest.mark.parametrize("n_bits", (2, 3, 4, 5, 6, 8))
+@pytest.mark.parametrize("length", (1, 7, 32, 37))
+def test_pack_codes(n_bits, length):
+    codes = torch.as_tensor(np.random.randint(0, 2**n_bits, size=(3, length)),
+                            dtype=torch.uint8)
+
+    packed = _pack_codes(codes, n_bits)
+
+    assert packed.dtype == torch.uint8
+    assert packed.shape[-1] * 8 < (length + 8) * n_bits
+    assert torch.equal(_unpack_codes(packed, n_bits, length), codes)
+
+
+@pytest.mark.parametrize("elem_format, n_bits", ELEM_FMTS)
+@pytest.mark.parametrize("block_size", (0, 8, 32))
+@pytest.mark.parametrize("round", ('nearest', 'floor', 'even'))
+@pytest.mark.parametrize("scale_bits", (8, 5))
+def test_dequantize(elem_format, n_bits, block_size, round, scale_bits):
+    x = all_encodings(8, 9).view(-1, 64)
+
+    y1 = _quantize_mx(x, scale_bits, elem_format, block_size=block_size,
+                      axes=[-1], round=round, exp_method="bits")
+    m = MXTensor.from_tensor(x, elem_format, block_size=block_size,
+                             scale_bits=scale_bits, round=round)
+
+    assert m.n_bits == n_bits
+    assert m.codes.dtype == torch.uint8 and m.scales.dtype == torch.uint8
+    check_diff_quantize(x, y1, m.dequantize(), handle_infs=True)
+
+
+@pytest.mark.parametrize("size, axis", [
+    ((33, 70), 0),
+    ((33, 70), 1),
+    ((4, 3, 37), 1),
+    ((2, 5, 3, 3), 1),     # conv channels shorter than a block
+])
+def test_axes(size, axis):
+    x = torch.as_tensor(np.random.randn(*size) * 100, dtype=torch.float32)
+
+    y1 = _quantize_mx(x, 8, "fp6_e2m3", block_size=32, axes=[axis],
+                      exp_method="bits")
+    m = MXTensor.from_tensor(x, "fp6_e2m3", block_size=32, axis=axis)
+
+    assert m.shape == x.shape
+    check_diff_quantize(x, y1, m.dequantize())
+
+
+def test_nbytes():
+    x = torch.randn(256, 1024)
+    m = MXTensor.from_tensor(x, "fp4_e2m1", block_size=32)
+
+    # 4 bits per element + one scale byte per 32 elements
+    assert m.nbytes == x.numel() // 2 + x.numel() // 32
+
+
+@pytest.mark.parametrize("key", [
+    (0,),
+    (slice(2, 9),),
+    (slice(None, None, 3), slice(32, 70)),
+    (Ellipsis, 1),
+    (4, slice(0, 64), 2),
+    (slice(None), slice(64, 70)),
+])
+def test_slicing(key):
+    x = torch.as_tensor(np.random.randn(12, 70, 3), dtype=torch.float32)
+    m = MXTensor.from_tensor(x, "fp4_e2m1", block_size=32, axis=1)
+
+    y1 = m.dequantize()[key]
+    y2 = m[key].dequantize()
+
+    assert y1.shape == y2.shape
+    check_diff_quantize(x, y1, y2)
+
+
+@pytest.mark.parametrize("key", [(slice(None), 5), (slice(None), slice(5, 40))])
+def test_slicing_inside_block(key):
+    m = MXTensor.from_tensor(torch.randn(4, 70), "fp8_e4m3", block_size=32)
+    with pytest.raises(IndexError):
+        m[key]
+
+
+def test_state_dict():
+    x = torch.as_tensor(np.random.randn(16, 96), dtype=torch.float32)
+    m = MXTensor.from_tensor(x, "fp6_e3m2", block_size=32)
+
+    buf = io.BytesIO()
+    torch.save(m.state_dict(), buf)
+    buf.seek(0)
+    m2 = MXTensor.from_state_dict(torch.load(buf, weights_only=True))
+
+    assert m2.shape == m.shape and m2.elem_format == m.elem_format
+    check_diff_quantize(x, m.dequantize(), m2.dequantize())
+
+
+def test_nans():
+    x = torch.as_tensor([[float("NaN"), 1, 2, 3], [float("Inf"), 0, 0, 0],
+                         [1, 2, 3, 4]], dtype=torch.float32)
+
+    y1 = _quantize_mx(x, 8, "fp8_e4m3", block_size=4, axes=[-1], exp_method="bits")
+    m = MXTensor.from_tensor(x, "fp8_e4m3", block_size=4)
+
+    assert m.scales[:2].tolist() == [[0xFF], [0xFF]]
+    check_diff_quantize(x, y1, m.dequantize(), handle_infs=True)
+
+
+def test_mx_specs():
+    mx_specs = finalize_mx_specs({"w_elem_format": "int8",
+                                  "block_size": 32,
+                                  "exp_method": "bits"})
+    x = torch.as_tensor(np.random.randn(16, 96), dtype=torch.float32)
+
+    y1 = quantize_mx_op(x, mx_specs, elem_format="int8", axes=[-1])
+    m = MXTensor.from_mx_specs(x, mx_specs, "int8", axis=-1)
+
+    check_diff_quantize(x, y1, m.dequantize())
+
+
+def test_mx_specs_ignore_exp_method():
+    """ The lookup tables always give the exp_method="bits" result """
+    x = torch.as_tensor(np.random.randn(16, 96), dtype=torch.float32)
+
+    y1 = _quantize_mx(x, 8, "int8", block_size=32, axes=[-1], exp_method="bits")
+    for exp_method in ["log2", "bits"]:
+        mx_specs = finalize_mx_specs({"w_elem_format": "int8", "block_size": 32,
+                                      "exp_method": exp_method})
+        m = MXTensor.from_mx_specs(x, mx_specs, "int8", axis=-1)
+        check_diff_quantize(x, y1, m.dequantize())
@@ -0,0 +1,118 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Test that the fused norm engine (norm_fused) is bit-identical to the
+vec op sequences in LayerNorm, RMSNorm, BatchNorm and GroupNorm,
+forward and backward.
+"""
+
+import pytest
+import numpy as np
+import torch
+
+import mx.norm_utils
+from mx.specs import finalize_mx_specs
+from mx.batchnorm import BatchNormFunction
+from mx import LayerNorm, RMSNorm, BatchNorm1d, BatchNorm2d, GroupNorm
+
+np.random.seed(0xd10)
+torch.manual_seed(0xd10)
+
+SPECS = [
+    {"bfloat": 16},
+    {"bfloat": 12, "round": "floor"},
+    {"fp": 8, "round": "even"},
+    {"bfloat": 14, "round": "even", "bfloat_subnorms": False},
+    {"bfloat": 16, "quantize_backprop": False},
+]
+
+
+def _equal(y1, y2):
+    """ Exact, NaNs in the same places """
+    return y1.dtype == y2.dtype and y1.shape == y2.shape and \
+        torch.allclose(y1, y2, rtol=0, atol=0, equal_nan=True)
+
+
+def _layers(op, mx_specs, size):
+    if op == "layernorm":
+        return LayerNorm(size[-1], mx_specs=mx_specs)
+    elif op == "rmsnorm":
+        return RMSNorm(size[-1], mx_specs=mx_specs)
+    elif op == "batchnorm1d":
+        return BatchNorm1d(size[1], mx_specs=mx_specs)
+    elif op == "batchnorm2d":
+        return BatchNorm2d(size[1], mx_specs=mx_specs)
+    else:
+        return GroupNorm(4, size[1], mx_specs=mx_specs)
+
+
+def _compare(op, size, specs, train=True):
+    layers = [_layers(op, finalize_mx_specs(dict(specs, norm_fused=f)), size)
+              for f in (False, True)]
+    with torch.no_grad():
+        layers[0].weight.uniform_(0.5, 1.5)
+        layers[0].bias.uniform_(-0.5, 0.5)
+    layers[1].load_state_dict(layers[0].state_dict())
+
+    x = torch.as_tensor(np.random.randn(*size) * 3 + 1, dtype=torch.float32)
+    g = torch.as_tensor(np.random.randn(*size), dtype=torch.float32)
+    results = []
+    for layer in layers:
+        layer.train(train)
+        x1 = x.clone().requires_grad_()
+        y = layer(x1)
+        y.backward(g)
+        results.append([y, x1.grad, layer.weight.grad, layer.bias.grad] +
+                       [b for b in layer.buffers() if b.is_floating_point()])
+
+    for t1, t2 in zip(*results):
+        assert _equal(t1, t2)
+
+
+@pytest.mark.parametrize("op, size", [
+    ("layernorm", (4, 9, 64)),
+    ("layernorm", (300, 768)),
+    ("rmsnorm", (4, 9, 64)),
+    ("rmsnorm", (300, 768)),
+    ("batchnorm1d", (32, 20)),
+    ("batchnorm2d", (8, 12, 9, 9)),
+    ("groupnorm", (6, 8, 5, 5)),
+    ("groupnorm", (3, 16, 40, 40)),
+])
+@pytest.mark.parametrize("specs", SPECS)
+def test_norm_fused(op, size, specs):
+    _compare(op, size, specs)
+
+
+@pytest.mark.parametrize("op, size", [
+    ("batchnorm2d", (8, 12, 9, 9)),
+    ("layernorm", (6, 40)),
+])
+def test_norm_fused_eval(op, size):
+    """ BatchNorm with running stats """
+    _compare(op, size, {"bfloat": 16}, train=False)
+
+
+@pytest.mark.parametrize("op, size", [
+    ("layernorm", (37, 48)),
+    ("rmsnorm", (37, 48)),
+    ("groupnorm", (7, 8, 3, 3)),
+])
+def test_norm_fused_chunks(op, size, monkeypatch):
+    """ Chunks of 1 and 3 rows, with a partial last chunk """
+    for rows in (1, 3):
+        monkeypatch.setattr(mx.norm_utils, "FUSED_CHUNK_ELEMS",
+                            rows * int(np.prod(size[1:])))
+        _compare(op, size, {"bfloat": 16})
+
+
+def test_norm_fused_saved_tensors():
+    """ BatchNorm and GroupNorm do not keep x_norm for backward """
+    x = torch.randn(8, 12, 9, 9, requires_grad=True)
+    for norm_fused in (False, True):
+        layer = BatchNorm2d(12, mx_specs=finalize_mx_specs(
+                {"bfloat": 16, "norm_fused": norm_fused}))
+        y = layer(x)
+        saved = [t for t in y.grad_fn.saved_tensors if t is not None]
+        assert len(saved) == (3 if norm_fused else 4)
@@ -0,0 +1,90 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Test that the tiling of _quantize_mx without padding copies matches
+quantizing an explicitly zero-padded tensor.
+"""
+
+import pytest
+import torch
+import numpy as np
+
+from .common_lib import check_diff_quantize
+
+from mx.mx_ops import (
+    _quantize_mx,
+    _reshape_to_blocks,
+    _undo_reshape_to_blocks,
+)
+
+np.random.seed(0xd10)
+
+
+def _quantize_padded(x, axis, block_size, **kwargs):
+    """ Pads axis with zeros to whole blocks, then removes the padding """
+    X = x.movedim(axis, -1)
+    length = X.shape[-1]
+    X = torch.nn.functional.pad(X, (0, -length % block_size))
+    X = _quantize_mx(X, 8, block_size=block_size, axes=[-1], **kwargs)
+    return X[..., :length].movedim(-1, axis)
+
+
+@pytest.mark.parametrize("size, axis", [
+    ((4, 3, 9, 9), 1),
+    ((2, 1, 8, 8), 1),
+    ((33, 70), 0),
+    ((33, 70), 1),
+    ((5, 40, 3), 1),
+    ((4, 3, 37), -1),
+])
+@pytest.mark.parametrize("elem_format", ("fp8_e4m3", "fp4_e2m1", "int8"))
+@pytest.mark.parametrize("round", ("nearest", "even"))
+def test_ragged_blocks(size, axis, elem_format, round):
+    x = torch.as_tensor(np.random.randn(*size) * 100, dtype=torch.float32)
+
+    y1 = _quantize_padded(x, axis, 32, elem_format=elem_format, round=round)
+    y2 = _quantize_mx(x, 8, elem_format, block_size=32, axes=[axis],
+                      round=round)
+
+    assert y2.shape == x.shape
+    check_diff_quantize(x, y1, y2)
+
+
+def test_ragged_blocks_special():
+    """ NaN/Inf in the tail block and in a full block, flushed subnorms """
+    x = torch.as_tensor(np.random.randn(6, 45), dtype=torch.float32)
+    x[0, 40] = float("NaN")
+    x[1, 3] = float("Inf")
+    x[2, 33:] = 1e-40
+
+    y1 = _quantize_padded(x, 1, 16, elem_format="fp6_e2m3",
+                          flush_fp32_subnorms=True)
+    y2 = _quantize_mx(x, 8, "fp6_e2m3", block_size=16, axes=[1],
+                      flush_fp32_subnorms=True)
+
+    check_diff_quantize(x, y1, y2, handle_infs=True)
+
+
+def test_ragged_blocks_transposed():
+    x = torch.as_tensor(np.random.randn(40, 50), dtype=torch.float32).t()
+
+    y1 = _quantize_padded(x, 1, 32, elem_format="fp8_e5m2")
+    y2 = _quantize_mx(x, 8, "fp8_e5m2", block_size=32, axes=[1])
+
+    check_diff_quantize(x, y1, y2)
+
+
+@pytest.mark.parametrize("size, axis", [
+    ((8, 64), -1),
+    ((3, 5, 96), 2),
+    ((64, 8), 0),
+])
+def test_reshape_to_blocks_view(size, axis):
+    """ Whole blocks are tiled without copying """
+    x = torch.randn(size)
+    A, axes, orig_shape, padded_shape = _reshape_to_blocks(x, [axis], 32)
+
+    assert A.data_ptr() == x.data_ptr()
+    assert A.shape[axes[0] + 1] == 32
+    assert torch.equal(_undo_reshape_to_blocks(A, padded_shape, orig_shape, axes), x)
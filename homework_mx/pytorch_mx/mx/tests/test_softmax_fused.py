@@ -0,0 +1,83 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Test that the fused softmax (softmax_fused) is bit-identical to the
+vec op sequence in SoftmaxFunction, forward and backward.
+"""
+
+import pytest
+import numpy as np
+import torch
+
+from mx.specs import finalize_mx_specs
+from mx.softmax import _softmax_forward_fused, _softmax_backward_fused
+from mx import softmax
+
+np.random.seed(0xd10)
+torch.manual_seed(0xd10)
+
+
+def _equal(y1, y2):
+    """ Exact, NaNs in the same places (their payloads may differ) """
+    return y1.dtype == y2.dtype and y1.shape == y2.shape and \
+        torch.allclose(y1, y2, rtol=0, atol=0, equal_nan=True)
+
+
+def _run(x, g, dim, mx_specs):
+    x = x.clone().requires_grad_()
+    y = softmax(x, dim=dim, mx_specs=mx_specs)
+    y.backward(g)
+    return y, x.grad
+
+
+@pytest.mark.parametrize("size", [(7, 1), (3, 5, 40), (2, 4, 300, 300)])
+@pytest.mark.parametrize("specs", [
+    {"bfloat": 16},
+    {"bfloat": 12, "round": "floor"},
+    {"fp": 8, "round": "even"},
+    {"bfloat": 16, "softmax_exp2": True},
+    {"bfloat": 16, "vec_use_exp2": True, "vec_use_recip": True},
+    {"bfloat": 16, "quantize_backprop": False},
+    {"bfloat": 16, "vec_inplace": True},
+])
+def test_softmax_fused(size, specs):
+    x = torch.as_tensor(np.random.randn(*size) * 4, dtype=torch.float32)
+    g = torch.as_tensor(np.random.randn(*size), dtype=torch.float32)
+
+    y1, g1 = _run(x, g, -1, finalize_mx_specs(specs))
+    y2, g2 = _run(x, g, -1, finalize_mx_specs(dict(specs, softmax_fused=True)))
+
+    assert _equal(y1, y2)
+    assert _equal(g1, g2)
+
+
+@pytest.mark.parametrize("chunk_elems", (1, 64, 1000))
+def test_softmax_fused_chunks(chunk_elems):
+    """ Rows split across chunks, including a partial last chunk """
+    mx_specs = finalize_mx_specs({"bfloat": 16, "softmax_fused": True})
+    x = torch.randn(37, 48)
+    x[3, 5] = float("NaN")
+    x[4, 7] = float("Inf")
+    g = torch.randn(37, 48)
+
+    y1 = _softmax_forward_fused(x, mx_specs)
+    y2 = _softmax_forward_fused(x, mx_specs, chunk_elems=chunk_elems)
+    assert _equal(y1, y2)
+
+    g1 = _softmax_backward_fused(y1, g, mx_specs)
+    g2 = _softmax_backward_fused(y1, g, mx_specs, chunk_elems=chunk_elems)
+    assert _equal(g1, g2)
+
+
+def test_softmax_fused_other_dim():
+    """ Softmax along other dims keeps the unfused path """
+    x = torch.randn(6, 10, 12)
+    g = torch.randn(6, 10, 12)
+
+    y1, g1 = _run(x, g, 1, finalize_mx_specs({"bfloat": 16}))
+    y2, g2 = _run(x, g, 1, finalize_mx_specs({"bfloat": 16,
+                                              "softmax_fused": True}))
+
+    assert _equal(y1, y2)
+    assert _equal(g1, g2)
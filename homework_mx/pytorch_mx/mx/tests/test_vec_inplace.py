@@ -0,0 +1,132 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Test that in-place quantization of vec op results (vec_inplace) is
+bit-identical to the out-of-place path.
+"""
+
+import pytest
+import numpy as np
+import torch
+
+from .common_lib import all_encodings
+
+from mx.specs import finalize_mx_specs
+from mx.elemwise_ops import (
+    _WORKSPACE,
+    clear_workspace,
+    quantize_elemwise_op,
+)
+from mx import gelu, softmax
+from mx import LayerNorm, RMSNorm, BatchNorm2d, GroupNorm
+
+np.random.seed(0xd10)
+torch.manual_seed(0xd10)
+
+
+def _inputs():
+    # Every bfloat16 encoding plus random values over the whole fp32 range
+    x = all_encodings(8, 7)
+    r = np.random.randn(4096) * 2.0**np.random.randint(-140, 127, size=4096)
+    return torch.cat([x, torch.as_tensor(r, dtype=torch.float32)])
+
+
+def _equal(y1, y2):
+    """ Bitwise, so NaN payloads and signed zeros count """
+    ints = {torch.float32: torch.int32, torch.float16: torch.int16,
+            torch.bfloat16: torch.int16}[y1.dtype]
+    return y1.dtype == y2.dtype and torch.equal(y1.view(ints), y2.view(ints))
+
+
+@pytest.mark.parametrize("fmt", [("bfloat", 16), ("bfloat", 12), ("fp", 8)])
+@pytest.mark.parametrize("round", ("nearest", "floor", "even"))
+@pytest.mark.parametrize("subnorms", (True, False))
+@pytest.mark.parametrize("exp_method", ("log2", "bits"))
+@pytest.mark.parametrize("dtype", (torch.float32, torch.float16))
+def test_inplace_quantize(fmt, round, subnorms, exp_method, dtype):
+    mx_specs = finalize_mx_specs({fmt[0]: fmt[1], "bfloat_subnorms": subnorms,
+                                  "exp_method": exp_method})
+    x = _inputs().to(dtype)
+
+    y1 = quantize_elemwise_op(x, mx_specs, round=round)
+    a = x.clone()
+    y2 = quantize_elemwise_op(a, mx_specs, round=round, inplace=True)
+
+    assert y2.data_ptr() == a.data_ptr()
+    assert _equal(y1, y2)
+
+
+def test_inplace_requires_grad():
+    """ Tensors autograd tracks are quantized out of place """
+    mx_specs = finalize_mx_specs({"bfloat": 16})
+    x = torch.randn(64, requires_grad=True)
+    a = x * 3
+
+    y = quantize_elemwise_op(a, mx_specs, inplace=True)
+    assert y.data_ptr() != a.data_ptr()
+
+    with torch.no_grad():
+        a = x * 3
+        y = quantize_elemwise_op(a, mx_specs, inplace=True)
+        assert y.data_ptr() == a.data_ptr()
+
+
+def test_workspace():
+    mx_specs = finalize_mx_specs({"bfloat": 16})
+    clear_workspace()
+
+    quantize_elemwise_op(torch.randn(100), mx_specs, inplace=True)
+    buffers = [b.data_ptr() for b in _WORKSPACE.values()]
+    quantize_elemwise_op(torch.randn(10, 10), mx_specs, inplace=True)
+    assert [b.data_ptr() for b in _WORKSPACE.values()] == buffers
+
+    clear_workspace()
+    assert len(_WORKSPACE) == 0
+
+
+def _gelu(mx_specs):
+    return lambda x: gelu(x, mx_specs=mx_specs)
+
+
+def _softmax(mx_specs):
+    return lambda x: softmax(x, dim=-1, mx_specs=mx_specs)
+
+
+@pytest.mark.parametrize("op", ["gelu", "softmax", "layernorm", "rmsnorm",
+                                "batchnorm", "groupnorm"])
+@pytest.mark.parametrize("quantize_backprop", (True, False))
+def test_inplace_ops(op, quantize_backprop):
+    """ Forward and backward are unchanged """
+    specs = {"bfloat": 16, "quantize_backprop": quantize_backprop}
+    mx_specs = [finalize_mx_specs(dict(specs, vec_inplace=v))
+                for v in (False, True)]
+
+    x = torch.randn(4, 8, 6, 32)
+    if op in ("gelu", "softmax"):
+        fns = [globals()["_" + op](s) for s in mx_specs]
+    else:
+        if op == "layernorm":
+            fns = [LayerNorm(32, mx_specs=s) for s in mx_specs]
+        elif op == "rmsnorm":
+            fns = [RMSNorm(32, mx_specs=s) for s in mx_specs]
+        elif op == "batchnorm":
+            fns = [BatchNorm2d(8, mx_specs=s) for s in mx_specs]
+        else:
+            fns = [GroupNorm(4, 8, mx_specs=s) for s in mx_specs]
+        with torch.no_grad():
+            fns[0].weight.uniform_(0.5, 1.5)
+            fns[0].bias.uniform_(-0.5, 0.5)
+        fns[1].load_state_dict(fns[0].state_dict())
+
+    grads = []
+    outputs = []
+    for fn in fns:
+        x1 = x.clone().requires_grad_()
+        y = fn(x1)
+        y.backward(torch.ones_like(y) + x)
+        outputs.append(y)
+        grads.append(x1.grad)
+
+    assert _equal(outputs[0], outputs[1])
+    assert _equal(grads[0], grads[1])
@@ -0,0 +1,147 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Test that Linear/Conv layers with cache_weights match the uncached layers
+and requantize their weights exactly when something they depend on changes.
+"""
+
+import copy
+import pytest
+import numpy as np
+import torch
+
+from .common_lib import check_diff
+
+from mx.specs import finalize_mx_specs
+from mx import Linear, Conv1d, Conv2d
+
+np.random.seed(0xd10)
+torch.manual_seed(0xd10)
+
+ELEM_FMTS = ["fp8_e4m3", "fp6_e2m3", "fp4_e2m1", "int8", "int4"]
+
+
+def _specs(elem_format, cache_weights):
+    return finalize_mx_specs({
+        "w_elem_format": elem_format,
+        "a_elem_format": elem_format,
+        "block_size": 32,
+        "bfloat": 16,
+        "cache_weights": cache_weights,
+    })
+
+
+def _layers(kind, elem_format):
+    """ The same layer without and with the weight cache """
+    if kind == "linear":
+        layer = Linear(64, 48, mx_specs=_specs(elem_format, False))
+        x = torch.randn(4, 7, 64)
+    elif kind == "conv1d":
+        layer = Conv1d(40, 16, 3, mx_specs=_specs(elem_format, False))
+        x = torch.randn(2, 40, 20)
+    else:
+        layer = Conv2d(8, 12, 3, padding=1, mx_specs=_specs(elem_format, False))
+        x = torch.randn(2, 8, 9, 9)
+    cached = copy.deepcopy(layer)
+    cached.apply_mx_specs(_specs(elem_format, True))
+    return layer, cached, x
+
+
+@pytest.mark.parametrize("kind", ("linear", "conv1d", "conv2d"))
+@pytest.mark.parametrize("elem_format", ELEM_FMTS)
+def test_cache_eval(kind, elem_format):
+    layer, cached, x = _layers(kind, elem_format)
+    layer.eval()
+    cached.eval()
+
+    with torch.no_grad():
+        y1 = layer(x)
+        for _ in range(3):
+            y2 = cached(x)
+            check_diff(y1, y2, tol=0)
+
+    assert cached.weight_cache.misses == 1
+    assert cached.weight_cache.hits == 2
+    assert layer.weight_cache.misses == 0
+
+
+@pytest.mark.parametrize("kind", ("linear", "conv2d"))
+@pytest.mark.parametrize("optimizer", ("sgd", "adamw_fused"))
+def test_cache_training(kind, optimizer):
+    """ Gradients match and every optimizer step invalidates the cache """
+    layer, cached, x = _layers(kind, "fp8_e4m3")
+
+    def make(module):
+        if optimizer == "sgd":
+            return torch.optim.SGD(module.parameters(), lr=0.1)
+        return torch.optim.AdamW(module.parameters(), lr=0.01, fused=True)
+
+    opts = [make(layer), make(cached)]
+    for step in range(3):
+        for module, opt in zip((layer, cached), opts):
+            opt.zero_grad()
+            (module(x)**2).mean().backward()
+            opt.step()
+        check_diff(layer.weight.grad, cached.weight.grad, tol=0)
+        check_diff(layer.weight, cached.weight, tol=0)
+
+    assert cached.weight_cache.misses == 3
+
+
+def test_cache_invalidation():
+    layer, cached, x = _layers("linear", "fp6_e3m2")
+    cached.eval()
+    cache = cached.weight_cache
+
+    def check():
+        layer.load_state_dict(cached.state_dict())
+        layer.apply_mx_specs(cached.mx_specs)
+        layer.mx_specs["cache_weights"] = False
+        with torch.no_grad():
+            check_diff(layer(x), cached(x), tol=0)
+
+    check()
+    assert cache.misses == 1
+
+    # In-place update of a parameter
+    with torch.no_grad():
+        cached.bias.add_(1)
+    check()
+    assert cache.misses == 2
+
+    # load_state_dict
+    state = {k: v * 2 for k, v in cached.state_dict().items()}
+    cached.load_state_dict(state)
+    check()
+    assert cache.misses == 3
+
+    # A spec that weight quantization depends on
+    cached.apply_mx_specs(dict(cached.mx_specs, w_elem_format="int4"))
+    check()
+    assert cache.misses == 4
+
+    # A spec it doesn't depend on
+    cached.apply_mx_specs(dict(cached.mx_specs, a_elem_format="int8"))
+    check()
+    assert cache.misses == 4
+
+    # Replaced parameter data
+    cached.weight.data = torch.randn_like(cached.weight)
+    check()
+    assert cache.misses == 5
+
+    # Switching to the int_matmul engine, then the activation format
+    # it depends on
+    cached.apply_mx_specs(dict(cached.mx_specs, int_matmul=True,
+                               block_size=0, exp_method="bits"))
+    check()
+    assert cache.misses == 6
+
+    cached.apply_mx_specs(dict(cached.mx_specs, a_elem_format="fp8_e4m3"))
+    check()
+    assert cache.misses == 7
+
+    cached.apply_mx_specs(dict(cached.mx_specs, a_elem_format="int8"))
+    check()
+    assert cache.misses == 8
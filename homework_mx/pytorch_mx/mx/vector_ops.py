@@ -40,22 +40,44 @@ def vec_quantize(input, mx_specs=None, round=None):
                                 round=round)
 
 
+def _quantize_result(A, mx_specs=None, round=None):
+    """quantize_elemwise_op for a tensor a vec op just computed. Nothing
+    else references it, so with vec_inplace it is quantized in place."""
+    return quantize_elemwise_op(A, mx_specs=mx_specs, round=round,
+                                inplace=bool(mx_specs) and mx_specs['vec_inplace'])
+
+
+def _quantize_(A, mx_specs, round=None):
+    """quantize_elemwise_op with the result in A. Fused ops use it on
+    buffers they own."""
+    Q = quantize_elemwise_op(A, mx_specs=mx_specs, round=round, inplace=True)
+    return A if Q is A else A.copy_(Q)
+
+
+def _quantize_keeps_dtype(mx_specs):
+    """False if quantize_elemwise_op converts to bfloat16 tensors, which
+    fused ops cannot write back into their buffers"""
+    return not (mx_specs['bfloat'] == 16 and mx_specs['round'] == 'even'
+                and mx_specs['bfloat_subnorms']
+                and torch.cuda.is_bf16_supported())
+
+
 #-------------------------------------------------------------------------
 # Vec regular ops
 #-------------------------------------------------------------------------
 def vec_add(a, b, mx_specs=None, round=None):
-    return quantize_elemwise_op(a + b, mx_specs=mx_specs,
-                                round=round)
+    return _quantize_result(a + b, mx_specs=mx_specs,
+                            round=round)
 
 
 def vec_sub(a, b, mx_specs=None, round=None):
-    return quantize_elemwise_op(a - b, mx_specs=mx_specs,
-                                round=round)
+    return _quantize_result(a - b, mx_specs=mx_specs,
+                            round=round)
 
 
 def vec_mul(a, b, mx_specs=None, round=None):
-    return quantize_elemwise_op(a * b, mx_specs=mx_specs,
-                                round=round)
+    return _quantize_result(a * b, mx_specs=mx_specs,
+                            round=round)
 
 
 def vec_div(a, b, mx_specs=None, round=None):
@@ -63,8 +85,8 @@ def vec_div(a, b, mx_specs=None, round=None):
         recip_b = vec_recip(b, mx_specs=mx_specs, round=round)
         return vec_mul(a, recip_b, mx_specs=mx_specs, round=round)
     else:
-        return quantize_elemwise_op(a / b, mx_specs=mx_specs,
-                                    round=round)
+        return _quantize_result(a / b, mx_specs=mx_specs,
+                                round=round)
 
 
 #-------------------------------------------------------------------------
@@ -72,41 +94,41 @@ def vec_div(a, b, mx_specs=None, round=None):
 #-------------------------------------------------------------------------
 def vec_exp(input, mx_specs=None, round=None):
     if mx_specs and mx_specs['vec_use_exp2']:
-        phi = quantize_elemwise_op(LOG2_E_BF16 * input,
-                                   mx_specs=mx_specs, round=round)
+        phi = _quantize_result(LOG2_E_BF16 * input,
+                               mx_specs=mx_specs, round=round)
         phi = vec_exp2(phi, mx_specs=mx_specs, round=round)
     else:
-        phi = quantize_elemwise_op(torch_exp(input),
-                                   mx_specs=mx_specs, round=round)
+        phi = _quantize_result(torch_exp(input),
+                               mx_specs=mx_specs, round=round)
     return phi
 
 
 def vec_exp2(input, mx_specs=None, round=None):
     # Pytorch 1.2 does not have exp2
     if hasattr(torch, 'exp2'):
-        phi = quantize_elemwise_op(torch_exp2(input),
-                                   mx_specs=mx_specs, round=round)
+        phi = _quantize_result(torch_exp2(input),
+                               mx_specs=mx_specs, round=round)
     else:
         # Here we're trying to emulate torch.exp2 with torch.exp,
         # so the constant is exact
-        phi = quantize_elemwise_op(torch_exp(input * LN_2_EXACT),
-                                   mx_specs=mx_specs, round=round)
+        phi = _quantize_result(torch_exp(input * LN_2_EXACT),
+                               mx_specs=mx_specs, round=round)
     return phi
 
 
 def vec_recip(input, mx_specs=None, round=None):
-    return quantize_elemwise_op(1. / input, mx_specs=mx_specs,
-                                round=round)
+    return _quantize_result(1. / input, mx_specs=mx_specs,
+                            round=round)
 
 
 def vec_sqrt(input, mx_specs=None, round=None):
-    return quantize_elemwise_op(torch_sqrt(input), mx_specs=mx_specs,
-                                round=round)
+    return _quantize_result(torch_sqrt(input), mx_specs=mx_specs,
+                            round=round)
 
 
 def vec_tanh(input, mx_specs=None, round=None):
-    return quantize_elemwise_op(torch_tanh(input), mx_specs=mx_specs,
-                                round=round)
+    return _quantize_result(torch_tanh(input), mx_specs=mx_specs,
+                            round=round)
 
 
 #-------------------------------------------------------------------------
@@ -114,8 +136,8 @@ def vec_tanh(input, mx_specs=None, round=None):
 #-------------------------------------------------------------------------
 def vec_reduce_sum(input, dim, keepdim=False, mx_specs=None,
                    round=None):
-    return quantize_elemwise_op(input.sum(dim, keepdim=keepdim),
-                                mx_specs=mx_specs, round=round)
+    return _quantize_result(input.sum(dim, keepdim=keepdim),
+                            mx_specs=mx_specs, round=round)
 
 
 def vec_reduce_mean(input, dim, keepdim=False, mx_specs=None,
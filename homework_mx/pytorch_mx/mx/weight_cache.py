@@ -0,0 +1,92 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT License.
+
+Name:    weight_cache.py
+
+Reuse of quantized weights across forward passes.
+
+LinearFunction and ConvFunction quantize their weight and bias on every
+call. In eval mode, and between optimizer steps, those results do not
+change. A WeightCache keeps them while the key below is unchanged:
+ - the storage, version counter, dtype and shape of each parameter
+   (in-place updates, copy_/load_state_dict, "weight.data = ..."),
+ - a global count of optimizer steps (fused optimizers update parameters
+   without bumping their version counter),
+ - the mx_specs fields that weight quantization depends on, and
+   whether the weights are int_matmul operands.
+
+Classes:
+    WeightCache
+
+Usage Notes:
+ - Enabled per layer by the "cache_weights" spec.
+ - In-place edits through .data bypass the version counter: call
+   clear() on the layer's weight_cache after them.
+"""
+
+from torch.optim.optimizer import register_optimizer_step_post_hook
+
+# mx_specs fields read when quantizing weights and biases
+WEIGHT_SPEC_FIELDS = (
+    "bfloat", "fp", "bfloat_subnorms", "round_weight",
+    "w_elem_format", "block_size", "scale_bits", "shared_exp_method",
+    "mx_flush_fp32_subnorms", "round_mx_output",
+    "custom_cuda", "exp_method",
+)
+
+_optimizer_steps = 0
+
+
+def _count_optimizer_step(optimizer, args, kwargs):
+    global _optimizer_steps
+    _optimizer_steps += 1
+
+
+register_optimizer_step_post_hook(_count_optimizer_step)
+
+
+def _tensor_key(t):
+    if t is None:
+        return None
+    return (t.data_ptr(), t._version, t.dtype, t.device, tuple(t.shape))
+
+
+class WeightCache:
+    """
+    Holds the quantized weights of one layer.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.values = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, params, mx_specs, compute, int_engine=False):
+        """
+        Returns compute() for these parameters and mx_specs, computing it
+        only when one of them changed since the last call.
+        Args:
+            params   {list(tensor)} -- tensors compute() reads (None allowed)
+            mx_specs {MxSpecs}      -- specs compute() quantizes with
+            compute  {callable}     -- returns the quantized tensors
+            int_engine {bool}       -- compute() returns int_matmul operands
+        """
+        key = (
+            _optimizer_steps,
+            tuple(_tensor_key(t) for t in params),
+            tuple(mx_specs[f] for f in WEIGHT_SPEC_FIELDS),
+            int_engine,
+        )
+        if key != self.key:
+            self.values = compute()
+            self.key = key
+            self.misses += 1
+        else:
+            self.hits += 1
+        return self.values
+
+    def clear(self):
+        self.key = None
+        self.values = None
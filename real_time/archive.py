@@ -0,0 +1,451 @@
+"""
+Compressed archive format for long sensor sessions (.stca).
+
+Samples are stored in fixed-point (each numeric column scaled by 10^decimals
+to integers, lossless for CSVs written with that many decimals) and split
+into blocks of block_size samples. Inside a block every column is delta
+encoded, zigzag mapped to unsigned and written either as LEB128 varints or
+as fixed-width little-endian integers (1/2/4/8 bytes), whichever is smaller.
+Text columns (the state names of get_data.py) are stored as category codes.
+
+File layout:
+    b"STCA" version(u8)
+    blocks...                       column streams, back to back
+    footer:
+        u32 json length, json meta  (columns, decimals, categories, sizes)
+        index arrays                (n_blocks, n_columns): offset i64,
+                                    length u32, first value i64, encoding u8
+        manual steps                delta + varint
+    u64 footer offset, b"STCA"
+
+The block index gives random access: read(start, stop) decodes only the
+blocks overlapping the range. Encoding and decoding are NumPy vectorized,
+no Python loop per sample.
+
+Usage:
+    python archive.py compress ../data/old/500steps_xico_sensor_data.csv -o xico.stca
+    python archive.py compress sensor_data.csv --decimals ax=4 ay=4 az=4
+    python archive.py decompress xico.stca -o xico.csv
+    python archive.py info xico.stca
+"""
+import argparse
+import json
+import os
+import struct
+import time
+
+import numpy as np
+import pandas as pd
+
+# ==============================
+# CONFIG
+# ==============================
+MAGIC = b"STCA"
+VERSION = 1
+BLOCK_SIZE = 4096
+MAX_DECIMALS = 6
+
+ENCODING_VARINT = 0
+# Fixed width encodings are the width in bytes
+FIXED_WIDTHS = (1, 2, 4, 8)
+_UINT = {1: "<u1", 2: "<u2", 4: "<u4", 8: "<u8"}
+# Smallest value needing k + 2 varint bytes
+_VARINT_LIMITS = np.array([1 << (7 * k) for k in range(1, 10)], dtype=np.uint64)
+
+
+# ==========================================================
+# INTEGER CODECS
+# ==========================================================
+def zigzag_encode(values):
+    """int64 -> uint64, small magnitudes (either sign) -> small numbers."""
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def zigzag_decode(values):
+    values = values.astype(np.uint64)
+    return ((values >> np.uint64(1)).astype(np.int64)) ^ -((values & np.uint64(1)).astype(np.int64))
+
+
+def varint_encode(values):
+    """LEB128 bytes of a uint64 array."""
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return b""
+    n_bytes = 1 + np.searchsorted(_VARINT_LIMITS, values, side="right")
+    offsets = np.concatenate(([0], np.cumsum(n_bytes)[:-1]))
+    out = np.zeros(int(n_bytes.sum()), dtype=np.uint8)
+    for k in range(int(n_bytes.max())):
+        has = n_bytes > k
+        byte = ((values[has] >> np.uint64(7 * k)) & np.uint64(0x7F)).astype(np.uint8)
+        byte[n_bytes[has] > k + 1] |= 0x80
+        out[offsets[has] + k] = byte
+    return out.tobytes()
+
+
+def varint_decode(data, count=None):
+    """uint64 array from LEB128 bytes."""
+    b = np.frombuffer(data, dtype=np.uint8)
+    if len(b) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(b < 0x80)
+    if count is not None:
+        ends = ends[:count]
+    if len(ends) == len(b):
+        return b.astype(np.uint64)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    # One pass per byte position (values of delta encoded samples take 1-3 bytes)
+    padded = np.zeros(len(b) + 10, dtype=np.uint64)
+    padded[:len(b)] = b & 0x7F
+    values = padded[starts]
+    for k in range(1, int(lengths.max())):
+        part = padded[starts + k] << np.uint64(7 * k)
+        part[lengths <= k] = 0
+        values |= part
+    return values
+
+
+def encode_stream(values):
+    """
+    Delta + zigzag of an int64 block, in the smallest encoding.
+
+    Returns:
+        tuple: (first value, encoding, bytes)
+    """
+    first = int(values[0])
+    z = zigzag_encode(np.diff(values))
+    varint = varint_encode(z)
+    top = int(z.max()) if len(z) else 0
+    width = next(w for w in FIXED_WIDTHS if top < 1 << (8 * w))
+    if width * len(z) <= len(varint):  # same size: fixed width decodes faster
+        return first, width, z.astype(_UINT[width]).tobytes()
+    return first, ENCODING_VARINT, varint
+
+
+def decode_stream(first, encoding, data, n):
+    if encoding == ENCODING_VARINT:
+        z = varint_decode(data, n - 1)
+    else:
+        z = np.frombuffer(data, dtype=_UINT[encoding], count=n - 1).astype(np.uint64)
+    out = np.empty(n, dtype=np.int64)
+    out[0] = first
+    np.cumsum(zigzag_decode(z), out=out[1:])
+    out[1:] += first
+    return out
+
+
+# ==========================================================
+# WRITING
+# ==========================================================
+def detect_decimals(values, max_decimals=MAX_DECIMALS):
+    """Fewest decimals that represent every value exactly (as written in a CSV), capped at max_decimals."""
+    values = np.asarray(values, dtype=np.float64)
+    for decimals in range(max_decimals + 1):
+        scaled = values * 10.0 ** decimals
+        if np.all(np.abs(scaled - np.round(scaled)) < 1e-6 * np.maximum(1.0, np.abs(scaled))):
+            return decimals
+    return max_decimals
+
+
+class ArchiveWriter:
+    """
+    Streams DataFrame chunks into an archive.
+
+    Args:
+        path (str): Output .stca file.
+        decimals (dict): Fixed-point decimals per numeric column; detected
+                         from the first chunk when not given (values with more
+                         decimals than MAX_DECIMALS are rounded). A later chunk
+                         needing more decimals than detected raises ValueError
+                         and the partial file is removed.
+        block_size (int): Samples per block (random access granularity).
+        meta (dict): Extra metadata stored as is (e.g. sample_rate, source).
+    """
+
+    def __init__(self, path, decimals=None, block_size=BLOCK_SIZE, meta=None):
+        self.path = path
+        self.block_size = block_size
+        self.decimals = dict(decimals or {})
+        self._detected = []   # columns whose decimals come from the first chunk
+        self.meta = dict(meta or {})
+        self.columns = None
+        self.categories = {}
+        self._pending = []
+        self._n_pending = 0
+        self._n_samples = 0
+        self._index = []   # per block: (offsets, lengths, firsts, encodings)
+        self._file = open(path, "wb")
+        self._file.write(MAGIC + struct.pack("<B", VERSION))
+
+    def _to_integers(self, df):
+        """(n, n_columns) int64 matrix of a chunk."""
+        if self.columns is None:
+            self.columns = list(df.columns)
+            for c in self.columns:
+                if not pd.api.types.is_numeric_dtype(df[c]):
+                    self.categories[c] = []
+                elif c not in self.decimals:
+                    self.decimals[c] = detect_decimals(df[c].to_numpy())
+                    self._detected.append(c)
+        else:
+            for c in self._detected:
+                decimals = detect_decimals(df[c].to_numpy())
+                if decimals > self.decimals[c]:
+                    raise ValueError(f"column {c!r} needs {decimals} decimals, {self.decimals[c]} were detected "
+                                     f"from the first chunk: pass decimals={{{c!r}: {decimals}}}")
+        out = np.empty((len(df), len(self.columns)), dtype=np.int64)
+        for j, c in enumerate(self.columns):
+            if c in self.categories:
+                known = self.categories[c]
+                for value in pd.unique(df[c]):
+                    if value not in known:
+                        known.append(value)
+                out[:, j] = pd.Categorical(df[c], categories=known).codes
+            else:
+                out[:, j] = np.round(df[c].to_numpy(dtype=np.float64) * 10.0 ** self.decimals[c])
+        return out
+
+    def _write_block(self, block):
+        offsets, lengths, firsts, encodings = [], [], [], []
+        for j in range(block.shape[1]):
+            first, encoding, data = encode_stream(block[:, j])
+            offsets.append(self._file.tell())
+            lengths.append(len(data))
+            firsts.append(first)
+            encodings.append(encoding)
+            self._file.write(data)
+        self._index.append((offsets, lengths, firsts, encodings, len(block)))
+
+    def write(self, df):
+        """Appends the rows of a DataFrame (same columns on every call)."""
+        if len(df) == 0:
+            return
+        try:
+            self._pending.append(self._to_integers(df))
+        except ValueError:
+            self.abort()
+            raise
+        self._n_pending += len(df)
+        self._n_samples += len(df)
+        if self._n_pending < self.block_size:
+            return
+        pending = np.concatenate(self._pending)
+        n_full = len(pending) // self.block_size * self.block_size
+        for lo in range(0, n_full, self.block_size):
+            self._write_block(pending[lo:lo + self.block_size])
+        self._pending = [pending[n_full:]]
+        self._n_pending = len(pending) - n_full
+
+    def close(self, manual_steps=None):
+        """Writes the last block, the manual steps and the footer."""
+        if self._file is None:
+            return
+        if self._n_pending:
+            self._write_block(np.concatenate(self._pending))
+        n_blocks = len(self._index)
+        n_columns = len(self.columns or [])
+        index = {
+            "offsets": np.array([b[0] for b in self._index], dtype="<i8").reshape(n_blocks, n_columns),
+            "lengths": np.array([b[1] for b in self._index], dtype="<u4").reshape(n_blocks, n_columns),
+            "firsts": np.array([b[2] for b in self._index], dtype="<i8").reshape(n_blocks, n_columns),
+            "encodings": np.array([b[3] for b in self._index], dtype="<u1").reshape(n_blocks, n_columns),
+        }
+        steps = np.sort(np.asarray(manual_steps if manual_steps is not None else [], dtype=np.int64))
+        steps_data = varint_encode(zigzag_encode(np.diff(steps, prepend=0)))
+        meta = {
+            **self.meta,
+            "columns": self.columns or [],
+            "decimals": self.decimals,
+            "categories": {c: [str(v) for v in values] for c, values in self.categories.items()},
+            "n_samples": self._n_samples,
+            "block_size": self.block_size,
+            "n_blocks": n_blocks,
+            "n_steps": len(steps),
+        }
+        footer_offset = self._file.tell()
+        meta_bytes = json.dumps(meta).encode()
+        self._file.write(struct.pack("<I", len(meta_bytes)) + meta_bytes)
+        for key in ("offsets", "lengths", "firsts", "encodings"):
+            self._file.write(index[key].tobytes())
+        self._file.write(steps_data)
+        self._file.write(struct.pack("<Q", footer_offset) + MAGIC)
+        self._file.close()
+        self._file = None
+
+    def abort(self):
+        """Closes and deletes the unfinished archive."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_archive(path, df, manual_steps=None, decimals=None, block_size=BLOCK_SIZE, meta=None):
+    """Writes a whole DataFrame (and its manual step sample numbers) as an archive."""
+    writer = ArchiveWriter(path, decimals, block_size, meta)
+    writer.write(df)
+    writer.close(manual_steps)
+
+
+# ==========================================================
+# READING
+# ==========================================================
+class ArchiveReader:
+    """Random access to an archive through its block index (the file is memory-mapped)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self._data[:4]) != MAGIC or bytes(self._data[-4:]) != MAGIC:
+            raise ValueError(f"{path} is not a .stca archive")
+        footer_offset = struct.unpack("<Q", bytes(self._data[-12:-4]))[0]
+        meta_len = struct.unpack("<I", bytes(self._data[footer_offset:footer_offset + 4]))[0]
+        pos = footer_offset + 4
+        self.meta = json.loads(bytes(self._data[pos:pos + meta_len]))
+        pos += meta_len
+        shape = (self.meta["n_blocks"], len(self.meta["columns"]))
+        self._index = {}
+        for key, dtype in (("offsets", "<i8"), ("lengths", "<u4"), ("firsts", "<i8"), ("encodings", "<u1")):
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            self._index[key] = np.frombuffer(bytes(self._data[pos:pos + size]), dtype=dtype).reshape(shape)
+            pos += size
+        self._steps_data = bytes(self._data[pos:len(self._data) - 12])
+
+    @property
+    def columns(self):
+        return self.meta["columns"]
+
+    def __len__(self):
+        return self.meta["n_samples"]
+
+    def steps(self):
+        """Manual step sample numbers."""
+        return np.cumsum(zigzag_decode(varint_decode(self._steps_data, self.meta["n_steps"])))
+
+    def _block_column(self, block, j):
+        n = min(self.meta["block_size"], len(self) - block * self.meta["block_size"])
+        offset = int(self._index["offsets"][block, j])
+        length = int(self._index["lengths"][block, j])
+        return decode_stream(int(self._index["firsts"][block, j]), int(self._index["encodings"][block, j]),
+                             self._data[offset:offset + length], n)
+
+    def _read_into(self, start, stop, columns, out, scale):
+        """Decodes rows [start, stop) of columns block by block into out[:, k] (times scale[k])."""
+        size = self.meta["block_size"]
+        for b in range(start // size, (stop - 1) // size + 1) if stop > start else ():
+            lo = max(start, b * size)
+            hi = min(stop, (b + 1) * size)
+            for k, c in enumerate(columns):
+                values = self._block_column(b, self.columns.index(c))[lo - b * size:hi - b * size]
+                if scale is None:
+                    out[lo - start:hi - start, k] = values
+                else:
+                    np.multiply(values, scale[k], out=out[lo - start:hi - start, k], casting="unsafe")
+        return out
+
+    def _range(self, start, stop):
+        stop = len(self) if stop is None else min(stop, len(self))
+        return max(0, min(start, stop)), stop
+
+    def read_integers(self, start=0, stop=None, columns=None):
+        """Fixed-point int64 values of rows [start, stop) as a dict of arrays."""
+        start, stop = self._range(start, stop)
+        columns = self.columns if columns is None else list(columns)
+        out = self._read_into(start, stop, columns, np.empty((stop - start, len(columns)), dtype=np.int64), None)
+        return {c: out[:, k] for k, c in enumerate(columns)}
+
+    def read(self, start=0, stop=None, columns=None):
+        """
+        Rows [start, stop) as a DataFrame, decoding only the blocks needed.
+
+        Numeric columns come back as float64, text columns as their strings.
+        """
+        integers = self.read_integers(start, stop, columns)
+        data = {}
+        for c, values in integers.items():
+            if c in self.meta["categories"]:
+                data[c] = np.array(self.meta["categories"][c], dtype=object)[values]
+            else:
+                data[c] = values / 10.0 ** self.meta["decimals"][c]
+        return pd.DataFrame(data)
+
+    def read_array(self, start=0, stop=None, columns=("ax", "ay", "az"), dtype=np.float32):
+        """Numeric columns as one (n, len(columns)) array, scaled straight into dtype."""
+        start, stop = self._range(start, stop)
+        columns = list(columns)
+        scale = [10.0 ** -self.meta["decimals"][c] for c in columns]
+        return self._read_into(start, stop, columns, np.empty((stop - start, len(columns)), dtype=dtype), scale)
+
+
+# ==========================================================
+# CLI
+# ==========================================================
+def main():
+    parser = argparse.ArgumentParser(description="Compress sensor CSVs into .stca archives")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compress = sub.add_parser("compress")
+    compress.add_argument("sensor_csv")
+    compress.add_argument("--manual", default=None,
+                          help="manual_step_samples CSV (default: the one next to sensor_csv, if any)")
+    compress.add_argument("-o", "--output", default=None)
+    compress.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    compress.add_argument("--decimals", nargs="+", default=[], metavar="COLUMN=N",
+                          help="fixed-point decimals of a column (default: detected from the first rows)")
+    decompress = sub.add_parser("decompress")
+    decompress.add_argument("archive")
+    decompress.add_argument("-o", "--output", required=True, help="sensor CSV to write (steps go next to it)")
+    info = sub.add_parser("info")
+    info.add_argument("archive")
+    args = parser.parse_args()
+
+    if args.command == "compress":
+        manual = args.manual
+        if manual is None and args.sensor_csv.endswith("sensor_data.csv"):
+            candidate = args.sensor_csv[:-len("sensor_data.csv")] + "manual_step_samples.csv"
+            manual = candidate if os.path.exists(candidate) else None
+        output = args.output or os.path.splitext(args.sensor_csv)[0] + ".stca"
+        try:
+            decimals = {c: int(n) for c, n in (item.split("=") for item in args.decimals)}
+        except ValueError:
+            parser.error(f"--decimals expects COLUMN=N, got {args.decimals}")
+        start = time.perf_counter()
+        writer = ArchiveWriter(output, decimals, block_size=args.block_size,
+                               meta={"source": os.path.basename(args.sensor_csv)})
+        try:
+            for chunk in pd.read_csv(args.sensor_csv, chunksize=1 << 18):
+                writer.write(chunk)
+        except ValueError as e:
+            parser.exit(1, f"{e}\n(on the command line: --decimals COLUMN=N)\n")
+        steps = pd.read_csv(manual)["sample_number"].to_numpy() if manual else None
+        writer.close(steps)
+        before, after = os.path.getsize(args.sensor_csv), os.path.getsize(output)
+        print(f"{args.sensor_csv}: {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB "
+              f"({before / after:.1f}x) in {time.perf_counter() - start:.2f} s")
+
+    elif args.command == "decompress":
+        reader = ArchiveReader(args.archive)
+        reader.read().to_csv(args.output, index=False, float_format="%.6f")
+        if reader.meta["n_steps"] and args.output.endswith("sensor_data.csv"):
+            manual_csv = args.output[:-len("sensor_data.csv")] + "manual_step_samples.csv"
+            pd.DataFrame({"sample_number": reader.steps()}).to_csv(manual_csv, index=False)
+
+    elif args.command == "info":
+        reader = ArchiveReader(args.archive)
+        print(json.dumps(reader.meta, indent=2))
+
+
+if __name__ == "__main__":
+    main()
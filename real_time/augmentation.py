@@ -0,0 +1,278 @@
+"""
+Data augmentation for the step classifier.
+
+Each recorded session is cut into chunks and every chunk is replayed with
+random distortions of the raw accelerations:
+
+    time warp       smooth random speed changes (cadence variation)
+    amplitude       gain error of the sensor
+    rotation        different placement of the board
+    noise           extra sensor noise
+    dropout         runs of lost samples (BLE)
+
+The distorted chunk goes through the normal preprocessing and the
+vectorized feature extractor, and the manual steps follow the distortion
+(every augmented sample remembers its position in the original recording).
+Chunks are processed in a worker pool and the features come back as
+shuffled mini-batches, so training can consume as many augmented variants
+as wanted without holding them in memory.
+
+Note that rotation (and, up to the gain, scaling) leaves the magnitude
+based features unchanged; they matter for the gyro features and models
+using the raw axes.
+
+Usage:
+    python augmentation.py --variants 5 --output model.npz
+    python augmentation.py --val-subject nabais    (held out for early stopping)
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+import step_analysis as sa
+
+# ==============================
+# CONFIG
+# ==============================
+CHUNK_SIZE = 20000
+# Extra samples on each side of a chunk so the filters settle and the
+# candidates crossing the chunk edges are kept
+CHUNK_MARGIN = 2000
+BATCH_SIZE = 32
+SHUFFLE_BUFFER = 4096
+
+
+@dataclass
+class AugmentConfig:
+    """Strength of each distortion (0 disables it)."""
+    time_warp: float = 0.15          # max relative speed change
+    time_warp_knot_samples: int = 400  # distance between speed knots
+    amplitude: float = 0.1           # max relative gain change
+    rotation_deg: float = 30.0       # max rotation angle
+    noise_g: float = 0.01            # std of the added noise
+    dropout_rate: float = 0.002      # chance that a sample starts a gap
+    dropout_max_samples: int = 20    # longest gap
+
+
+# ==========================================================
+# DISTORTIONS
+# ==========================================================
+def _rotation_matrix(rng, max_deg):
+    axis = rng.normal(size=3)
+    axis /= np.linalg.norm(axis)
+    angle = np.deg2rad(rng.uniform(-max_deg, max_deg))
+    K = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    return np.eye(3) + np.sin(angle) * K + (1 - np.cos(angle)) * K @ K
+
+
+def augment(acc, rng, config=None):
+    """
+    Applies every distortion of config (default AugmentConfig()) to a (n, 3) acceleration array.
+
+    Returns:
+        tuple: (augmented (m, 3) array, original (fractional) position of each augmented sample)
+    """
+    config = AugmentConfig() if config is None else config
+    n = len(acc)
+    positions = np.arange(n, dtype=np.float64)
+
+    if config.time_warp > 0 and n > 1:
+        n_knots = max(2, n // config.time_warp_knot_samples + 2)
+        speed_knots = 1.0 + rng.uniform(-config.time_warp, config.time_warp, n_knots)
+        speed = np.interp(np.arange(n), np.linspace(0, n - 1, n_knots), speed_knots)
+        positions = np.concatenate(([0.0], np.cumsum(speed)[:-1]))
+        positions = positions[positions <= n - 1]
+        acc = np.column_stack([np.interp(positions, np.arange(n), acc[:, k]) for k in range(3)])
+
+    if config.rotation_deg > 0:
+        acc = acc @ _rotation_matrix(rng, config.rotation_deg).T
+    if config.amplitude > 0:
+        acc = acc * rng.uniform(1 - config.amplitude, 1 + config.amplitude)
+    if config.noise_g > 0:
+        acc = acc + rng.normal(0.0, config.noise_g, acc.shape)
+
+    if config.dropout_rate > 0:
+        keep = np.ones(len(acc), dtype=bool)
+        gap_starts = np.flatnonzero(rng.random(len(acc)) < config.dropout_rate)
+        gap_lengths = rng.integers(1, config.dropout_max_samples + 1, len(gap_starts))
+        for start, length in zip(gap_starts, gap_lengths):
+            keep[start:start + length] = False
+        acc, positions = acc[keep], positions[keep]
+
+    return acc, positions
+
+
+def map_steps(steps, positions):
+    """Augmented sample index of each original step sample (steps in dropped regions land on the next sample)."""
+    index = np.searchsorted(positions, steps, side="left")
+    return index[index < len(positions)]
+
+
+# ==========================================================
+# WORKERS
+# ==========================================================
+_sessions = {}
+
+
+def _load(name):
+    """Session arrays, loaded once per worker process."""
+    if name not in _sessions:
+        sensor_data, manual_steps = sa.load_session(*sa.list_sessions()[name])
+        _sessions[name] = (sensor_data[["ax", "ay", "az"]].to_numpy(dtype=np.float64), np.sort(manual_steps))
+    return _sessions[name]
+
+
+def augmented_chunk_features(name, start, stop, seed, alpha, window, config):
+    """
+    Features/labels of the candidates of one augmented chunk of a session.
+
+    Only candidates starting inside [start, stop) of the original recording
+    are returned, so consecutive chunks don't repeat them.
+    """
+    acc, steps = _load(name)
+    lo = max(0, start - CHUNK_MARGIN)
+    hi = min(len(acc), stop + CHUNK_MARGIN)
+    rng = np.random.default_rng(seed)
+    augmented, positions = augment(acc[lo:hi], rng, config)
+    local_steps = steps[(steps >= lo) & (steps < hi)] - lo
+
+    signal = sa.preprocess(augmented[:, 0], augmented[:, 1], augmented[:, 2], alpha, window)
+    features, labels, intervals = sa.extract_and_label_features_by_containment(
+        signal, map_steps(local_steps, positions))
+    origin = positions[intervals[:, 0]] + lo if len(intervals) else np.zeros(0)
+    inside = (origin >= start) & (origin < stop)
+    return features[inside], labels[inside]
+
+
+def chunk_tasks(names, n_variants, chunk_size=CHUNK_SIZE, seed=0):
+    """(name, start, stop, seed) of every chunk of every variant, in a shuffled order."""
+    tasks = []
+    for name in names:
+        n = len(_load(name)[0])
+        for variant in range(n_variants):
+            for start in range(0, n, chunk_size):
+                tasks.append((name, start, min(n, start + chunk_size)))
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(tasks))
+    return [(*tasks[i], int(seed) * 1_000_003 + k) for k, i in enumerate(order)]
+
+
+def augmented_batches(names, n_variants=1, alpha=sa.DEFAULT_ALPHA, window=sa.DEFAULT_WINDOW,
+                      config=None, batch_size=BATCH_SIZE, shuffle_buffer=SHUFFLE_BUFFER,
+                      workers=None, seed=0, pool=None):
+    """
+    Yields (X, y) mini-batches of augmented candidates.
+
+    Chunks are computed in a process pool with at most 2 * workers chunks in
+    flight, and their rows go through a shuffle buffer of shuffle_buffer
+    rows, so memory stays bounded whatever n_variants is.
+
+    Args:
+        names (list): Sessions of step_analysis.list_sessions().
+        n_variants (int): Augmented copies of every session per pass.
+        config (AugmentConfig): Distortions, default AugmentConfig().
+        pool (ProcessPoolExecutor): Reuse an existing pool (e.g. across epochs).
+    """
+    config = AugmentConfig() if config is None else config
+    rng = np.random.default_rng(seed)
+    tasks = chunk_tasks(names, n_variants, seed=seed)
+    own_pool = pool is None
+    pool = ProcessPoolExecutor(max_workers=workers) if own_pool else pool
+    in_flight = 2 * (workers or os.cpu_count() or 1)
+    buffer_X, buffer_y, n_buffered = [], [], 0
+
+    def drain(final):
+        nonlocal buffer_X, buffer_y, n_buffered
+        X = np.vstack(buffer_X)
+        y = np.concatenate(buffer_y)
+        order = rng.permutation(len(X))
+        n_out = len(X) if final else len(X) - shuffle_buffer // 2
+        n_out = n_out // batch_size * batch_size if not final else n_out
+        keep = order[n_out:]
+        out = order[:n_out]
+        buffer_X, buffer_y, n_buffered = [X[keep]], [y[keep]], len(keep)
+        for lo in range(0, len(out), batch_size):
+            batch = out[lo:lo + batch_size]
+            yield X[batch], y[batch]
+
+    try:
+        futures = []
+        next_task = 0
+        while next_task < len(tasks) or futures:
+            while next_task < len(tasks) and len(futures) < in_flight:
+                name, start, stop, task_seed = tasks[next_task]
+                futures.append(pool.submit(augmented_chunk_features, name, start, stop, task_seed,
+                                           alpha, window, config))
+                next_task += 1
+            X, y = futures.pop(0).result()
+            buffer_X.append(X)
+            buffer_y.append(y)
+            n_buffered += len(X)
+            if n_buffered >= shuffle_buffer:
+                yield from drain(final=False)
+        if n_buffered:
+            yield from drain(final=True)
+    finally:
+        if own_pool:
+            pool.shutdown(cancel_futures=True)
+
+
+def main():
+    from evaluate import SUBJECTS, subject_sessions
+    from mlp_trainer import class_weights, fit_scaler, train_mlp_stream
+
+    parser = argparse.ArgumentParser(description="Train the MLP on augmented sessions")
+    parser.add_argument("--sessions", nargs="+", default=None, help="default: data/old/")
+    parser.add_argument("--variants", type=int, default=3, help="augmented copies per session and epoch")
+    parser.add_argument("--alpha", type=float, default=sa.DEFAULT_ALPHA)
+    parser.add_argument("--window", type=int, default=sa.DEFAULT_WINDOW)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=None, help="save the model as .npz")
+    parser.add_argument("--val-subject", choices=SUBJECTS, default="xico",
+                        help="subject whose sessions are held out for early stopping")
+    args = parser.parse_args()
+
+    names = args.sessions or [name for name in sa.list_sessions() if name.startswith("old/")]
+    val_names = subject_sessions(args.val_subject, names)
+    train_names = [name for name in names if name not in val_names]
+    if not val_names or not train_names:
+        parser.error(f"--val-subject {args.val_subject} must leave sessions on both sides "
+                     f"(validation: {val_names}, training: {train_names})")
+
+    def original_features(session_names):
+        X, y = [], []
+        for name in session_names:
+            acc, steps = _load(name)
+            signal = sa.preprocess(acc[:, 0], acc[:, 1], acc[:, 2], args.alpha, args.window)
+            features, labels, _ = sa.extract_and_label_features_by_containment(signal, steps)
+            X.append(features)
+            y.append(labels)
+        return np.vstack(X), np.concatenate(y)
+
+    # Scaler and class weights come from the original (non augmented) training
+    # sessions, the validation set from the held out subject only
+    X_train, y_train = original_features(train_names)
+    X_val, y_val = original_features(val_names)
+    means, stds = fit_scaler(X_train)
+    print(f"Training on {train_names}, validating on {val_names}")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        epoch_seed = iter(range(args.epochs))
+        model = train_mlp_stream(
+            lambda: augmented_batches(train_names, args.variants, args.alpha, args.window,
+                                      pool=pool, seed=next(epoch_seed)),
+            X_val, y_val, means, stds, epochs=args.epochs, weights=class_weights(y_train), verbose=True)
+    print(f"Trained in {time.perf_counter() - start:.1f} s")
+    if args.output:
+        model.save(args.output)
+        print(f"Model written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
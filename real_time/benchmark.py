@@ -0,0 +1,260 @@
+"""
+Benchmarks for the step-counting pipeline.
+
+Times every stage (BLE/CSV parsing, filtering, the filter bank sweep, peak
+extraction, features, classification, scoring, the streaming detector and
+the dashboard notification path) over the labelled sessions in data/ and data/old/,
+tiled to 1x/10x/100x their length, and reports samples/sec and peak memory.
+
+Usage:
+    python benchmark.py                            # run everything, print a table
+    python benchmark.py --stages filter peaks --sizes 1 10
+    python benchmark.py --save-baseline            # store results as the baseline
+    python benchmark.py --compare                  # exit 1 if slower/bigger than the baseline
+    python benchmark.py --sessions --synthetic 120 --sizes 1   # only a 2 hour synthetic session
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import step_analysis as sa
+from filter_bank import filter_bank
+from instrumentation import PipelineStats
+from protocol import parse_samples
+from step_detector import NeuralNetwork, StepDetector
+from synthetic_gait import SAMPLE_RATE_HZ, generate_session
+
+# ==============================
+# CONFIG
+# ==============================
+BASELINE_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+SIZES = [1, 10, 100]
+# Combinations longer than this are skipped (100x the 90k sample session is 9M samples)
+MAX_SAMPLES = 5_000_000
+TOLERANCE = 0.25
+# Sweep grid of the notebook's alpha/window cells for the filter_bank stage
+SWEEP_ALPHAS = [0.001, 0.01, 0.05, 0.1, 0.5]
+SWEEP_WINDOWS = [5, 10, 30, 40, 50, 60, 100]
+
+
+# ==========================================================
+# INPUTS
+# ==========================================================
+class Workload:
+    """A session tiled `size` times, with everything the stages need computed lazily."""
+
+    def __init__(self, name, ax, ay, az, manual_steps, size):
+        n = len(ax)
+        self.name = name
+        self.size = size
+        self.ax = np.tile(ax, size)
+        self.ay = np.tile(ay, size)
+        self.az = np.tile(az, size)
+        self.manual_steps = (manual_steps[None, :] + n * np.arange(size)[:, None]).ravel()
+        self.n_samples = len(self.ax)
+        self._cache = {}
+
+    def _get(self, key, make):
+        if key not in self._cache:
+            self._cache[key] = make()
+        return self._cache[key]
+
+    @property
+    def notifications(self):
+        """One BLE notification per sample, formatted like main.ino."""
+        return self._get("notifications", lambda: [
+            f"{x:.6f},{y:.6f},{z:.6f},LOOKING_FOR_MIN,0.000000,0"
+            for x, y, z in zip(self.ax.tolist(), self.ay.tolist(), self.az.tolist())])
+
+    @property
+    def csv_text(self):
+        return self._get("csv_text", lambda: pd.DataFrame(
+            {"ax": self.ax, "ay": self.ay, "az": self.az}).to_csv(index=False, float_format="%.6f"))
+
+    @property
+    def signal(self):
+        return self._get("signal", lambda: sa.preprocess(self.ax, self.ay, self.az))
+
+    @property
+    def triples(self):
+        return self._get("triples", lambda: sa.candidate_intervals(self.signal))
+
+    @property
+    def features(self):
+        return self._get("features", lambda: sa.interval_features(self.signal, self.triples))
+
+    @property
+    def detected_intervals(self):
+        return self._get("detected", lambda: find_steps(self.signal, self.triples))
+
+
+def find_steps(signal, triples=None):
+    return sa.find_step_intervals_by_diff(signal,
+                                          sa.DEFAULT_MIN_PEAK_INTERVAL,
+                                          sa.DEFAULT_MAX1_MIN_DIFF_BOUNDS,
+                                          sa.DEFAULT_MAX2_MIN_DIFF_BOUNDS,
+                                          sa.DEFAULT_MAX1_MAX2_DIFF_BOUNDS,
+                                          triples=triples)
+
+
+# ==========================================================
+# STAGES
+# ==========================================================
+# Each stage: (prepare(workload) -> args, run(*args)). Only run() is measured.
+_model = NeuralNetwork.from_firmware()
+
+
+def _run_parse_ble(notifications):
+    buffer = ""
+    for text in notifications:
+        _, buffer = parse_samples(buffer + text)
+
+
+def _run_dashboard(notifications):
+    """handle_notification() without Qt: parse, host detection, instrumentation."""
+    stats = PipelineStats()
+    detector = StepDetector(model=_model)
+    buffer = ""
+    for text in notifications:
+        arrival = stats.now()
+        samples, buffer = parse_samples(buffer + text)
+        parsed = stats.now()
+        for ax, ay, az, _, _, _ in samples:
+            stats.record("parse", arrival, parsed)
+            if detector.process(ax, ay, az):
+                stats.record("detect", arrival)
+            stats.record("enqueue", parsed)
+
+
+STAGES = {
+    "parse_ble": (lambda w: (w.notifications,), _run_parse_ble),
+    "parse_csv": (lambda w: (w.csv_text,), lambda text: pd.read_csv(io.StringIO(text))),
+    "filter": (lambda w: (w.ax, w.ay, w.az), sa.preprocess),
+    "filter_bank": (lambda w: (w.ax, w.ay, w.az, SWEEP_ALPHAS, SWEEP_WINDOWS), filter_bank),
+    "peaks": (lambda w: (w.signal,), find_steps),
+    "features": (lambda w: (w.signal, w.manual_steps), sa.extract_and_label_features_by_containment),
+    "classify": (lambda w: (w.features,), _model.predict_batch),
+    "score": (lambda w: (w.detected_intervals, w.manual_steps), sa.test_accuracy),
+    "stream": (lambda w: (w.ax, w.ay, w.az), lambda ax, ay, az: StepDetector(model=_model).process_array(ax, ay, az)),
+    "dashboard": (lambda w: (w.notifications,), _run_dashboard),
+}
+
+
+def measure(run, args, repeat):
+    """Best wall time over `repeat` runs, then one extra run under tracemalloc for peak memory."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(*args)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    run(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+# ==========================================================
+# BASELINES
+# ==========================================================
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of human readable regressions against the baseline results."""
+    regressions = []
+    for key, current in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        if current["samples_per_s"] < reference["samples_per_s"] * (1.0 - tolerance):
+            regressions.append(f"{key}: {current['samples_per_s']:,.0f} samples/s "
+                               f"(baseline {reference['samples_per_s']:,.0f})")
+        if current["peak_mb"] > reference["peak_mb"] * (1.0 + tolerance) + 1.0:
+            regressions.append(f"{key}: peak {current['peak_mb']:.1f} MB "
+                               f"(baseline {reference['peak_mb']:.1f} MB)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the step-counting pipeline")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--sessions", nargs="*", default=None,
+                        help="session names as listed by step_analysis.list_sessions() (default: all)")
+    parser.add_argument("--synthetic", type=float, default=None, metavar="MINUTES",
+                        help="also run a synthetic_gait session of this length")
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES, help="tiling factors")
+    parser.add_argument("--max-samples", type=int, default=MAX_SAMPLES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE_FILENAME)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed relative slowdown / memory growth for --compare")
+    args = parser.parse_args()
+
+    sessions = sa.list_sessions()
+    names = list(sessions) if args.sessions is None else args.sessions
+    inputs = [(name, *sa.load_session(*sessions[name])) for name in names]
+    if args.synthetic is not None:
+        n_samples = int(args.synthetic * 60 * SAMPLE_RATE_HZ)
+        inputs.append((f"synthetic/{args.synthetic:g}min", *generate_session(n_samples, seed=0)))
+
+    results = {}
+    print(f"{'stage':<10} {'session':<18} {'size':>5} {'samples':>10} {'samples/s':>14} {'peak MB':>9}")
+    for name, sensor_data, manual_steps in inputs:
+        ax, ay, az = (sensor_data[c].to_numpy(dtype=np.float64) for c in ("ax", "ay", "az"))
+        for size in args.sizes:
+            if len(ax) * size > args.max_samples:
+                print(f"{'-':<10} {name:<18} {size:>5} skipped (> --max-samples)")
+                continue
+            workload = Workload(name, ax, ay, az, manual_steps, size)
+            for stage in args.stages:
+                prepare, run = STAGES[stage]
+                seconds, peak = measure(run, prepare(workload), args.repeat)
+                key = f"{stage}/{name}/x{size}"
+                results[key] = {
+                    "samples": workload.n_samples,
+                    "seconds": seconds,
+                    "samples_per_s": workload.n_samples / seconds,
+                    "peak_mb": peak / 2**20,
+                }
+                print(f"{stage:<10} {name:<18} {size:>5} {workload.n_samples:>10} "
+                      f"{results[key]['samples_per_s']:>14,.0f} {results[key]['peak_mb']:>9.1f}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["environment"] != environment():
+            print("Warning: baseline was recorded on a different environment")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Dense grid search over the find_step_intervals_by_diff bounds.
+
+The Max -> Min -> Max candidates of a signal don't depend on the bounds
+(see step_analysis.candidate_intervals), so they are extracted once and every
+set of bounds becomes a boolean mask over them. Masks are built by
+broadcasting the bounds against the candidate differences, and scored
+without building interval lists:
+
+A manual step lies in at most two candidates, A and the next one B (only
+when the step is the end point they share), because candidates never
+overlap otherwise. test_accuracy() credits it to A when A is kept, else to
+B, so with M the mask of kept candidates:
+
+    step found         = M[A] | M[B]
+    candidate credited = M[i] & (is an A | (is a B & ~M[i - 1]))
+
+which gives the same true/false positives as find_step_intervals_by_diff()
+followed by test_accuracy().
+"""
+import itertools
+
+import numpy as np
+
+import step_analysis as sa
+
+# One row of a candidates array
+BOUND_COLUMNS = [
+    "min_peak_interval",
+    "max1_min_lower", "max1_min_upper",
+    "max2_min_lower", "max2_min_upper",
+    "max1_max2_lower", "max1_max2_upper",
+]
+
+# Bound sets scored at once, caps the (chunk, candidates) masks
+CHUNK_SIZE = 2048
+
+
+class BoundsEvaluator:
+    """Scores many bound sets on one signal against its manual steps."""
+
+    def __init__(self, signal, manual_steps, triples=None):
+        signal = np.asarray(signal, dtype=np.float64)
+        if triples is None:
+            triples = sa.candidate_intervals(signal)
+        self.triples = triples
+        self.n_manual = len(manual_steps)
+
+        max1_val = signal[triples[:, 0]]
+        min_val = signal[triples[:, 1]]
+        max2_val = signal[triples[:, 2]]
+        self.spacing = triples[:, 2] - triples[:, 0]
+        self.max1_min = max1_val - min_val
+        self.max2_min = max2_val - min_val
+        self.max1_max2 = np.abs(max1_val - max2_val)
+
+        # Containing candidates of every manual step, len(triples) = "none"
+        # (a padding column that is never kept)
+        manual = np.sort(np.asarray(manual_steps))
+        starts = triples[:, 0]
+        ends = triples[:, 2]
+        none = len(triples)
+        first = np.searchsorted(ends, manual, side="left")
+        first_ok = first < none
+        first_ok[first_ok] = starts[first[first_ok]] <= manual[first_ok]
+        self.first = np.where(first_ok, first, none)
+        second = first + 1
+        second_ok = first_ok & (second < none)
+        second_ok[second_ok] = starts[second[second_ok]] <= manual[second_ok]
+        self.second = np.where(second_ok, second, none)
+
+        self.first_for_step = np.zeros(none, dtype=bool)
+        self.first_for_step[self.first[first_ok]] = True
+        self.second_for_step = np.zeros(none, dtype=bool)
+        self.second_for_step[self.second[second_ok]] = True
+
+    def masks(self, candidates):
+        """(n_bounds, n_candidates) bool, True where a candidate passes the bounds."""
+        c = np.asarray(candidates, dtype=np.float64).reshape(-1, len(BOUND_COLUMNS))
+        col = lambda k: c[:, k][:, None]
+        return (self.spacing[None, :] >= col(0)) \
+            & (col(1) <= self.max1_min) & (self.max1_min <= col(2)) \
+            & (col(3) <= self.max2_min) & (self.max2_min <= col(4)) \
+            & (col(5) <= self.max1_max2) & (self.max1_max2 <= col(6))
+
+    def counts(self, candidates, chunk_size=CHUNK_SIZE):
+        """
+        True positives, false negatives and false positives of every bound set.
+
+        Args:
+            candidates (np.array): (n_bounds, 7) rows as in BOUND_COLUMNS.
+        Returns:
+            dict: 'true_positives', 'false_negatives', 'false_positives' (n_bounds,) int arrays.
+        """
+        candidates = np.asarray(candidates, dtype=np.float64).reshape(-1, len(BOUND_COLUMNS))
+        n = len(candidates)
+        tp = np.empty(n, dtype=np.int64)
+        fp = np.empty(n, dtype=np.int64)
+        for lo in range(0, n, chunk_size):
+            kept = self.masks(candidates[lo:lo + chunk_size])
+            padded = np.zeros((len(kept), kept.shape[1] + 1), dtype=bool)
+            padded[:, :-1] = kept
+            found = padded[:, self.first] | padded[:, self.second]
+            previous_kept = np.zeros_like(kept)
+            previous_kept[:, 1:] = kept[:, :-1]
+            credited = kept & (self.first_for_step | (self.second_for_step & ~previous_kept))
+            tp[lo:lo + chunk_size] = found.sum(axis=1)
+            fp[lo:lo + chunk_size] = kept.sum(axis=1) - credited.sum(axis=1)
+        return {"true_positives": tp, "false_negatives": self.n_manual - tp, "false_positives": fp}
+
+    def score(self, candidates, chunk_size=CHUNK_SIZE):
+        """counts() plus precision, recall and f1_score arrays."""
+        return with_scores(self.counts(candidates, chunk_size))
+
+
+def with_scores(counts):
+    """Adds precision/recall/f1_score to a counts() dict (counts may be summed over sessions first)."""
+    tp = counts["true_positives"].astype(np.float64)
+    fn = counts["false_negatives"]
+    fp = counts["false_positives"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1_score = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return {**counts, "precision": precision, "recall": recall, "f1_score": f1_score}
+
+
+def bounds_grid(min_peak_intervals, max1_min_bounds, max2_min_bounds, max1_max2_bounds):
+    """
+    Every combination of the given values as a candidates array.
+
+    Args:
+        min_peak_intervals (list): Values of min_peak_interval.
+        max1_min_bounds, max2_min_bounds, max1_max2_bounds (list): (lower, upper) tuples.
+    Returns:
+        tuple: ((n_bounds, 7) candidates, grid shape to reshape the scores into a surface)
+    """
+    axes = [list(min_peak_intervals), list(max1_min_bounds), list(max2_min_bounds), list(max1_max2_bounds)]
+    rows = [(mpi, *b1, *b2, *b3) for mpi, b1, b2, b3 in itertools.product(*axes)]
+    return np.array(rows, dtype=np.float64).reshape(-1, len(BOUND_COLUMNS)), tuple(len(a) for a in axes)
+
+
+def f1_surface(evaluators, min_peak_intervals, max1_min_bounds, max2_min_bounds, max1_max2_bounds):
+    """
+    F1 of every bound combination over one or more sessions (counts are summed).
+
+    Args:
+        evaluators (list): BoundsEvaluator per session.
+    Returns:
+        np.array: F1 with shape (len(min_peak_intervals), len(max1_min_bounds),
+                  len(max2_min_bounds), len(max1_max2_bounds)).
+    """
+    candidates, shape = bounds_grid(min_peak_intervals, max1_min_bounds, max2_min_bounds, max1_max2_bounds)
+    total = None
+    for evaluator in evaluators:
+        counts = evaluator.counts(candidates)
+        total = counts if total is None else {k: total[k] + counts[k] for k in total}
+    return with_scores(total)["f1_score"].reshape(shape)
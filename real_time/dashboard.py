@@ -1,4 +1,6 @@
+import argparse
 import asyncio
+import logging
 import math
 from collections import deque
 import sys
@@ -6,7 +8,10 @@ import threading
 from PyQt5 import QtWidgets, QtCore
 import pyqtgraph as pg
 from bleak import BleakClient
-import re
+from protocol import parse_samples
+from step_detector import StepDetector, NeuralNetwork, DEFAULT_ALPHA, DEFAULT_WINDOW_SIZE
+from instrumentation import PipelineStats
+from signal_quality import SignalQualityMonitor, BAD, ULTRASOUND_DROPOUT, ACC_RANGE_G
 
 # CHANGE THIS to your Arduino's BLE MAC address:
 BLE_ADDRESS = "CA:2E:65:03:DD:B6"
@@ -26,6 +31,17 @@ step_count = 0
 window = None
 running = True
 
+# Host-side step detection (None = trust the stepdetected column from the board)
+host_detector = None
+
+# Per-stage latency histograms, see instrumentation.py
+stats = PipelineStats()
+stats_json = None
+log = logging.getLogger("dashboard")
+
+# Saturation/frozen/stall/ultrasound checks, see signal_quality.py
+quality = SignalQualityMonitor()
+
 class MainWindow(QtWidgets.QMainWindow):
     data_received = QtCore.pyqtSignal(dict)
     status_changed = QtCore.pyqtSignal(str)
@@ -54,9 +70,12 @@ class MainWindow(QtWidgets.QMainWindow):
         
         self.status_label = QtWidgets.QLabel('Status: Connecting...')
         self.status_label.setStyleSheet('font-size: 16px; padding: 10px; color: #888;')
+        self.latency_label = QtWidgets.QLabel('Detection: firmware' if host_detector is None else 'Detection: host')
+        self.latency_label.setStyleSheet('font-size: 16px; padding: 10px; color: #888;')
         
         stats_layout.addWidget(self.step_label)
         stats_layout.addWidget(self.status_label)
+        stats_layout.addWidget(self.latency_label)
         stats_layout.addWidget(self.mean_length_label)
         stats_layout.addWidget(self.last_length_label)
         stats_layout.addWidget(self.total_distance_label)
@@ -103,17 +122,33 @@ class MainWindow(QtWidgets.QMainWindow):
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.refresh_plots)
         self.timer.start(50)
+
+        # (arrival, applied) timestamps of samples not yet drawn
+        self.pending_render = []
+        self.statusBar().setStyleSheet('color: #888;')
+        self.stats_timer = QtCore.QTimer()
+        self.stats_timer.timeout.connect(self.update_stats)
+        self.stats_timer.start(1000)
         
     def update_status(self, status):
         self.status_label.setText(f'Status: {status}')
         
+    def update_stats(self):
+        self.statusBar().showMessage(f'{stats.status_line()} | {quality.status_line()}')
+        if host_detector is not None:
+            detect = stats.histograms['detect']
+            self.latency_label.setText(f'Detection: host p50 {detect.percentile(50) / 1e6:.2f} ms, '
+                                       f'p99 {detect.percentile(99) / 1e6:.2f} ms')
+
     def update_plots(self, data):
         global step_count
-        
-                # Print all received data
-        print(f"ax={data['ax']:.3f}, ay={data['ay']:.3f}, az={data['az']:.3f}, "
-        f"state={data['state']}, step_len={data['step_length']:.2f}, "
-        f"step={data['step_detected']}, mag={data['acc_norm']:.3f}")
+        applied = stats.now()
+        stats.record('queue', data['t_enqueue'], applied)
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(f"ax={data['ax']:.3f}, ay={data['ay']:.3f}, az={data['az']:.3f}, "
+                      f"state={data['state']}, step_len={data['step_length']:.2f}, "
+                      f"step={data['step_detected']}, mag={data['acc_norm']:.3f}")
         
         ax_data.append(data['ax'])
         ay_data.append(data['ay'])
@@ -136,6 +171,10 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.total_distance_label.setText(f'Total distance: {total_dist:.2f} cm')
         else:
             step_markers.append(0)
+
+        done = stats.now()
+        stats.record('apply', applied, done)
+        self.pending_render.append((data['arrival'], done))
     
     def refresh_plots(self):
         if len(ax_data) == 0:
@@ -160,36 +199,49 @@ class MainWindow(QtWidgets.QMainWindow):
             self.step_scatter.setData(x=step_x, y=step_y)
         else:
             self.step_scatter.setData(x=[], y=[])
+
+        rendered = stats.now()
+        for arrival, applied in self.pending_render:
+            stats.record('render', applied, rendered)
+            stats.record('end_to_end', arrival, rendered)
+        self.pending_render.clear()
     
     def closeEvent(self, event):
         global running
         running = False
         print("Shutting down...")
+        if stats_json:
+            stats.dump_json(stats_json)
+            print(f"Pipeline stats written to {stats_json}")
         event.accept()
 
 def handle_notification(sender, data):
     global buffer
     if not window or not running:
         return
-        
+
+    arrival = stats.now()
     try:
         text = data.decode("utf-8")
-        buffer += text
+        samples, buffer = parse_samples(buffer + text)
+        parsed = stats.now()
         
-        while True:
-            match = re.search(r'(-?\d+\.\d+),(-?\d+\.\d+),(-?\d+\.\d+),([A-Z_]+),(-?\d+\.\d+),(\d+)', buffer)
-            
-            if not match:
-                break
-                
-            ax = float(match.group(1))
-            ay = float(match.group(2))
-            az = float(match.group(3))
-            state = match.group(4)
-            step_length = float(match.group(5))
-            step_detected = int(match.group(6))
-            
-            buffer = buffer[match.end():]
+        for ax, ay, az, state, step_length, step_detected in samples:
+            stats.record('parse', arrival, parsed)
+            flags = quality.update(ax, ay, az, step_length, arrival / 1e9)
+
+            # Re-classify on the host, the board's decision is ignored
+            if host_detector is not None:
+                step_detected = int(host_detector.process(ax, ay, az))
+                state = host_detector.state
+                if step_detected:
+                    stats.record('detect', arrival)
+
+            # Garbage samples never count as steps, bad distances never count as lengths
+            if flags & BAD:
+                step_detected = 0
+            if flags & ULTRASOUND_DROPOUT:
+                step_length = 0.0
             
             acc_norm = math.sqrt(ax**2 + ay**2 + az**2)
             
@@ -200,16 +252,18 @@ def handle_notification(sender, data):
                 'state': state,
                 'step_length': step_length,
                 'step_detected': step_detected,
-                'acc_norm': acc_norm
+                'acc_norm': acc_norm,
+                'quality': flags,
+                'arrival': arrival,
+                't_enqueue': 0
             }
             
             if step_detected == 1:
-                print(f"🦶 STEP! Total={step_count + 1}")
+                log.info(f"🦶 STEP! Total={step_count + 1}")
             
+            data_dict['t_enqueue'] = stats.now()
+            stats.record('enqueue', parsed, data_dict['t_enqueue'])
             window.data_received.emit(data_dict)
-                
-        if len(buffer) > 500:
-            buffer = buffer[-200:]
             
     except Exception as e:
         print(f"Error: {e}")
@@ -248,7 +302,30 @@ def run_ble():
     asyncio.run(ble_loop())
 
 if __name__ == '__main__':
-    app = QtWidgets.QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description='Real-time step counter dashboard')
+    parser.add_argument('--host-detect', action='store_true',
+                        help='run the step classifier on this computer from raw ax/ay/az')
+    parser.add_argument('--model', default=None,
+                        help='.npz model for --host-detect (default: weights from arduino_files)')
+    parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA, help='EMA alpha for --host-detect')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW_SIZE, help='SMA window for --host-detect')
+    parser.add_argument('--acc-range', type=float, default=ACC_RANGE_G,
+                        help='accelerometer full scale in g, for the saturation check')
+    parser.add_argument('--log-level', default='WARNING',
+                        help='DEBUG prints every sample, INFO every step (default: WARNING)')
+    parser.add_argument('--stats-json', default=None,
+                        help='write the per-stage latency histograms to this JSON file on exit')
+    args, qt_args = parser.parse_known_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(name)s %(message)s')
+    stats_json = args.stats_json
+    quality = SignalQualityMonitor(full_scale=args.acc_range)
+
+    if args.host_detect:
+        model = NeuralNetwork.load(args.model) if args.model else NeuralNetwork.from_firmware()
+        host_detector = StepDetector(alpha=args.alpha, window_size=args.window, model=model)
+
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
     
     window = MainWindow()
     window.show()
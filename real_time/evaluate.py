@@ -0,0 +1,254 @@
+"""
+Leave-one-subject-out evaluation of the step classifier.
+
+For every subject (andre, nabais, tiago, xico) a model is trained on the
+candidate intervals of the other subjects and scored on the held-out one
+with the containment rule of step_analysis.test_accuracy(). Folds run in
+parallel worker processes; the filtered signals/features of each session are
+cached on disk, so only the first run pays for the preprocessing.
+
+Usage:
+    python evaluate.py
+    python evaluate.py --model mlp
+    python evaluate.py --model firmware --alpha 0.0679 --window 10
+    python evaluate.py --workers 4 --output results.csv
+    python evaluate.py --skip-bad    (ignore the bad regions of signal_quality.py)
+"""
+import argparse
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import signal_quality as sq
+import step_analysis as sa
+
+# ==============================
+# CONFIG
+# ==============================
+SUBJECTS = ["andre", "nabais", "tiago", "xico"]
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".eval_cache")
+THRESHOLD = 0.5
+
+
+# ==========================================================
+# PREPROCESSING (cached)
+# ==========================================================
+def subject_sessions(subject, sessions=None):
+    """Session names of data/old/ recorded by `subject` (e.g. old/xico and old/500steps_xico)."""
+    sessions = sa.list_sessions() if sessions is None else sessions
+    return [name for name in sessions
+            if name.startswith("old/") and name.split("/")[-1].split("_")[-1] == subject]
+
+
+def _quality_settings_hash():
+    """Short hash of the signal_quality settings behind the cached bad regions."""
+    settings = (sq.BAD, sq.REGION_PAD, sq.STANDARD_RANGES_G, sq.SATURATION_FRACTION, sq.FROZEN_RUN,
+                sq.VARIANCE_WINDOW, sq.DEAD_VARIANCE, sq.NOISY_VARIANCE, sq.STALL_GAP_S, sq.ULTRASOUND_MAX_CM)
+    return f"{zlib.crc32(repr(settings).encode()):08x}"
+
+
+def load_session_features(name, alpha, window, cache_dir=CACHE_DIR):
+    """
+    Filtered signal, features, labels, intervals and bad regions of one session.
+
+    Results are stored in cache_dir as .npz, keyed by session, filter
+    parameters, modification time of both CSVs and the signal_quality
+    settings, so relabelling or retuning the flags rebuilds the entry.
+    """
+    sensor_csv, manual_csv = sa.list_sessions()[name]
+    key = (f"{name.replace('/', '_')}_a{alpha:.6f}_w{window}"
+           f"_{int(os.path.getmtime(sensor_csv))}_{int(os.path.getmtime(manual_csv))}"
+           f"_q{_quality_settings_hash()}.npz")
+    path = os.path.join(cache_dir, key)
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            cached = dict(cached)
+        if "bad_regions" in cached:
+            return cached
+
+    sensor_data, manual_steps = sa.load_session(sensor_csv, manual_csv)
+    signal = sa.preprocess(sensor_data["ax"].to_numpy(), sensor_data["ay"].to_numpy(),
+                           sensor_data["az"].to_numpy(), alpha, window)
+    features, labels, intervals = sa.extract_and_label_features_by_containment(signal, manual_steps)
+    result = {
+        "signal": signal.astype(np.float32),
+        "features": features,
+        "labels": labels,
+        "intervals": intervals,
+        "manual_steps": manual_steps,
+        "bad_regions": sq.bad_regions(sq.session_flags(sensor_data)),
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(path, **result)
+    return result
+
+
+def load_subject(subject, alpha, window, cache_dir=CACHE_DIR):
+    return [load_session_features(name, alpha, window, cache_dir) for name in subject_sessions(subject)]
+
+
+# ==========================================================
+# MODELS
+# ==========================================================
+def make_model(name, seed):
+    """Returns an object with fit(X, y) and predict_proba(X) -> P(step)."""
+    if name == "rf":
+        from sklearn.ensemble import RandomForestClassifier
+
+        class _RandomForest:
+            def __init__(self):
+                self.model = RandomForestClassifier(n_estimators=50, max_depth=10, class_weight="balanced",
+                                                    n_jobs=1, random_state=seed)
+
+            def fit(self, X, y):
+                self.model.fit(X, y)
+                return self
+
+            def predict_proba(self, X):
+                return self.model.predict_proba(X)[:, 1]
+
+        return _RandomForest()
+
+    if name == "mlp":
+        from mlp_trainer import train_mlp
+
+        class _MLP:
+            """The firmware architecture, retrained on the training subjects."""
+
+            def fit(self, X, y):
+                self.model = train_mlp(X, y, seed=seed)
+                return self
+
+            def predict_proba(self, X):
+                return self.model.predict_batch(X)
+
+        return _MLP()
+
+    if name == "firmware":
+        from step_detector import NeuralNetwork
+
+        class _Firmware:
+            """The network flashed on the board, not retrained."""
+            model = NeuralNetwork.from_firmware()
+
+            def fit(self, X, y):
+                return self
+
+            def predict_proba(self, X):
+                return self.model.predict_batch(X)
+
+        return _Firmware()
+
+    raise ValueError(f"Unknown model '{name}'")
+
+
+MODELS = ["rf", "mlp", "firmware"]
+
+
+# ==========================================================
+# FOLDS
+# ==========================================================
+def _without_bad_regions(session):
+    """Session with the candidates and manual steps inside its bad regions removed."""
+    intervals, manual_steps, keep = sq.drop_bad(session["intervals"], session["manual_steps"],
+                                                session["bad_regions"])
+    return dict(session, intervals=intervals, manual_steps=manual_steps,
+                features=session["features"][keep], labels=session["labels"][keep])
+
+
+def run_fold(test_subject, subjects, model_name, alpha, window, seed, cache_dir=CACHE_DIR, skip_bad=False):
+    """
+    Trains on every subject but test_subject and scores the held-out sessions.
+
+    With skip_bad the bad regions of every session are left out of both the
+    training data and the scoring.
+    """
+    start = time.perf_counter()
+    train = [s for name in subjects if name != test_subject for s in load_subject(name, alpha, window, cache_dir)]
+    test = load_subject(test_subject, alpha, window, cache_dir)
+    if skip_bad:
+        train = [_without_bad_regions(s) for s in train]
+        test = [_without_bad_regions(s) for s in test]
+
+    X_train = np.vstack([s["features"] for s in train])
+    y_train = np.concatenate([s["labels"] for s in train])
+    model = make_model(model_name, seed).fit(X_train, y_train)
+
+    totals = {"true_positives": 0, "false_negatives": 0, "false_positives": 0}
+    for session in test:
+        if len(session["features"]) == 0:
+            totals["false_negatives"] += len(session["manual_steps"])
+            continue
+        is_step = model.predict_proba(session["features"]) > THRESHOLD
+        metrics = sa.test_accuracy(session["intervals"][is_step], session["manual_steps"])
+        for k in totals:
+            totals[k] += metrics[k]
+
+    tp, fn, fp = totals["true_positives"], totals["false_negatives"], totals["false_positives"]
+    precision = tp / (tp + fp) if (tp + fp) > 0 else 0
+    recall = tp / (tp + fn) if (tp + fn) > 0 else 0
+    f1_score = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+    return {
+        "test_subject": test_subject,
+        "train_intervals": len(y_train),
+        "test_steps": tp + fn,
+        **totals,
+        "precision": precision,
+        "recall": recall,
+        "f1_score": f1_score,
+        "wall_time_s": time.perf_counter() - start,
+    }
+
+
+def evaluate(subjects=SUBJECTS, model_name="rf", alpha=sa.DEFAULT_ALPHA, window=sa.DEFAULT_WINDOW,
+             workers=None, seed=42, cache_dir=CACHE_DIR, skip_bad=False):
+    """
+    Runs every leave-one-subject-out fold.
+
+    Returns:
+        pd.DataFrame: One row per held-out subject plus a 'mean' row.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Fill the cache once per subject, then every fold only reads it
+        list(pool.map(load_subject, subjects, [alpha] * len(subjects), [window] * len(subjects),
+                      [cache_dir] * len(subjects)))
+        futures = [pool.submit(run_fold, s, subjects, model_name, alpha, window, seed, cache_dir, skip_bad)
+                   for s in subjects]
+        rows = [f.result() for f in futures]
+
+    table = pd.DataFrame(rows).set_index("test_subject")
+    table.loc["mean"] = table.mean(numeric_only=True)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leave-one-subject-out evaluation")
+    parser.add_argument("--subjects", nargs="+", default=SUBJECTS)
+    parser.add_argument("--model", choices=MODELS, default="rf")
+    parser.add_argument("--alpha", type=float, default=sa.DEFAULT_ALPHA)
+    parser.add_argument("--window", type=int, default=sa.DEFAULT_WINDOW)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--skip-bad", action="store_true",
+                        help="leave the bad regions of signal_quality.py out of training and scoring")
+    parser.add_argument("--output", default=None, help="also write the table to this CSV file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = evaluate(args.subjects, args.model, args.alpha, args.window, args.workers, args.seed, args.cache_dir,
+                     args.skip_bad)
+    with pd.option_context("display.float_format", "{:.4f}".format, "display.width", 200):
+        print(table)
+    print(f"\nTotal wall time: {time.perf_counter() - start:.2f} s")
+
+    if args.output:
+        table.to_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
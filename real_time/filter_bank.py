@@ -0,0 +1,95 @@
+"""
+Filter bank for parameter sweeps over the preprocessing chain.
+
+preprocess() (EMA -> magnitude -> SMA) is evaluated for many (alpha, window)
+candidates in one call and returned as a (candidates x samples) float32
+matrix, with the same values as step_analysis.preprocess() for each row.
+
+Work is shared between candidates: the EMA/magnitude is computed once per
+distinct alpha, and all the windows of that alpha come from a single cumsum
+with one fancy-indexing operation. The data is processed in chunks of
+chunk_size samples (filter states and the SMA tail are carried across
+chunks), so temporaries stay bounded whatever the recording length; only the
+output grows with it, and it can be a np.memmap passed as `out`.
+"""
+import numpy as np
+from scipy.signal import lfilter
+
+CHUNK_SIZE = 1 << 16
+
+
+def bank_candidates(alphas, windows, grid=True):
+    """
+    (alpha, window) of every row of filter_bank().
+
+    Args:
+        alphas (array-like): EMA alphas.
+        windows (array-like): SMA window sizes.
+        grid (bool): True for every combination (alpha-major, row
+                     i * len(windows) + j is alphas[i], windows[j]), False to
+                     pair alphas[k] with windows[k] (e.g. optimizer proposals).
+    Returns:
+        tuple: (alphas, windows) arrays, one entry per row.
+    """
+    alphas = np.asarray(alphas, dtype=np.float64).ravel()
+    windows = np.asarray(windows, dtype=np.int64).ravel()
+    if grid:
+        return np.repeat(alphas, len(windows)), np.tile(windows, len(alphas))
+    if len(alphas) != len(windows):
+        raise ValueError("alphas and windows must have the same length when grid=False")
+    return alphas, windows
+
+
+def filter_bank(ax, ay, az, alphas, windows, grid=True, chunk_size=CHUNK_SIZE, out=None):
+    """
+    Filtered magnitude for every (alpha, window) candidate.
+
+    Args:
+        ax, ay, az (np.array): Raw accelerations.
+        alphas (array-like): EMA alphas.
+        windows (array-like): SMA window sizes (>= 1).
+        grid (bool): See bank_candidates().
+        chunk_size (int): Samples processed per step.
+        out (np.array): Optional (candidates, n) float32 array to fill.
+    Returns:
+        np.array: (candidates, n) float32, rows ordered as bank_candidates().
+    """
+    raw = np.column_stack([ax, ay, az]).astype(np.float64)
+    n = len(raw)
+    cand_alphas, cand_windows = bank_candidates(alphas, windows, grid)
+    if np.any(cand_windows < 1):
+        raise ValueError("window sizes must be >= 1")
+    if out is None:
+        out = np.empty((len(cand_alphas), n), dtype=np.float32)
+    if n == 0:
+        return out
+
+    # Rows sharing an alpha are filtered together
+    groups = []
+    for alpha in np.unique(cand_alphas):
+        rows = np.flatnonzero(cand_alphas == alpha)
+        groups.append((alpha, rows, cand_windows[rows]))
+
+    max_window = int(cand_windows.max())
+    zi = [(1.0 - alpha) * raw[0][None, :] for alpha, _, _ in groups]
+    tails = [np.zeros(0) for _ in groups]
+
+    for offset in range(0, n, chunk_size):
+        chunk = raw[offset:offset + chunk_size]
+        m = len(chunk)
+        # Samples seen so far, the divisor of the shorter windows at the start
+        seen = offset + np.arange(1, m + 1)
+        for g, (alpha, rows, row_windows) in enumerate(groups):
+            filtered, zi[g] = lfilter([alpha], [1.0, alpha - 1.0], chunk, axis=0, zi=zi[g])
+            magnitude = np.sqrt(np.einsum("ij,ij->i", filtered, filtered)) - 1.0
+
+            extended = np.concatenate([tails[g], magnitude])
+            cumsum = np.zeros(len(extended) + 1)
+            np.cumsum(extended, out=cumsum[1:])
+            ends = len(tails[g]) + np.arange(1, m + 1)
+            starts = np.maximum(ends[None, :] - row_windows[:, None], 0)
+            counts = np.minimum(row_windows[:, None], seen[None, :])
+            out[rows, offset:offset + m] = (cumsum[ends][None, :] - cumsum[starts]) / counts
+
+            tails[g] = extended[-(max_window - 1):] if max_window > 1 else extended[:0]
+    return out
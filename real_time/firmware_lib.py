@@ -0,0 +1,142 @@
+"""
+The firmware StepDetector/NeuralNetwork compiled for the computer.
+
+arduino_files/compile_host.sh builds StepDetector.cpp and NeuralNetwork.cpp
+with a small Arduino.h shim into a shared library; this module loads it with
+ctypes. Whole NumPy arrays are passed per call, so recordings replay through
+the exact firmware code (float32 arithmetic, the weights compiled into
+NeuralNetwork.cpp) at C++ speed. It is the reference to check the Python port
+in step_detector.py against.
+
+Usage:
+    detector = FirmwareStepDetector(alpha=0.0679, window_size=10)
+    steps = detector.process_array(ax, ay, az)
+"""
+import ctypes
+import os
+import subprocess
+
+import numpy as np
+
+from step_detector import (ARDUINO_DIR, DEFAULT_ALPHA, DEFAULT_WINDOW_SIZE, LOOKING_FOR_FIRST_MAX,
+                           LOOKING_FOR_MIN, LOOKING_FOR_SECOND_MAX, N_FEATURES)
+
+# ==============================
+# CONFIG
+# ==============================
+COMPILE_HOST_SH = os.path.join(ARDUINO_DIR, "compile_host.sh")
+LIBRARY_PATH = os.path.join(ARDUINO_DIR, "host", "libstepdetector.so")
+
+# Codes written by sd_process_array() in step_detector_capi.cpp
+STATES = [LOOKING_FOR_FIRST_MAX, LOOKING_FOR_MIN, LOOKING_FOR_SECOND_MAX]
+
+_float_p = np.ctypeslib.ndpointer(dtype=np.float32, flags="C_CONTIGUOUS")
+_uint8_p = np.ctypeslib.ndpointer(dtype=np.uint8, flags="C_CONTIGUOUS")
+_libraries = {}   # resolved path -> loaded library
+
+
+def build_library(output=LIBRARY_PATH):
+    """Runs compile_host.sh (needs a C++ compiler, g++ by default or $CXX)."""
+    subprocess.run(["bash", COMPILE_HOST_SH, output], check=True)
+
+
+def load_library(path=LIBRARY_PATH, build=True):
+    """
+    Loads the host build of the firmware, compiling it first if needed.
+
+    The library is rebuilt when a firmware source is newer than it. Each
+    path is loaded once.
+    """
+    key = os.path.realpath(path)
+    if key in _libraries:
+        return _libraries[key]
+
+    sources = [os.path.join(ARDUINO_DIR, name) for name in
+               ("StepDetector.cpp", "StepDetector.h", "NeuralNetwork.cpp", "NeuralNetwork.h",
+                os.path.join("host", "Arduino.h"), os.path.join("host", "step_detector_capi.cpp"))]
+    stale = not os.path.exists(path) or \
+        os.path.getmtime(path) < max(os.path.getmtime(s) for s in sources)
+    if stale:
+        if not build:
+            raise FileNotFoundError(f"{path} is missing or outdated, run {COMPILE_HOST_SH}")
+        build_library(path)
+
+    lib = ctypes.CDLL(path)
+    lib.sd_create.argtypes = [ctypes.c_float, ctypes.c_int]
+    lib.sd_create.restype = ctypes.c_void_p
+    lib.sd_destroy.argtypes = [ctypes.c_void_p]
+    lib.sd_destroy.restype = None
+    lib.sd_state.argtypes = [ctypes.c_void_p]
+    lib.sd_state.restype = ctypes.c_char_p
+    lib.sd_process_array.argtypes = [ctypes.c_void_p, _float_p, _float_p, _float_p,
+                                     ctypes.c_long, _uint8_p, ctypes.c_void_p]
+    lib.sd_process_array.restype = ctypes.c_long
+    lib.nn_predict_array.argtypes = [_float_p, ctypes.c_long, _float_p]
+    lib.nn_predict_array.restype = None
+    _libraries[key] = lib
+    return lib
+
+
+class FirmwareStepDetector:
+    """
+    The firmware StepDetector, same interface as step_detector.StepDetector
+    (without a pluggable model: the network is the one in NeuralNetwork.cpp).
+
+    Args:
+        alpha (float): EMA smoothing factor, as setAlpha().
+        window_size (int): SMA window, as setWindowSize().
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA, window_size=DEFAULT_WINDOW_SIZE, library_path=LIBRARY_PATH):
+        self.alpha = alpha
+        self.window_size = window_size
+        self._lib = load_library(library_path)
+        self._handle = None
+        self.reset()
+
+    def reset(self):
+        self.close()
+        self._handle = self._lib.sd_create(self.alpha, self.window_size)
+
+    def close(self):
+        if self._handle is not None:
+            self._lib.sd_destroy(self._handle)
+            self._handle = None
+
+    def __del__(self):
+        self.close()
+
+    @property
+    def state(self):
+        return self._lib.sd_state(self._handle).decode()
+
+    def process_array(self, ax, ay, az, return_states=False):
+        """
+        Feeds a whole recording (continuing from the current state).
+
+        Returns:
+            np.array: 0/1 int8 per sample, plus the state name after every
+                      sample (np.array of str) if return_states.
+        """
+        ax, ay, az = (np.ascontiguousarray(a, dtype=np.float32) for a in (ax, ay, az))
+        n = len(ax)
+        steps = np.zeros(n, dtype=np.uint8)
+        states = np.zeros(n, dtype=np.uint8) if return_states else None
+        states_ptr = states.ctypes.data_as(ctypes.c_void_p) if return_states else None
+        self._lib.sd_process_array(self._handle, ax, ay, az, n, steps, states_ptr)
+        if return_states:
+            return steps.view(np.int8), np.array(STATES)[states]
+        return steps.view(np.int8)
+
+    def process(self, ax, ay, az):
+        """Feeds one sample. Returns True when a step is detected."""
+        return bool(self.process_array([ax], [ay], [az])[0])
+
+
+def predict_batch(scaled_features, library_path=LIBRARY_PATH):
+    """Firmware NeuralNetwork::predict() over (n, 11) features already scaled with SCALER_MEANS/STDS."""
+    lib = load_library(library_path)
+    features = np.ascontiguousarray(scaled_features, dtype=np.float32).reshape(-1, N_FEATURES)
+    probabilities = np.zeros(len(features), dtype=np.float32)
+    lib.nn_predict_array(features, len(features), probabilities)
+    return probabilities
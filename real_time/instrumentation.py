@@ -0,0 +1,169 @@
+"""
+Lightweight latency/throughput instrumentation for the live pipeline.
+
+Every sample is stamped with time.perf_counter_ns() at each stage
+(receive -> parse -> enqueue -> GUI apply -> render) and the stage-to-stage
+durations go into HdrHistogram-style log-linear histograms: recording is a
+couple of integer operations, memory is fixed and percentiles keep a bounded
+relative error no matter how long the dashboard runs.
+"""
+import json
+import threading
+import time
+
+# Stage durations tracked by PipelineStats, in pipeline order
+STAGES = (
+    "parse",       # BLE notification received -> sample parsed
+    "enqueue",     # parsed -> emitted to the GUI thread (includes host detection)
+    "queue",       # emitted -> GUI thread starts applying it
+    "apply",       # GUI apply (buffers + labels)
+    "render",      # applied -> curves redrawn with it
+    "end_to_end",  # BLE notification received -> curves redrawn
+    "detect",      # BLE notification received -> host step event (--host-detect only)
+)
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of durations in nanoseconds.
+
+    Values below 2**significant_bits are counted exactly, larger values go to
+    buckets whose width doubles every power of two, so the relative error of
+    any reported value is below 2**-(significant_bits - 1).
+
+    Args:
+        significant_bits (int): Precision of each bucket (7 -> ~1.6% error).
+    """
+
+    def __init__(self, significant_bits=7):
+        self.significant_bits = significant_bits
+        self._sub_count = 1 << significant_bits
+        self._half = self._sub_count >> 1
+        self._counts = [0] * (self._sub_count + 64 * self._half)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * len(self._counts)
+            self.count = 0
+            self.total = 0
+            self.min = None
+            self.max = 0
+
+    def _index(self, value):
+        if value < self._sub_count:
+            return value
+        shift = value.bit_length() - self.significant_bits
+        return self._sub_count + (shift - 1) * self._half + ((value >> shift) - self._half)
+
+    def _bucket_value(self, index):
+        """Middle of the value range covered by bucket `index`."""
+        if index < self._sub_count:
+            return index
+        shift, offset = divmod(index - self._sub_count, self._half)
+        shift += 1
+        low = (offset + self._half) << shift
+        return low + ((1 << shift) >> 1)
+
+    def record(self, nanoseconds):
+        value = max(int(nanoseconds), 0)
+        index = self._index(value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, p):
+        """Returns the value (ns) below which p percent of the recorded values fall."""
+        if self.count == 0:
+            return 0
+        target = max(1, int(round(self.count * p / 100.0)))
+        seen = 0
+        for index, n in enumerate(self._counts):
+            seen += n
+            if seen >= target:
+                return min(self._bucket_value(index), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self):
+        """Summary in milliseconds, ready for json.dumps."""
+        summary = {
+            "count": self.count,
+            "min_ms": (self.min or 0) / 1e6,
+            "mean_ms": self.mean / 1e6,
+            "max_ms": self.max / 1e6,
+        }
+        for p in PERCENTILES:
+            summary[f"p{p:g}_ms"] = self.percentile(p) / 1e6
+        return summary
+
+
+class PipelineStats:
+    """
+    One LatencyHistogram per stage plus per-stage throughput.
+
+    Stages are recorded from both the BLE thread and the GUI thread, each
+    histogram has its own lock.
+    """
+
+    def __init__(self, stages=STAGES):
+        self.histograms = {stage: LatencyHistogram() for stage in stages}
+        self.started = time.perf_counter_ns()
+        self._rate_mark = {stage: (self.started, 0) for stage in stages}
+        self._rates = {stage: 0.0 for stage in stages}
+
+    @staticmethod
+    def now():
+        return time.perf_counter_ns()
+
+    def record(self, stage, start_ns, end_ns=None):
+        """Records end_ns - start_ns (end defaults to now) for `stage`."""
+        if end_ns is None:
+            end_ns = time.perf_counter_ns()
+        self.histograms[stage].record(end_ns - start_ns)
+
+    def rates(self):
+        """Events per second of each stage since the previous call."""
+        now = time.perf_counter_ns()
+        for stage, hist in self.histograms.items():
+            mark_ns, mark_count = self._rate_mark[stage]
+            if now - mark_ns >= 250_000_000:
+                self._rates[stage] = (hist.count - mark_count) * 1e9 / (now - mark_ns)
+                self._rate_mark[stage] = (now, hist.count)
+        return dict(self._rates)
+
+    def status_line(self):
+        """Compact one-line summary for the dashboard status bar."""
+        rates = self.rates()
+        parts = [f"{rates['parse']:.0f} samples/s"]
+        for stage in ("parse", "queue", "render", "end_to_end", "detect"):
+            hist = self.histograms.get(stage)
+            if hist is None or hist.count == 0:
+                continue
+            parts.append(f"{stage} p50 {hist.percentile(50) / 1e6:.2f} / p99 {hist.percentile(99) / 1e6:.2f} ms")
+        return " | ".join(parts)
+
+    def to_dict(self):
+        rates = self.rates()
+        return {
+            "uptime_s": (time.perf_counter_ns() - self.started) / 1e9,
+            "stages": {
+                stage: dict(hist.to_dict(), rate_per_s=rates[stage])
+                for stage, hist in self.histograms.items()
+            },
+        }
+
+    def dump_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
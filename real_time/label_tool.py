@@ -0,0 +1,315 @@
+"""
+Offline tool to correct the manual step labels of a session.
+
+The ENTER presses of get_data.py are late/early by a few samples and
+sometimes missing or doubled; this tool shows the whole session (raw
+magnitude and the filtered signal the detector uses, drawn through the
+min/max decimation index of session_viewer.py so panning stays smooth on
+90k+ sample sessions) with the labels on top, and writes the corrected
+manual_step_samples CSV.
+
+Controls:
+    left click          add a label (or select the label under the cursor)
+    drag a label        move it
+    right click         delete the label under the cursor
+    Delete              delete the selected label
+    Left / Right        move the selected label 1 sample (Shift: 10)
+    N / P               go to the next / previous label
+    Ctrl+Z              undo
+    Ctrl+S              save
+    Home                show the whole session
+    mouse wheel, drag   zoom / pan
+
+Usage:
+    python label_tool.py old/andre
+    python label_tool.py --sensor ../data/xico1_sensor_data.csv --snap 20
+"""
+import argparse
+import os
+import shutil
+import sys
+
+import numpy as np
+from PyQt5 import QtWidgets, QtCore, QtGui
+import pyqtgraph as pg
+
+import signal_quality as sq
+import step_analysis as sa
+from session_viewer import MinMaxIndex, StepLabels, read_manual_steps
+
+# ==============================
+# CONFIG
+# ==============================
+# Pixels around a label that grab it for selection/drag/delete
+PICK_PIXELS = 6
+# Samples shown around a label by N / P
+JUMP_SPAN = 2000
+SNAP_SAMPLES = 0
+
+
+class LabelViewBox(pg.ViewBox):
+    """ViewBox that turns clicks and drags on labels into edits; other drags pan."""
+
+    def __init__(self, tool):
+        super().__init__()
+        self.tool = tool
+        self.dragging = None
+        self.first_move = False
+        self.setMouseEnabled(x=True, y=False)
+
+    def mouseClickEvent(self, ev):
+        x = self.mapSceneToView(ev.scenePos()).x()
+        if ev.button() == QtCore.Qt.LeftButton:
+            self.tool.click(x)
+            ev.accept()
+        elif ev.button() == QtCore.Qt.RightButton:
+            self.tool.delete_at(x)
+            ev.accept()
+        else:
+            super().mouseClickEvent(ev)
+
+    def mouseDragEvent(self, ev, axis=None):
+        if ev.button() != QtCore.Qt.LeftButton:
+            return super().mouseDragEvent(ev, axis)
+        if ev.isStart():
+            self.dragging = self.tool.pick(self.mapSceneToView(ev.buttonDownScenePos()).x())
+            self.first_move = True
+        if self.dragging is None:
+            return super().mouseDragEvent(ev, axis)
+        ev.accept()
+        self.dragging = self.tool.move_to(self.dragging, self.mapSceneToView(ev.scenePos()).x(),
+                                          record=self.first_move)
+        self.first_move = False
+        if ev.isFinish():
+            self.dragging = None
+
+
+class LabelTool(QtWidgets.QMainWindow):
+    """
+    Labelling window.
+
+    Args:
+        ax, ay, az (np.array): Raw accelerations of the session.
+        steps (np.array): Labels to start from.
+        output (str): manual_step_samples CSV written by save().
+        title (str): Window title (session name).
+        snap (int): Snap new labels to the filtered-signal minimum within +-snap samples.
+    """
+
+    def __init__(self, ax, ay, az, steps, output, title, snap=SNAP_SAMPLES,
+                 alpha=sa.DEFAULT_ALPHA, window=sa.DEFAULT_WINDOW):
+        super().__init__()
+        self.output = output
+        self.title = title
+        self.snap = snap
+        self.selected = None
+
+        raw = np.sqrt(ax ** 2 + ay ** 2 + az ** 2) - 1.0
+        self.signal = sa.preprocess(ax, ay, az, alpha, window)
+        self.raw_index = MinMaxIndex(raw)
+        self.signal_index = MinMaxIndex(self.signal)
+        self.labels = StepLabels(steps, len(raw))
+
+        self.view = LabelViewBox(self)
+        self.plot_widget = pg.PlotWidget(viewBox=self.view)
+        self.plot_widget.showGrid(x=True, y=True, alpha=0.3)
+        self.plot_widget.setLabel('bottom', 'sample')
+        self.setCentralWidget(self.plot_widget)
+        self.resize(1600, 600)
+
+        # Shade the regions signal_quality.py considers garbage
+        flags = sq.quality_flags(ax, ay, az, full_scale=sq.infer_full_scale(ax, ay, az))
+        for start, stop in sq.bad_regions(flags, pad=0):
+            self.view.addItem(pg.LinearRegionItem((start, stop), movable=False,
+                                                  brush=pg.mkBrush(255, 80, 80, 40)))
+
+        self.raw_curve = self.plot_widget.plot(pen=pg.mkPen((120, 120, 120), width=1))
+        self.signal_curve = self.plot_widget.plot(pen=pg.mkPen('c', width=2))
+        self.label_scatter = pg.ScatterPlotItem(size=12, pen=pg.mkPen('r', width=2),
+                                                brush=pg.mkBrush(255, 0, 0, 160), symbol='t')
+        self.selected_scatter = pg.ScatterPlotItem(size=16, pen=pg.mkPen('y', width=2),
+                                                   brush=pg.mkBrush(255, 255, 0, 200), symbol='t')
+        self.view.addItem(self.label_scatter)
+        self.view.addItem(self.selected_scatter)
+
+        self.view.setLimits(xMin=0, xMax=len(raw))
+        self.view.sigXRangeChanged.connect(self.refresh)
+        self.view.sigResized.connect(self.refresh)
+
+        shortcuts = {
+            'Ctrl+S': self.save,
+            'Ctrl+Z': self.undo,
+            'Delete': self.delete_selected,
+            'Left': lambda: self.nudge(-1),
+            'Right': lambda: self.nudge(1),
+            'Shift+Left': lambda: self.nudge(-10),
+            'Shift+Right': lambda: self.nudge(10),
+            'N': lambda: self.jump(1),
+            'P': lambda: self.jump(-1),
+            'Home': self.show_all,
+        }
+        for key, slot in shortcuts.items():
+            QtWidgets.QShortcut(QtGui.QKeySequence(key), self, slot)
+
+        self.show_all()
+
+    # ------------------------------
+    # Drawing
+    # ------------------------------
+    def refresh(self, *_):
+        (x0, x1), _ = self.view.viewRange()
+        max_points = 2 * max(1, int(self.view.width()))
+        self.raw_curve.setData(*self.raw_index.query(x0, x1, max_points), connect='finite')
+        self.signal_curve.setData(*self.signal_index.query(x0, x1, max_points), connect='finite')
+
+        raw_lo, raw_hi = self.raw_index.value_range(x0, x1)
+        lo, hi = self.signal_index.value_range(x0, x1)
+        lo, hi = min(lo, raw_lo), max(hi, raw_hi)
+        margin = 0.05 * (hi - lo) or 0.1
+        self.view.setYRange(lo - margin, hi + margin, padding=0)
+        self.refresh_labels()
+
+    def refresh_labels(self):
+        (x0, x1), _ = self.view.viewRange()
+        visible = self.labels.visible(x0, x1 + 1)
+        self.label_scatter.setData(x=visible, y=self.signal[visible])
+        if self.selected is not None and self.selected < len(self.labels):
+            step = self.labels.steps[self.selected]
+            self.selected_scatter.setData(x=[step], y=[self.signal[step]])
+        else:
+            self.selected = None
+            self.selected_scatter.setData(x=[], y=[])
+
+        modified = '* ' if self.labels.modified else ''
+        self.setWindowTitle(f'{modified}{self.title} - {len(self.labels)} labels')
+        samples_per_pixel = (x1 - x0) / max(1, self.view.width())
+        self.statusBar().showMessage(f'samples {int(x0)}-{int(x1)} ({samples_per_pixel:.1f}/pixel) | '
+                                     f'{len(visible)} labels in view | output: {self.output}')
+
+    def show_all(self):
+        self.view.setXRange(0, len(self.signal), padding=0)
+
+    # ------------------------------
+    # Editing
+    # ------------------------------
+    def _tolerance(self):
+        (x0, x1), _ = self.view.viewRange()
+        return PICK_PIXELS * (x1 - x0) / max(1, self.view.width())
+
+    def _snap(self, x):
+        sample = int(round(x))
+        if self.snap <= 0:
+            return sample
+        lo = max(0, sample - self.snap)
+        hi = min(len(self.signal), sample + self.snap + 1)
+        return lo + int(np.argmin(self.signal[lo:hi]))
+
+    def pick(self, x):
+        return self.labels.nearest(x, self._tolerance())
+
+    def click(self, x):
+        picked = self.pick(x)
+        self.selected = picked if picked is not None else self.labels.add(self._snap(x))
+        self.refresh_labels()
+
+    def move_to(self, index, x, record=True):
+        self.selected = self.labels.move(index, x, record)
+        self.refresh_labels()
+        return self.selected
+
+    def delete_at(self, x):
+        picked = self.pick(x)
+        if picked is not None:
+            self.labels.delete(picked)
+            self.selected = None
+            self.refresh_labels()
+
+    def delete_selected(self):
+        if self.selected is not None:
+            self.labels.delete(self.selected)
+            self.selected = None
+            self.refresh_labels()
+
+    def nudge(self, delta):
+        if self.selected is not None:
+            self.selected = self.labels.move(self.selected, self.labels.steps[self.selected] + delta)
+            self.refresh_labels()
+
+    def jump(self, direction):
+        """Centres the view on the next/previous label (selecting it)."""
+        if len(self.labels) == 0:
+            return
+        (x0, x1), _ = self.view.viewRange()
+        centre = (x0 + x1) / 2
+        steps = self.labels.steps
+        k = np.searchsorted(steps, centre, side='right') if direction > 0 else np.searchsorted(steps, centre) - 1
+        k = int(np.clip(k, 0, len(steps) - 1))
+        self.selected = k
+        span = min(x1 - x0, JUMP_SPAN)
+        self.view.setXRange(steps[k] - span / 2, steps[k] + span / 2, padding=0)
+        self.refresh_labels()
+
+    def undo(self):
+        self.labels.undo()
+        self.selected = None
+        self.refresh_labels()
+
+    def save(self):
+        # Keep the labels recorded by get_data.py the first time they are overwritten
+        backup = self.output + '.orig'
+        if os.path.exists(self.output) and not os.path.exists(backup):
+            shutil.copyfile(self.output, backup)
+        self.labels.save(self.output)
+        print(f'{len(self.labels)} labels written to {self.output}')
+        self.refresh_labels()
+
+    def closeEvent(self, event):
+        if self.labels.modified:
+            answer = QtWidgets.QMessageBox.question(
+                self, 'Unsaved labels', 'Save the labels before closing?',
+                QtWidgets.QMessageBox.Save | QtWidgets.QMessageBox.Discard | QtWidgets.QMessageBox.Cancel)
+            if answer == QtWidgets.QMessageBox.Cancel:
+                event.ignore()
+                return
+            if answer == QtWidgets.QMessageBox.Save:
+                self.save()
+        event.accept()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Correct the manual step labels of a session')
+    parser.add_argument('session', nargs='?', default=None, help='labelled session name (e.g. old/andre)')
+    parser.add_argument('--sensor', default=None, help='sensor_data CSV (sessions without labels yet)')
+    parser.add_argument('--manual', default=None,
+                        help='labels to load (default: the session manual_step_samples CSV)')
+    parser.add_argument('--output', default=None, help='CSV to write (default: --manual, the original is kept as .orig)')
+    parser.add_argument('--snap', type=int, default=SNAP_SAMPLES,
+                        help='snap new labels to the signal minimum within this many samples')
+    parser.add_argument('--alpha', type=float, default=sa.DEFAULT_ALPHA)
+    parser.add_argument('--window', type=int, default=sa.DEFAULT_WINDOW)
+    args, qt_args = parser.parse_known_args()
+
+    if args.session is not None:
+        sensor_csv, manual_csv = sa.list_sessions()[args.session]
+    elif args.sensor is not None:
+        sensor_csv = args.sensor
+        manual_csv = sensor_csv[:-len(sa.SENSOR_SUFFIX)] + sa.MANUAL_SUFFIX \
+            if sensor_csv.endswith(sa.SENSOR_SUFFIX) else os.path.splitext(sensor_csv)[0] + '_' + sa.MANUAL_SUFFIX
+    else:
+        parser.error('give a session name or --sensor')
+    manual_csv = args.manual or manual_csv
+    output = args.output or manual_csv
+
+    sensor_data, _ = sa.load_session(sensor_csv)
+    ax, ay, az = (sensor_data[c].to_numpy(dtype=np.float64) for c in ('ax', 'ay', 'az'))
+
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    pg.setConfigOptions(antialias=False)
+    tool = LabelTool(ax, ay, az, read_manual_steps(manual_csv), output,
+                     title=os.path.basename(sensor_csv), snap=args.snap, alpha=args.alpha, window=args.window)
+    tool.show()
+    sys.exit(app.exec_())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+"""
+NumPy trainer for the step classifier MLP (11 -> 32 -> 16 -> 1).
+
+Same recipe as the Keras cells of analisar/main.ipynb, without importing
+TensorFlow: StandardScaler, Glorot-uniform init, mini-batch Adam on binary
+cross-entropy, class weight of the positives capped at 3.0, the last 20% of
+the data as validation and early stopping on val_loss (patience 10,
+restoring the best weights). The result is a step_detector.NeuralNetwork,
+so it can be saved as .npz for the dashboard or printed as the C arrays of
+StepDetector.cpp / NeuralNetwork.cpp.
+
+Usage:
+    python mlp_trainer.py --output model.npz
+    python mlp_trainer.py --sessions old/andre old/tiago --alpha 0.0679 --window 10 --cpp
+"""
+import argparse
+import time
+
+import numpy as np
+
+from step_detector import NeuralNetwork, sigmoid
+
+# ==============================
+# CONFIG
+# ==============================
+HIDDEN_SIZES = (32, 16)
+EPOCHS = 100
+BATCH_SIZE = 32
+LEARNING_RATE = 1e-3
+# Keras Adam defaults
+BETA_1 = 0.9
+BETA_2 = 0.999
+EPSILON = 1e-7
+VALIDATION_SPLIT = 0.2
+PATIENCE = 10
+# Cap on the positive class weight, prevents a False Positive explosion
+MAX_POSITIVE_WEIGHT = 3.0
+
+
+# ==========================================================
+# HELPERS
+# ==========================================================
+def fit_scaler(X):
+    """StandardScaler means/scales (population std, 1 for constant columns)."""
+    means = X.mean(axis=0)
+    stds = X.std(axis=0)
+    stds[stds == 0] = 1.0
+    return means, stds
+
+
+def class_weights(y):
+    """{0: 1.0, 1: min(neg / pos, MAX_POSITIVE_WEIGHT)}, as in the notebook."""
+    pos = int(np.sum(y))
+    neg = len(y) - pos
+    ratio = neg / pos if pos > 0 else 1.0
+    return {0: 1.0, 1: min(ratio, MAX_POSITIVE_WEIGHT)}
+
+
+def _bce(logits, y):
+    """Binary cross-entropy computed from the logits (stable for large |z|)."""
+    return np.maximum(logits, 0) - logits * y + np.log1p(np.exp(-np.abs(logits)))
+
+
+def _forward(params, X):
+    """Returns the activations of every layer and the output logits."""
+    activations = [X]
+    h = X
+    last = len(params) - 1
+    for i, (W, b) in enumerate(params):
+        h = h @ W + b
+        if i < last:
+            h = np.maximum(h, 0.0)
+            activations.append(h)
+    return activations, h[:, 0]
+
+
+def _loss(params, X, y, sample_weights=None):
+    _, logits = _forward(params, X)
+    losses = _bce(logits, y)
+    if sample_weights is not None:
+        losses = losses * sample_weights
+    return float(np.mean(losses))
+
+
+# ==========================================================
+# TRAINING
+# ==========================================================
+def _init_params(sizes, rng):
+    """Glorot-uniform weights, zero biases, and zeroed Adam moments."""
+    params = []
+    for fan_in, fan_out in zip(sizes[:-1], sizes[1:]):
+        limit = np.sqrt(6.0 / (fan_in + fan_out))
+        params.append((rng.uniform(-limit, limit, (fan_in, fan_out)), np.zeros(fan_out)))
+    m = [(np.zeros_like(W), np.zeros_like(b)) for W, b in params]
+    v = [(np.zeros_like(W), np.zeros_like(b)) for W, b in params]
+    return params, m, v
+
+
+def _adam_step(params, m, v, step, X, y, sample_weights, learning_rate):
+    """One Adam update on a (scaled) mini-batch; m and v are updated in place."""
+    activations, logits = _forward(params, X)
+    p = sigmoid(logits)
+    grad = (sample_weights * (p - y) / len(y))[:, None]
+
+    lr = learning_rate * np.sqrt(1 - BETA_2 ** step) / (1 - BETA_1 ** step)
+    new_params = list(params)
+    for i in range(len(params) - 1, -1, -1):
+        W, b = params[i]
+        grads = (activations[i].T @ grad, grad.sum(axis=0))
+        if i > 0:
+            grad = (grad @ W.T) * (activations[i] > 0)
+        updated = []
+        for k, (param, g) in enumerate(zip((W, b), grads)):
+            m[i][k][...] = BETA_1 * m[i][k] + (1 - BETA_1) * g
+            v[i][k][...] = BETA_2 * v[i][k] + (1 - BETA_2) * g * g
+            updated.append(param - lr * m[i][k] / (np.sqrt(v[i][k]) + EPSILON))
+        new_params[i] = tuple(updated)
+    return new_params
+
+
+def train_mlp(X, y,
+              hidden_sizes=HIDDEN_SIZES,
+              epochs=EPOCHS,
+              batch_size=BATCH_SIZE,
+              learning_rate=LEARNING_RATE,
+              validation_split=VALIDATION_SPLIT,
+              patience=PATIENCE,
+              seed=42,
+              verbose=False):
+    """
+    Trains the classifier.
+
+    Args:
+        X (np.array): (n, n_features) raw (unscaled) features.
+        y (np.array): (n,) 0/1 labels.
+        hidden_sizes (tuple): Units of the ReLU layers.
+        validation_split (float): Fraction taken from the END of the data for
+                                  early stopping (like Keras); 0 disables it.
+        patience (int): Epochs without val_loss improvement before stopping.
+    Returns:
+        NeuralNetwork: The trained network with its scaler.
+    """
+    rng = np.random.default_rng(seed)
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    means, stds = fit_scaler(X)
+    X = (X - means) / stds
+    n_val = int(len(X) * validation_split)
+    X_train, y_train = X[:len(X) - n_val], y[:len(X) - n_val]
+    X_val, y_val = X[len(X) - n_val:], y[len(X) - n_val:]
+
+    weights = class_weights(y_train)
+    sample_weights = np.where(y_train == 1, weights[1], weights[0])
+
+    params, m, v = _init_params([X.shape[1], *hidden_sizes, 1], rng)
+
+    best_loss = np.inf
+    best_params = params
+    wait = 0
+    step = 0
+    for epoch in range(epochs):
+        order = rng.permutation(len(X_train))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            step += 1
+            params = _adam_step(params, m, v, step, X_train[batch], y_train[batch], sample_weights[batch],
+                                learning_rate)
+
+        if n_val == 0:
+            best_params = params
+            continue
+        val_loss = _loss(params, X_val, y_val)
+        if verbose:
+            print(f"epoch {epoch + 1:3d}  loss {_loss(params, X_train, y_train, sample_weights):.4f}"
+                  f"  val_loss {val_loss:.4f}")
+        if val_loss < best_loss:
+            best_loss = val_loss
+            best_params = params
+            wait = 0
+        else:
+            wait += 1
+            if wait >= patience:
+                break
+
+    return NeuralNetwork([W for W, _ in best_params], [b for _, b in best_params], means, stds)
+
+
+def train_mlp_stream(make_batches, X_val, y_val, means, stds,
+                     hidden_sizes=HIDDEN_SIZES,
+                     epochs=EPOCHS,
+                     learning_rate=LEARNING_RATE,
+                     patience=PATIENCE,
+                     weights=None,
+                     seed=42,
+                     verbose=False):
+    """
+    Trains from a stream of mini-batches (e.g. augmentation.augmented_batches()),
+    so the training set never has to be in memory.
+
+    Args:
+        make_batches (callable): Returns a fresh iterable of (X, y) raw
+                                 feature batches for each epoch.
+        X_val, y_val (np.array): Fixed validation set for early stopping
+                                 (normally non augmented data).
+        means, stds (np.array): Scaler, e.g. fit_scaler() of the original features.
+        weights (dict): Class weights, class_weights(y_val) by default.
+    Returns:
+        NeuralNetwork: The weights with the best val_loss.
+    """
+    rng = np.random.default_rng(seed)
+    X_val = (np.asarray(X_val, dtype=np.float64) - means) / stds
+    y_val = np.asarray(y_val, dtype=np.float64)
+    weights = class_weights(y_val) if weights is None else weights
+
+    params, m, v = _init_params([len(means), *hidden_sizes, 1], rng)
+    best_loss = np.inf
+    best_params = params
+    wait = 0
+    step = 0
+    for epoch in range(epochs):
+        n_batches = 0
+        for X, y in make_batches():
+            X = (np.asarray(X, dtype=np.float64) - means) / stds
+            y = np.asarray(y, dtype=np.float64)
+            step += 1
+            n_batches += 1
+            params = _adam_step(params, m, v, step, X, y, np.where(y == 1, weights[1], weights[0]),
+                                learning_rate)
+
+        val_loss = _loss(params, X_val, y_val)
+        if verbose:
+            print(f"epoch {epoch + 1:3d}  batches {n_batches}  val_loss {val_loss:.4f}")
+        if val_loss < best_loss:
+            best_loss = val_loss
+            best_params = params
+            wait = 0
+        else:
+            wait += 1
+            if wait >= patience:
+                break
+
+    return NeuralNetwork([W for W, _ in best_params], [b for _, b in best_params], means, stds)
+
+
+def fold_scaler(model):
+    """
+    Folds the StandardScaler into the first layer.
+
+    (x - mean) / std @ W0 + b0 == x @ (W0 / std) + (b0 - (mean / std) @ W0),
+    so the returned network takes raw features (identity scaler).
+    """
+    W0 = model.weights[0].astype(np.float64)
+    means = model.scaler_means.astype(np.float64)
+    stds = model.scaler_stds.astype(np.float64)
+    weights = [W0 / stds[:, None]] + model.weights[1:]
+    biases = [model.biases[0] - (means / stds) @ W0] + model.biases[1:]
+    return NeuralNetwork(weights, biases, np.zeros_like(means), np.ones_like(stds))
+
+
+# ==========================================================
+# EXPORT
+# ==========================================================
+def format_cpp_array(name, array):
+    array = np.array(array)
+    if array.ndim == 1:
+        # Bias vector
+        s = f"static const float {name}[{array.shape[0]}] = {{\n"
+        s += ", ".join(f"{v:.8e}f" for v in array)
+        s += "};\n"
+    elif array.ndim == 2:
+        # Weight matrix
+        rows, cols = array.shape
+        s = f"static const float {name}[{rows}][{cols}] = {{\n"
+        for r in range(rows):
+            row_str = ", ".join(f"{v:.8e}f" for v in array[r])
+            s += f"    {{ {row_str} }},\n"
+        s += "};\n"
+    else:
+        raise ValueError("Wrong dimension")
+    return s
+
+
+def export_cpp(model):
+    """The scaler lines of StepDetector.cpp and the layer arrays of NeuralNetwork.cpp, as text."""
+    n = len(model.scaler_means)
+    lines = [
+        "// COPY THIS TO StepDetector.cpp TOP",
+        f"const float SCALER_MEANS[{n}] = {{ " + ", ".join(f"{x:.6f}f" for x in model.scaler_means) + " };",
+        f"const float SCALER_STDS[{n}] = {{ " + ", ".join(f"{x:.6f}f" for x in model.scaler_stds) + " };",
+        "\n",
+    ]
+    for i, (W, b) in enumerate(zip(model.weights, model.biases)):
+        lines.append(f"// Layer {i}")
+        lines.append(format_cpp_array(f"W{i}", W))
+        lines.append(format_cpp_array(f"b{i}", b))
+    return "\n".join(lines)
+
+
+def main():
+    import step_analysis as sa
+
+    parser = argparse.ArgumentParser(description="Train the step classifier MLP without TensorFlow")
+    parser.add_argument("--sessions", nargs="+", default=None,
+                        help="session names as listed by step_analysis.list_sessions() (default: data/old/)")
+    parser.add_argument("--alpha", type=float, default=sa.DEFAULT_ALPHA)
+    parser.add_argument("--window", type=int, default=sa.DEFAULT_WINDOW)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fold-scaler", action="store_true", help="fold the scaler into the first layer")
+    parser.add_argument("--output", default=None, help="save the model as .npz (dashboard.py --model)")
+    parser.add_argument("--cpp", action="store_true", help="print the arrays to paste in the firmware")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    sessions = sa.list_sessions()
+    names = args.sessions or [name for name in sessions if name.startswith("old/")]
+    X, y = [], []
+    for name in names:
+        sensor_data, manual_steps = sa.load_session(*sessions[name])
+        signal = sa.preprocess(sensor_data["ax"].to_numpy(), sensor_data["ay"].to_numpy(),
+                               sensor_data["az"].to_numpy(), args.alpha, args.window)
+        features, labels, _ = sa.extract_and_label_features_by_containment(signal, manual_steps)
+        X.append(features)
+        y.append(labels)
+
+    start = time.perf_counter()
+    model = train_mlp(np.vstack(X), np.concatenate(y), epochs=args.epochs, seed=args.seed, verbose=args.verbose)
+    print(f"Trained on {sum(len(labels) for labels in y)} intervals in {time.perf_counter() - start:.2f} s")
+    if args.fold_scaler:
+        model = fold_scaler(model)
+
+    if args.output:
+        model.save(args.output)
+        print(f"Model written to {args.output}")
+    if args.cpp:
+        print(export_cpp(model))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Parsing of the text samples streamed by main.ino over BLE.
+
+Each notification carries one "ax,ay,az,STATE,ultrasound,stepdetected"
+record (see the sprintf in main.ino), but notifications can be split or
+merged, so the parser works on an accumulated text buffer.
+"""
+import re
+
+SAMPLE_RE = re.compile(r'(-?\d+\.\d+),(-?\d+\.\d+),(-?\d+\.\d+),([A-Z_]+),(-?\d+\.\d+),(\d+)')
+
+# Keep the buffer bounded if the stream is garbage
+MAX_BUFFER = 500
+KEEP_BUFFER = 200
+
+
+def parse_samples(buffer):
+    """
+    Extracts every complete sample from buffer.
+
+    Args:
+        buffer (str): Text received so far (previous leftover + new data).
+    Returns:
+        tuple: (samples, leftover) where samples is a list of
+               (ax, ay, az, state, step_length, step_detected) tuples and
+               leftover is the unparsed tail to prepend to the next notification.
+    """
+    samples = []
+    end = 0
+    for match in SAMPLE_RE.finditer(buffer):
+        samples.append((
+            float(match.group(1)),
+            float(match.group(2)),
+            float(match.group(3)),
+            match.group(4),
+            float(match.group(5)),
+            int(match.group(6)),
+        ))
+        end = match.end()
+
+    leftover = buffer[end:]
+    if len(leftover) > MAX_BUFFER:
+        leftover = leftover[-KEEP_BUFFER:]
+    return samples, leftover
@@ -0,0 +1,260 @@
+"""
+Random-access queries over the recorded sessions.
+
+build_store() converts each session of step_analysis.list_sessions() once
+into a .npy sample matrix (n, columns) float32 plus the manual steps, next to
+a small meta.json. Queries then memory-map those files and return NumPy
+views: a (session, sample range) or (session, time range) request only
+touches the pages of that range, instead of parsing the whole CSV into
+pandas.
+
+The OS page cache keeps recently read blocks; the store itself keeps an LRU
+of at most max_open mapped sessions so hundreds of sessions can be queried
+without exhausting file handles.
+
+Usage:
+    store = SessionStore()          # builds/refreshes the store if needed
+    window = store.window("old/andre", 1000, 1500, columns=["ax", "ay", "az"])
+    steps = store.steps("old/andre", 1000, 1500)
+"""
+import json
+import os
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import step_analysis as sa
+from step_features import HIGH_RATE_HZ
+
+# ==============================
+# CONFIG
+# ==============================
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".session_store")
+SAMPLES_FILE = "samples.npy"
+STEPS_FILE = "manual_steps.npy"
+META_FILE = "meta.json"
+# Sample rates stored for sessions without a time column: main.ino, and the
+# operate_highmode.ino captures under data/old
+SAMPLE_RATE_HZ = 200.0
+HIGH_RATE_PREFIX = "old/"
+MAX_OPEN = 16
+CSV_CHUNK_ROWS = 1 << 16
+
+
+# ==========================================================
+# BUILD
+# ==========================================================
+def _session_dir(store_dir, name):
+    return os.path.join(store_dir, *name.split("/"))
+
+
+def _count_rows(csv_path):
+    with open(csv_path, "rb") as f:
+        lines = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            lines += 1
+    return lines - 1  # header
+
+
+def session_sample_rate(name):
+    """Sample rate of a session, from where it is stored in data/."""
+    return HIGH_RATE_HZ if name.startswith(HIGH_RATE_PREFIX) else SAMPLE_RATE_HZ
+
+
+def _mtime(path):
+    return os.path.getmtime(path) if path else None
+
+
+def _up_to_date(meta, sensor_csv, manual_csv, sample_rate):
+    """True if meta.json was written from these files (labels included) at this sample rate."""
+    manual_mtime = _mtime(manual_csv)
+    return (meta["source_mtime"] >= os.path.getmtime(sensor_csv)
+            and meta.get("sample_rate") == sample_rate
+            and (manual_mtime is None or (meta.get("manual_mtime") or 0) >= manual_mtime))
+
+
+def convert_session(sensor_csv, manual_csv, out_dir, sample_rate=SAMPLE_RATE_HZ):
+    """
+    Writes one session as samples.npy (numeric CSV columns, float32), manual_steps.npy and meta.json.
+
+    The CSV is streamed in chunks straight into the .npy, so sessions bigger
+    than memory can be converted.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    n_rows = _count_rows(sensor_csv)
+    columns = None
+    samples = None
+    row = 0
+    for chunk in pd.read_csv(sensor_csv, chunksize=CSV_CHUNK_ROWS):
+        if columns is None:
+            columns = [c for c in chunk.columns if pd.api.types.is_numeric_dtype(chunk[c])]
+            samples = np.lib.format.open_memmap(os.path.join(out_dir, SAMPLES_FILE), mode="w+",
+                                                dtype=np.float32, shape=(n_rows, len(columns)))
+        samples[row:row + len(chunk)] = chunk[columns].to_numpy(dtype=np.float32)
+        row += len(chunk)
+    if samples is None:
+        raise ValueError(f"{sensor_csv} has no rows")
+    samples.flush()
+    del samples
+
+    manual_steps = np.zeros(0, dtype=np.int64)
+    if manual_csv is not None:
+        manual_steps = np.sort(pd.read_csv(manual_csv)["sample_number"].to_numpy(dtype=np.int64))
+    np.save(os.path.join(out_dir, STEPS_FILE), manual_steps)
+
+    meta = {
+        "sensor_csv": os.path.abspath(sensor_csv),
+        "manual_csv": os.path.abspath(manual_csv) if manual_csv else None,
+        "source_mtime": os.path.getmtime(sensor_csv),
+        "manual_mtime": _mtime(manual_csv),
+        "n_samples": row,
+        "columns": columns,
+        "sample_rate": sample_rate,
+    }
+    with open(os.path.join(out_dir, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def build_store(store_dir=STORE_DIR, data_dir=sa.DATA_DIR, sample_rate=None, force=False):
+    """
+    Converts every labelled session of data_dir that is missing or older than its CSVs.
+
+    Args:
+        sample_rate (float): Rate stored for every session, default session_sample_rate().
+
+    Returns:
+        list: Names of the sessions (re)converted.
+    """
+    converted = []
+    for name, (sensor_csv, manual_csv) in sa.list_sessions(data_dir).items():
+        rate = sample_rate or session_sample_rate(name)
+        out_dir = _session_dir(store_dir, name)
+        meta_path = os.path.join(out_dir, META_FILE)
+        if not force and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                if _up_to_date(json.load(f), sensor_csv, manual_csv, rate):
+                    continue
+        if os.path.isdir(out_dir):
+            shutil.rmtree(out_dir)
+        convert_session(sensor_csv, manual_csv, out_dir, rate)
+        converted.append(name)
+    return converted
+
+
+# ==========================================================
+# QUERIES
+# ==========================================================
+class SessionStore:
+    """
+    Memory-mapped, read-only access to the converted sessions.
+
+    Args:
+        store_dir (str): Directory written by build_store().
+        max_open (int): Sessions kept mapped at the same time (LRU).
+        build (bool): Run build_store() first so the store matches data/.
+    """
+
+    def __init__(self, store_dir=STORE_DIR, max_open=MAX_OPEN, build=True):
+        self.store_dir = store_dir
+        self.max_open = max_open
+        if build:
+            build_store(store_dir)
+        self._open = OrderedDict()
+
+    def sessions(self):
+        """Names of the stored sessions."""
+        names = []
+        for root, _, files in os.walk(self.store_dir):
+            if META_FILE in files:
+                names.append(os.path.relpath(root, self.store_dir).replace(os.sep, "/"))
+        return sorted(names)
+
+    def _get(self, name):
+        """(meta, samples memmap, steps memmap) of a session, through the LRU."""
+        if name in self._open:
+            self._open.move_to_end(name)
+            return self._open[name]
+
+        session_dir = _session_dir(self.store_dir, name)
+        meta_path = os.path.join(session_dir, META_FILE)
+        if not os.path.exists(meta_path):
+            raise KeyError(f"Unknown session '{name}'")
+        with open(meta_path) as f:
+            meta = json.load(f)
+        entry = (meta,
+                 np.load(os.path.join(session_dir, SAMPLES_FILE), mmap_mode="r"),
+                 np.load(os.path.join(session_dir, STEPS_FILE), mmap_mode="r"))
+        self._open[name] = entry
+        if len(self._open) > self.max_open:
+            self._open.popitem(last=False)
+        return entry
+
+    def info(self, name):
+        return dict(self._get(name)[0])
+
+    def _columns(self, meta, columns):
+        """Index (slice when possible, so the result stays a view) of the requested columns."""
+        if columns is None:
+            return slice(None)
+        if isinstance(columns, str):
+            return meta["columns"].index(columns)
+        idx = [meta["columns"].index(c) for c in columns]
+        if idx == list(range(idx[0], idx[-1] + 1)):
+            return slice(idx[0], idx[-1] + 1)
+        return idx
+
+    def window(self, name, start, stop, columns=None):
+        """
+        Samples [start, stop) of a session.
+
+        Args:
+            columns: None for all, a column name for a 1-D result, or a list of
+                     names. Adjacent columns (e.g. ax, ay, az) give a view,
+                     others a copy of just the range.
+        Returns:
+            np.array: Read-only view on the memory-mapped samples.
+        """
+        meta, samples, _ = self._get(name)
+        start = max(0, int(start))
+        stop = min(meta["n_samples"], int(stop))
+        return samples[start:max(start, stop), self._columns(meta, columns)]
+
+    def sample_range(self, name, t0, t1):
+        """[start, stop) sample indices covering the time range [t0, t1) seconds."""
+        meta, samples, _ = self._get(name)
+        if "t" in meta["columns"]:
+            t = samples[:, meta["columns"].index("t")]
+            return int(np.searchsorted(t, t0, side="left")), int(np.searchsorted(t, t1, side="left"))
+        rate = meta["sample_rate"]
+        return int(np.ceil(t0 * rate)), int(np.ceil(t1 * rate))
+
+    def time_window(self, name, t0, t1, columns=None):
+        """Samples recorded in [t0, t1) seconds, see window()."""
+        return self.window(name, *self.sample_range(name, t0, t1), columns=columns)
+
+    def steps(self, name, start=0, stop=None):
+        """Manual step sample numbers in [start, stop)."""
+        meta, _, steps = self._get(name)
+        stop = meta["n_samples"] if stop is None else stop
+        return steps[np.searchsorted(steps, start, side="left"):np.searchsorted(steps, stop, side="left")]
+
+    def windows(self, name, starts, length, columns=None):
+        """
+        Fixed-length windows starting at each of `starts` (e.g. training examples).
+
+        Only the pages under the windows are read; windows running past the
+        end of the session are dropped.
+
+        Returns:
+            np.array: (n_windows, length, n_columns) array (or (n_windows, length) for one column).
+        """
+        meta, samples, _ = self._get(name)
+        starts = np.asarray(starts, dtype=np.int64)
+        starts = starts[(starts >= 0) & (starts + length <= meta["n_samples"])]
+        view = samples[:, self._columns(meta, columns)]
+        return np.stack([view[s:s + length] for s in starts]) if len(starts) \
+            else np.zeros((0, length) + view.shape[1:], dtype=view.dtype)
@@ -0,0 +1,195 @@
+"""
+Decimated access to whole sessions for plotting and labelling.
+
+A 90k+ sample session is too much to redraw on every pan, but a plot is only
+~2000 pixels wide. MinMaxIndex keeps a pyramid of per-bucket min/max values
+(buckets of factor, factor^2, ... samples); a query for any sample range
+picks the finest level that fits the requested number of points and returns
+the min/max envelope, which looks exactly like the full-resolution curve at
+that zoom. Ranges short enough are returned raw.
+
+StepLabels is the editable list of manual step sample numbers used by
+label_tool.py (add/move/delete with undo, saved in the manual_step_samples
+format of get_data.py).
+
+Usage:
+    index = MinMaxIndex(signal)
+    x, y = index.query(0, len(signal), max_points=2000)
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# ==============================
+# CONFIG
+# ==============================
+DECIMATION_FACTOR = 4
+MAX_POINTS = 4000
+UNDO_DEPTH = 200
+
+
+# ==========================================================
+# MIN/MAX INDEX
+# ==========================================================
+class MinMaxIndex:
+    """
+    Min/max pyramid of a 1-D signal.
+
+    Args:
+        values (np.array): Signal to index (kept by reference for raw queries).
+        factor (int): Samples per bucket of the first level, and ratio between levels.
+    """
+
+    def __init__(self, values, factor=DECIMATION_FACTOR):
+        self.values = np.asarray(values)
+        self.factor = factor
+        self.levels = []  # (bucket size, mins, maxs)
+        mins = maxs = self.values
+        size = 1
+        while len(mins) > 1:
+            starts = np.arange(0, len(mins), factor)
+            # fmin/fmax skip NaN, a bucket is only NaN when all of it is
+            mins = np.fmin.reduceat(mins, starts)
+            maxs = np.fmax.reduceat(maxs, starts)
+            size *= factor
+            self.levels.append((size, mins, maxs))
+
+    def __len__(self):
+        return len(self.values)
+
+    def query(self, start, stop, max_points=MAX_POINTS):
+        """
+        Curve of samples [start, stop) with at most ~max_points points.
+
+        Returns:
+            tuple: (x, y) arrays. Raw samples when they fit, otherwise two
+                   points (min then max) at the centre of every bucket.
+        """
+        start = max(0, int(np.floor(start)))
+        stop = min(len(self.values), int(np.ceil(stop)))
+        if stop <= start:
+            return np.zeros(0), np.zeros(0, dtype=self.values.dtype)
+        if stop - start <= max_points:
+            return np.arange(start, stop, dtype=np.float64), self.values[start:stop]
+
+        for size, mins, maxs in self.levels:
+            if 2 * ((stop - start) // size + 2) <= max_points:
+                break
+        first = start // size
+        last = -(-stop // size)
+        centres = (np.arange(first, last) * size + size / 2.0).clip(max=len(self.values) - 1)
+        x = np.repeat(centres, 2)
+        y = np.empty(len(x), dtype=mins.dtype)
+        y[0::2] = mins[first:last]
+        y[1::2] = maxs[first:last]
+        return x, y
+
+    def value_range(self, start, stop):
+        """(min, max) of samples [start, stop) (edge buckets may widen it slightly), for autoscaling."""
+        _, y = self.query(start, stop, max_points=MAX_POINTS)
+        return (float(np.nanmin(y)), float(np.nanmax(y))) if len(y) else (0.0, 0.0)
+
+
+# ==========================================================
+# LABELS
+# ==========================================================
+def read_manual_steps(path):
+    """Sample numbers of a manual_step_samples CSV (empty if the file does not exist yet)."""
+    if path is None or not os.path.exists(path):
+        return np.zeros(0, dtype=np.int64)
+    return np.sort(pd.read_csv(path)["sample_number"].to_numpy(dtype=np.int64))
+
+
+def write_manual_steps(path, steps):
+    """Writes sample numbers in the get_data.py format, replacing the file atomically."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write("sample_number\n")
+        for step in steps:
+            f.write(f"{int(step)}\n")
+    os.replace(tmp_path, path)
+
+
+class StepLabels:
+    """
+    Sorted manual step labels with undo.
+
+    Args:
+        steps (np.array): Initial sample numbers.
+        n_samples (int): Session length, labels are clipped to [0, n_samples).
+    """
+
+    def __init__(self, steps, n_samples):
+        self.steps = np.unique(np.asarray(steps, dtype=np.int64))
+        self.n_samples = n_samples
+        self.undo_stack = []
+        self.modified = False
+
+    def __len__(self):
+        return len(self.steps)
+
+    def _push(self):
+        self.undo_stack.append(self.steps.copy())
+        del self.undo_stack[:-UNDO_DEPTH]
+        self.modified = True
+
+    def _clip(self, sample):
+        return int(min(max(round(sample), 0), self.n_samples - 1))
+
+    def nearest(self, sample, tolerance):
+        """Index of the label closest to sample if it is within tolerance samples, else None."""
+        if len(self.steps) == 0:
+            return None
+        k = int(np.searchsorted(self.steps, sample))
+        best = min((i for i in (k - 1, k) if 0 <= i < len(self.steps)),
+                   key=lambda i: abs(self.steps[i] - sample))
+        return best if abs(self.steps[best] - sample) <= tolerance else None
+
+    def add(self, sample):
+        """Adds a label (no-op if there is one at that sample). Returns its index."""
+        sample = self._clip(sample)
+        k = int(np.searchsorted(self.steps, sample))
+        if k < len(self.steps) and self.steps[k] == sample:
+            return k
+        self._push()
+        self.steps = np.insert(self.steps, k, sample)
+        return k
+
+    def delete(self, index):
+        self._push()
+        self.steps = np.delete(self.steps, index)
+
+    def move(self, index, sample, record=True):
+        """
+        Moves a label, keeping the list sorted (a label dropped on another one merges with it).
+
+        Args:
+            record (bool): Push an undo step; a drag records only its first move.
+        Returns:
+            int: New index of the label.
+        """
+        sample = self._clip(sample)
+        if record:
+            self._push()
+        steps = np.delete(self.steps, index)
+        k = int(np.searchsorted(steps, sample))
+        if k < len(steps) and steps[k] == sample:
+            self.steps = steps
+            return k
+        self.steps = np.insert(steps, k, sample)
+        self.modified = True
+        return k
+
+    def undo(self):
+        if self.undo_stack:
+            self.steps = self.undo_stack.pop()
+            self.modified = True
+
+    def visible(self, start, stop):
+        """Labels in [start, stop)."""
+        return self.steps[np.searchsorted(self.steps, start):np.searchsorted(self.steps, stop)]
+
+    def save(self, path):
+        write_manual_steps(path, self.steps)
+        self.modified = False
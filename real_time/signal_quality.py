@@ -0,0 +1,358 @@
+"""
+Signal quality flags for the live stream and the recorded sessions.
+
+Every sample gets a bit mask of the problems seen at that point:
+
+    SATURATED           an axis at the accelerometer full scale (clipped)
+    FROZEN              the same ax/ay/az repeated for FROZEN_RUN samples
+    OUT_OF_RANGE        NaN/inf or an axis beyond the full scale (corrupted text)
+    DEAD                rolling variance of the magnitude below the sensor noise floor
+    NOISY               rolling variance far above any walking/running signal
+    STALL               gap between arrivals longer than STALL_GAP_S (BLE)
+    ULTRASOUND_DROPOUT  step length < 0, > ULTRASOUND_MAX_CM or NaN (e.g. -401.12)
+
+SignalQualityMonitor does it online in O(1) per sample (running sums over a
+ring buffer, a run-length counter and the last arrival time), quality_flags()
+gives the same flags for a whole recording with NumPy. bad_regions() merges
+the BAD samples into padded intervals, so the detector and the statistics can
+drop the candidates and manual steps inside them instead of scoring garbage.
+
+Usage:
+    python signal_quality.py
+    python signal_quality.py --sessions old/xico old/500steps_xico --pad 100
+"""
+import argparse
+import math
+
+import numpy as np
+
+# ==============================
+# CONFIG
+# ==============================
+SATURATED = 1
+FROZEN = 2
+OUT_OF_RANGE = 4
+DEAD = 8
+NOISY = 16
+STALL = 32
+ULTRASOUND_DROPOUT = 64
+
+FLAG_NAMES = {
+    SATURATED: "saturated",
+    FROZEN: "frozen",
+    OUT_OF_RANGE: "out_of_range",
+    DEAD: "dead",
+    NOISY: "noisy",
+    STALL: "stall",
+    ULTRASOUND_DROPOUT: "ultrasound_dropout",
+}
+# Flags that make the accelerations unusable for step detection. A bad
+# ultrasound reading only invalidates the step length.
+BAD = SATURATED | FROZEN | OUT_OF_RANGE | DEAD | NOISY | STALL
+
+ACC_RANGE_G = 8.0  # LSM9DS1 range set in main.ino (FS_XL = 11 in CTRL_REG6_XL)
+STANDARD_RANGES_G = (2.0, 4.0, 8.0, 16.0)
+# Fraction of the full scale from which a reading counts as clipped
+SATURATION_FRACTION = 0.995
+FROZEN_RUN = 10
+VARIANCE_WINDOW = 50          # 0.25 s at 200 Hz
+DEAD_VARIANCE = 1e-7          # g^2, the quietest recordings are above 2e-6
+NOISY_VARIANCE = 2.0          # g^2, walking stays below 0.3
+STALL_GAP_S = 0.25
+ULTRASOUND_MAX_CM = 400.0     # HC-SR04 range
+# Samples added on each side of a bad region (filter settling, SMA window)
+REGION_PAD = 100
+
+
+def infer_full_scale(ax, ay, az, ranges=STANDARD_RANGES_G):
+    """Smallest accelerometer range that holds every sample (old sessions were recorded at +-4 g and +-8 g)."""
+    peak = np.nanmax(np.abs(np.column_stack((ax, ay, az))))
+    for full_scale in ranges:
+        if peak <= full_scale:
+            return full_scale
+    return ranges[-1]
+
+
+def flag_names(flags):
+    """Names of the bits set in a flag mask."""
+    return [name for bit, name in FLAG_NAMES.items() if flags & bit]
+
+
+# ==========================================================
+# ONLINE
+# ==========================================================
+class SignalQualityMonitor:
+    """
+    Flags the samples of a live stream one at a time.
+
+    Args:
+        full_scale (float): Accelerometer range in g.
+        frozen_run (int): Identical samples in a row before FROZEN is raised.
+        variance_window (int): Samples of the rolling magnitude variance.
+        dead_variance, noisy_variance (float): DEAD/NOISY thresholds in g^2.
+        stall_gap (float): Longest normal gap between arrivals, in seconds.
+    """
+
+    def __init__(self, full_scale=ACC_RANGE_G, frozen_run=FROZEN_RUN, variance_window=VARIANCE_WINDOW,
+                 dead_variance=DEAD_VARIANCE, noisy_variance=NOISY_VARIANCE, stall_gap=STALL_GAP_S):
+        self.saturation = SATURATION_FRACTION * full_scale
+        self.full_scale = full_scale
+        self.frozen_run = frozen_run
+        self.variance_window = variance_window
+        self.dead_variance = dead_variance
+        self.noisy_variance = noisy_variance
+        self.stall_gap = stall_gap
+        self.counts = dict.fromkeys(FLAG_NAMES, 0)
+        self.reset()
+
+    def reset(self):
+        """Forgets the history (e.g. after a reconnection); the flag counts are kept."""
+        self.last = None
+        self.run = 0
+        self.last_arrival = None
+        self.ring = [0.0] * self.variance_window
+        self.filled = 0
+        self.head = 0
+        self.s1 = 0.0
+        self.s2 = 0.0
+
+    def update(self, ax, ay, az, ultrasound=None, arrival=None):
+        """
+        Flags of one sample.
+
+        Args:
+            ultrasound (float): Step length column, if the stream has one.
+            arrival (float): Arrival time in seconds, for the STALL check.
+        Returns:
+            int: Bit mask of the module flags (0 = clean).
+        """
+        flags = 0
+        if not (math.isfinite(ax) and math.isfinite(ay) and math.isfinite(az)):
+            flags |= OUT_OF_RANGE
+            self.run = 0
+            self.last = None
+        else:
+            peak = max(abs(ax), abs(ay), abs(az))
+            if peak > self.full_scale:
+                flags |= OUT_OF_RANGE
+            elif peak >= self.saturation:
+                flags |= SATURATED
+
+            sample = (ax, ay, az)
+            self.run = self.run + 1 if sample == self.last else 1
+            self.last = sample
+            if self.run >= self.frozen_run:
+                flags |= FROZEN
+
+            # Magnitude minus 1 g keeps the running sums small (less cancellation)
+            value = math.sqrt(ax * ax + ay * ay + az * az) - 1.0
+            old = self.ring[self.head]
+            self.ring[self.head] = value
+            self.head += 1
+            if self.filled < self.variance_window:
+                self.filled += 1
+                self.s1 += value
+                self.s2 += value * value
+            else:
+                self.s1 += value - old
+                self.s2 += value * value - old * old
+            if self.head == self.variance_window:
+                # Recompute once per lap so rounding errors never pile up
+                self.head = 0
+                if self.filled == self.variance_window:
+                    self.s1 = math.fsum(self.ring)
+                    self.s2 = math.fsum(v * v for v in self.ring)
+            if self.filled == self.variance_window:
+                n = self.variance_window
+                variance = max(0.0, (self.s2 - self.s1 * self.s1 / n) / (n - 1))
+                if variance < self.dead_variance:
+                    flags |= DEAD
+                elif variance > self.noisy_variance:
+                    flags |= NOISY
+
+        if arrival is not None:
+            if self.last_arrival is not None and arrival - self.last_arrival > self.stall_gap:
+                flags |= STALL
+            self.last_arrival = arrival
+
+        if ultrasound is not None and not (0.0 <= ultrasound <= ULTRASOUND_MAX_CM):
+            flags |= ULTRASOUND_DROPOUT
+
+        if flags:
+            for bit in self.counts:
+                if flags & bit:
+                    self.counts[bit] += 1
+        return flags
+
+    def status_line(self):
+        """Compact summary of the flag counts for the dashboard status bar."""
+        parts = [f"{FLAG_NAMES[bit]} {count}" for bit, count in self.counts.items() if count]
+        return "quality: " + (", ".join(parts) if parts else "ok")
+
+
+# ==========================================================
+# OFFLINE
+# ==========================================================
+def _run_lengths(same):
+    """Length of the run of True values ending at each position (+1, like the online counter)."""
+    idx = np.arange(len(same))
+    last_break = np.maximum.accumulate(np.where(~same, idx, -1))
+    return idx - last_break + 1
+
+
+def quality_flags(ax, ay, az, ultrasound=None, t=None, full_scale=ACC_RANGE_G, frozen_run=FROZEN_RUN,
+                  variance_window=VARIANCE_WINDOW, dead_variance=DEAD_VARIANCE,
+                  noisy_variance=NOISY_VARIANCE, stall_gap=STALL_GAP_S):
+    """
+    Flags of every sample of a recording, the same as feeding it to SignalQualityMonitor.
+
+    Args:
+        ultrasound (np.array): Optional step length column.
+        t (np.array): Optional arrival/sample times in seconds.
+    Returns:
+        np.array: uint8 flag mask per sample.
+    """
+    acc = np.column_stack((ax, ay, az)).astype(np.float64)
+    n = len(acc)
+    flags = np.zeros(n, dtype=np.uint8)
+
+    finite = np.isfinite(acc).all(axis=1)
+    flags[~finite] |= OUT_OF_RANGE
+    with np.errstate(invalid="ignore"):
+        peak = np.abs(acc).max(axis=1)
+    over = finite & (peak > full_scale)
+    flags[over] |= OUT_OF_RANGE
+    flags[finite & ~over & (peak >= SATURATION_FRACTION * full_scale)] |= SATURATED
+
+    # Run of identical samples; a non-finite sample breaks the run
+    same = np.zeros(n, dtype=bool)
+    if n > 1:
+        same[1:] = (acc[1:] == acc[:-1]).all(axis=1) & finite[1:] & finite[:-1]
+    run = _run_lengths(same)
+    flags[finite & (run >= frozen_run)] |= FROZEN
+
+    # Rolling variance over the last variance_window finite samples
+    finite_idx = np.flatnonzero(finite)
+    if len(finite_idx) >= variance_window:
+        value = np.sqrt((acc[finite_idx] ** 2).sum(axis=1)) - 1.0
+        c1 = np.concatenate(([0.0], np.cumsum(value)))
+        c2 = np.concatenate(([0.0], np.cumsum(value * value)))
+        s1 = c1[variance_window:] - c1[:-variance_window]
+        s2 = c2[variance_window:] - c2[:-variance_window]
+        variance = np.maximum(0.0, (s2 - s1 * s1 / variance_window) / (variance_window - 1))
+        at = finite_idx[variance_window - 1:]
+        flags[at[variance < dead_variance]] |= DEAD
+        flags[at[variance > noisy_variance]] |= NOISY
+
+    if t is not None and n > 1:
+        t = np.asarray(t, dtype=np.float64)
+        flags[1:][np.diff(t) > stall_gap] |= STALL
+
+    if ultrasound is not None:
+        ultrasound = np.asarray(ultrasound, dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            flags[~((ultrasound >= 0.0) & (ultrasound <= ULTRASOUND_MAX_CM))] |= ULTRASOUND_DROPOUT
+    return flags
+
+
+def session_flags(sensor_data, full_scale=None, **kwargs):
+    """
+    quality_flags() of a loaded session (step_analysis.load_session()).
+
+    The ultrasound and t columns are used when present; full_scale=None
+    infers the range the session was recorded with.
+    """
+    ax, ay, az = (sensor_data[c].to_numpy(dtype=np.float64) for c in ("ax", "ay", "az"))
+    if full_scale is None:
+        full_scale = infer_full_scale(ax, ay, az)
+    ultrasound = sensor_data["ultrasound"].to_numpy() if "ultrasound" in sensor_data else None
+    t = sensor_data["t"].to_numpy() if "t" in sensor_data else None
+    return quality_flags(ax, ay, az, ultrasound, t, full_scale=full_scale, **kwargs)
+
+
+# ==========================================================
+# BAD REGIONS
+# ==========================================================
+def bad_regions(flags, mask=BAD, pad=REGION_PAD):
+    """
+    Merged [start, stop) sample ranges around the samples with any `mask` flag.
+
+    Returns:
+        np.array: (n, 2) int array, sorted and non overlapping.
+    """
+    flags = np.asarray(flags)
+    bad = (flags & mask) != 0
+    if not bad.any():
+        return np.zeros((0, 2), dtype=np.int64)
+    edges = np.diff(np.concatenate(([0], bad.astype(np.int8), [0])))
+    starts = np.maximum(np.flatnonzero(edges == 1) - pad, 0)
+    stops = np.minimum(np.flatnonzero(edges == -1) + pad, len(flags))
+    # Padding can make neighbouring regions overlap: merge them
+    new_region = np.concatenate(([True], starts[1:] > np.maximum.accumulate(stops)[:-1]))
+    merged_stops = np.maximum.reduceat(stops, np.flatnonzero(new_region))
+    return np.column_stack((starts[new_region], merged_stops)).astype(np.int64)
+
+
+def in_regions(samples, regions):
+    """Boolean mask of the sample numbers falling inside any region."""
+    samples = np.asarray(samples)
+    if len(regions) == 0:
+        return np.zeros(samples.shape, dtype=bool)
+    k = np.searchsorted(regions[:, 0], samples, side="right") - 1
+    return (k >= 0) & (samples < regions[np.maximum(k, 0), 1])
+
+
+def overlaps_regions(intervals, regions):
+    """Boolean mask of the [start, end] intervals touching any region."""
+    intervals = np.asarray(intervals).reshape(-1, 2) if len(intervals) else np.zeros((0, 2), dtype=np.int64)
+    if len(regions) == 0:
+        return np.zeros(len(intervals), dtype=bool)
+    # First region ending after the interval start must start at or before its end
+    k = np.searchsorted(regions[:, 1], intervals[:, 0], side="right")
+    hit = k < len(regions)
+    hit[hit] = regions[k[hit], 0] <= intervals[hit, 1]
+    return hit
+
+
+def drop_bad(intervals, manual_steps, regions):
+    """
+    Removes the candidate intervals and the manual steps inside bad regions.
+
+    Returns:
+        tuple: (kept intervals, kept manual steps, boolean mask of the kept intervals)
+    """
+    intervals = np.asarray(intervals)
+    keep = ~overlaps_regions(intervals, regions)
+    manual_steps = np.asarray(manual_steps)
+    return intervals[keep], manual_steps[~in_regions(manual_steps, regions)], keep
+
+
+def main():
+    import step_analysis as sa
+
+    parser = argparse.ArgumentParser(description="Bad regions of the recorded sessions")
+    parser.add_argument("--sessions", nargs="+", default=None, help="default: every labelled session")
+    parser.add_argument("--full-scale", type=float, default=None,
+                        help="accelerometer range in g (default: inferred per session)")
+    parser.add_argument("--pad", type=int, default=REGION_PAD)
+    parser.add_argument("--verbose", action="store_true", help="list every region")
+    args = parser.parse_args()
+
+    sessions = sa.list_sessions()
+    for name in args.sessions or sessions:
+        sensor_data, manual_steps = sa.load_session(*sessions[name])
+        flags = session_flags(sensor_data, args.full_scale)
+        regions = bad_regions(flags, pad=args.pad)
+        counts = {FLAG_NAMES[bit]: int(((flags & bit) != 0).sum()) for bit in FLAG_NAMES}
+        n_bad = int((regions[:, 1] - regions[:, 0]).sum())
+        steps_inside = int(in_regions(manual_steps, regions).sum()) if manual_steps is not None else 0
+        print(f"{name}: {len(flags)} samples, {len(regions)} bad regions covering {n_bad} samples "
+              f"({100 * n_bad / max(1, len(flags)):.1f}%), {steps_inside} manual steps inside")
+        print("    " + ", ".join(f"{k} {v}" for k, v in counts.items() if v) if any(counts.values()) else "    clean")
+        if args.verbose:
+            for start, stop in regions:
+                print(f"    [{start}, {stop}) {', '.join(flag_names(np.bitwise_or.reduce(flags[start:stop])))}")
+
+
+if __name__ == "__main__":
+    main()
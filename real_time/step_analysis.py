@@ -0,0 +1,275 @@
+"""
+Offline step analysis, the functions from analisar/main.ipynb as a module.
+
+Same algorithms as the notebook (EMA -> SMA -> Max/Min/Max intervals ->
+features -> containment scoring) but written with NumPy so they can be
+reused by scripts, benchmarks and worker processes.
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from step_features import FEATURE_NAMES, HIGH_RATE_HZ, extract_features, interval_features
+
+# ==============================
+# CONFIG
+# ==============================
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+SENSOR_SUFFIX = "sensor_data.csv"
+MANUAL_SUFFIX = "manual_step_samples.csv"
+
+# Parameters found by the notebook's Bayesian optimisation
+DEFAULT_ALPHA = 0.02
+DEFAULT_WINDOW = 82
+DEFAULT_MIN_PEAK_INTERVAL = 74
+DEFAULT_MAX1_MIN_DIFF_BOUNDS = (0.0214, 0.1546)
+DEFAULT_MAX2_MIN_DIFF_BOUNDS = (0, 0.6653)
+DEFAULT_MAX1_MAX2_DIFF_BOUNDS = (0, 0.6557)
+
+
+# ==========================================================
+# DATA
+# ==========================================================
+def list_sessions(data_dir=DATA_DIR):
+    """
+    Finds every recording that has manual step labels.
+
+    Returns:
+        dict: session name -> (sensor_csv, manual_csv). The name is the file
+              prefix ("old/andre", "xico1"...) or "default" for the files
+              written by get_data.py.
+    """
+    sessions = {}
+    for sensor_csv in sorted(glob.glob(os.path.join(data_dir, "**", "*" + SENSOR_SUFFIX), recursive=True)):
+        manual_csv = sensor_csv[:-len(SENSOR_SUFFIX)] + MANUAL_SUFFIX
+        if not os.path.exists(manual_csv):
+            continue
+        name = os.path.relpath(sensor_csv, data_dir)[:-len(SENSOR_SUFFIX)].rstrip("_").replace(os.sep, "/")
+        sessions[name or "default"] = (sensor_csv, manual_csv)
+    return sessions
+
+
+def load_session(sensor_csv, manual_csv=None):
+    """
+    Loads a recording.
+
+    Args:
+        sensor_csv (str): CSV with at least ax, ay, az columns.
+        manual_csv (str): Optional CSV with a sample_number column.
+    Returns:
+        tuple: (sensor_data DataFrame, manual step sample numbers as np.array or None)
+    """
+    sensor_data = pd.read_csv(sensor_csv)
+    manual_steps = None
+    if manual_csv is not None:
+        manual_steps = pd.read_csv(manual_csv)["sample_number"].to_numpy()
+    return sensor_data, manual_steps
+
+
+# ==========================================================
+# FILTERING
+# ==========================================================
+def exponential_moving_average(signal, alpha):
+    """Calculates the Exponential Moving Average of a signal (first output = first input)."""
+    signal = np.asarray(signal, dtype=np.float64)
+    if len(signal) == 0:
+        return signal.copy()
+    filtered, _ = lfilter([alpha], [1.0, alpha - 1.0], signal, zi=[(1.0 - alpha) * signal[0]])
+    return filtered
+
+
+def simple_moving_average(signal, window_size):
+    """Calculates the trailing Simple Moving Average of a signal (shorter windows at the start)."""
+    signal = np.asarray(signal, dtype=np.float64)
+    cumsum = np.concatenate(([0.0], np.cumsum(signal)))
+    end = np.arange(1, len(signal) + 1)
+    start = np.maximum(0, end - window_size)
+    return (cumsum[end] - cumsum[start]) / (end - start)
+
+
+def filtered_magnitude(ax, ay, az, alpha):
+    """EMA on each axis, then the acceleration magnitude without gravity (-1 g)."""
+    ax_lp = exponential_moving_average(ax, alpha)
+    ay_lp = exponential_moving_average(ay, alpha)
+    az_lp = exponential_moving_average(az, alpha)
+    return np.sqrt(ax_lp ** 2 + ay_lp ** 2 + az_lp ** 2) - 1.0
+
+
+def preprocess(ax, ay, az, alpha=DEFAULT_ALPHA, window_size=DEFAULT_WINDOW):
+    """Full filtering chain used before peak detection (EMA -> magnitude -> SMA)."""
+    return simple_moving_average(filtered_magnitude(ax, ay, az, alpha), window_size)
+
+
+# ==========================================================
+# PEAKS / INTERVALS
+# ==========================================================
+def candidate_intervals(signal):
+    """
+    Runs the Max -> Min -> Max state machine of the notebook without any bounds.
+
+    Whether a step passes the bounds never changes the state machine (both
+    branches restart from the second max), so the candidates only depend on
+    the signal and every detector/feature extractor can filter them.
+
+    Returns:
+        np.array: (n, 3) int array of [max1_index, min_index, max2_index].
+    """
+    signal = np.asarray(signal)
+    mid = signal[1:-1]
+    is_max = (mid > signal[:-2]) & (mid > signal[2:])
+    is_min = (mid < signal[:-2]) & (mid < signal[2:])
+    extrema = np.flatnonzero(is_max | is_min)
+    extrema_is_max = is_max[extrema].tolist()
+    extrema = (extrema + 1).tolist()
+
+    triples = []
+    state = "LOOKING_FOR_FIRST_MAX"
+    max1_idx = -1
+    min_idx = -1
+    for i, peak_is_max in zip(extrema, extrema_is_max):
+        if peak_is_max:
+            if state == "LOOKING_FOR_SECOND_MAX":
+                triples.append((max1_idx, min_idx, i))
+            state = "LOOKING_FOR_MIN"
+            max1_idx = i
+        elif state == "LOOKING_FOR_MIN":
+            state = "LOOKING_FOR_SECOND_MAX"
+            min_idx = i
+
+    return np.array(triples, dtype=np.int64).reshape(-1, 3)
+
+
+def find_step_intervals_by_diff(signal,
+                                min_peak_interval,
+                                max1_min_diff_bounds,
+                                max2_min_diff_bounds,
+                                max1_max2_diff_bounds,
+                                triples=None):
+    """
+    Detects steps based on the amplitude differences between peaks in a
+    Max -> Min -> Max sequence.
+    Args:
+        signal (np.array): The input signal data.
+        min_peak_interval (int): The minimum number of samples BETWEEN the first
+                                 and second positive peaks of a single step.
+        max1_min_diff_bounds (tuple): A (lower, upper) bound for Max Peak 1 - Min Peak.
+        max2_min_diff_bounds (tuple): A (lower, upper) bound for Max Peak 2 - Min Peak.
+        max1_max2_diff_bounds (tuple): A (lower, upper) bound for |Max Peak 1 - Max Peak 2|.
+        triples (np.array): Output of candidate_intervals(signal), if already known.
+    Returns:
+        list: A list of detected step intervals in the format [sample_max_peak_1, sample_max_peak_2].
+    """
+    signal = np.asarray(signal)
+    if triples is None:
+        triples = candidate_intervals(signal)
+
+    max1_val = signal[triples[:, 0]]
+    min_val = signal[triples[:, 1]]
+    max2_val = signal[triples[:, 2]]
+    diff_max1_min = max1_val - min_val
+    diff_max2_min = max2_val - min_val
+    diff_max1_max2 = np.abs(max1_val - max2_val)
+
+    valid = ((triples[:, 2] - triples[:, 0]) >= min_peak_interval) \
+        & (max1_min_diff_bounds[0] <= diff_max1_min) & (diff_max1_min <= max1_min_diff_bounds[1]) \
+        & (max2_min_diff_bounds[0] <= diff_max2_min) & (diff_max2_min <= max2_min_diff_bounds[1]) \
+        & (max1_max2_diff_bounds[0] <= diff_max1_max2) & (diff_max1_max2 <= max1_max2_diff_bounds[1])
+
+    return triples[valid][:, [0, 2]].tolist()
+
+
+# ==========================================================
+# FEATURES
+# ==========================================================
+def label_by_containment(intervals, manual_step_samples):
+    """1 for each [start, end] interval containing at least one manual step, else 0."""
+    intervals = np.asarray(intervals).reshape(-1, 2)
+    manual = np.sort(np.asarray(manual_step_samples))
+    first_inside = np.searchsorted(manual, intervals[:, 0], side="left")
+    last_inside = np.searchsorted(manual, intervals[:, 1], side="right")
+    return (last_inside > first_inside).astype(int)
+
+
+def extract_and_label_features_by_containment(signal, manual_step_samples, gyro=None,
+                                              sample_rate=HIGH_RATE_HZ):
+    """
+    Extracts the features of every candidate interval and labels it.
+
+    Args:
+        signal (np.array): Filtered signal (see preprocess()).
+        manual_step_samples (np.array): Ground truth sample numbers.
+        gyro (tuple): Optional (gx, gy, gz) to add the gyro features of step_features.
+        sample_rate (float): Sample rate of the gyro arrays.
+    Returns:
+        tuple: (features (n, 11) or (n, 19), labels (n,), intervals (n, 2))
+    """
+    triples = candidate_intervals(signal)
+    intervals = triples[:, [0, 2]]
+    return (extract_features(signal, triples, gyro=gyro, sample_rate=sample_rate),
+            label_by_containment(intervals, manual_step_samples),
+            intervals)
+
+
+# ==========================================================
+# SCORING
+# ==========================================================
+def test_accuracy(detected_intervals, manual_steps, verbose=False):
+    """
+    Compares the detected intervals against the manually-recorded steps.
+
+    A manual step is found when it falls inside a detected interval; it is
+    only credited to the first interval containing it. Intervals must be
+    sorted and non overlapping (shared end points allowed), which is what
+    the state machine produces.
+
+    Args:
+        detected_intervals (list): [start, end] intervals of the detector.
+        manual_steps (np.array or pd.DataFrame): Ground truth sample numbers
+                                                 (or a DataFrame with 'sample_number').
+    Returns:
+        dict: true/false positives, false negatives, precision, recall, f1_score.
+    """
+    if isinstance(manual_steps, pd.DataFrame):
+        manual_steps = manual_steps["sample_number"].to_numpy()
+    manual_steps_arr = np.asarray(manual_steps)
+    intervals = np.asarray(detected_intervals, dtype=np.int64).reshape(-1, 2)
+
+    # First interval whose end is >= the step, it contains it if it starts before
+    first = np.searchsorted(intervals[:, 1], manual_steps_arr, side="left")
+    in_range = first < len(intervals)
+    is_manual_step_detected = np.zeros(len(manual_steps_arr), dtype=bool)
+    is_manual_step_detected[in_range] = intervals[first[in_range], 0] <= manual_steps_arr[in_range]
+    is_interval_a_true_positive = np.zeros(len(intervals), dtype=bool)
+    is_interval_a_true_positive[first[is_manual_step_detected]] = True
+
+    true_positives = int(np.sum(is_manual_step_detected))
+    false_negatives = len(manual_steps_arr) - true_positives
+    false_positives = len(intervals) - int(np.sum(is_interval_a_true_positive))
+
+    precision = true_positives / (true_positives + false_positives) if (true_positives + false_positives) > 0 else 0
+    recall = true_positives / (true_positives + false_negatives) if (true_positives + false_negatives) > 0 else 0
+    f1_score = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+
+    if verbose:
+        print("--- Algorithm Performance Report ---")
+        print(f"Manual Steps Found (True Positives):   {true_positives} / {len(manual_steps_arr)}")
+        print(f"Manual Steps Missed (False Negatives): {false_negatives}")
+        print(f"Extra Detections (False Positives):    {false_positives}")
+        print("-" * 36)
+        print(f"Precision: {precision:.2%}")
+        print(f"Recall:    {recall:.2%}")
+        print(f"F1-Score:  {f1_score:.4f}")
+        print("-" * 36)
+
+    return {
+        'true_positives': true_positives,
+        'false_negatives': false_negatives,
+        'false_positives': false_positives,
+        'precision': precision,
+        'recall': recall,
+        'f1_score': f1_score
+    }
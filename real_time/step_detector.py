@@ -0,0 +1,250 @@
+"""
+Host-side port of the firmware step detector.
+
+Runs the same EMA -> SMA -> Max/Min/Max state machine -> MLP pipeline as
+arduino_files/StepDetector.cpp + NeuralNetwork.cpp, sample by sample, so the
+dashboard can classify steps from the raw ax/ay/az stream instead of trusting
+the stepdetected column sent by the board.
+
+The default model is read straight from the firmware sources, so host and
+board agree without copying arrays around. A different (or bigger) model can
+be loaded from a .npz file without reflashing the Arduino.
+"""
+import math
+import os
+import re
+
+import numpy as np
+
+# ==============================
+# CONFIG
+# ==============================
+ARDUINO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "arduino_files")
+STEP_DETECTOR_CPP = os.path.join(ARDUINO_DIR, "StepDetector.cpp")
+NEURAL_NETWORK_CPP = os.path.join(ARDUINO_DIR, "NeuralNetwork.cpp")
+
+# Same values main.ino passes to setAlpha()/setWindowSize()
+DEFAULT_ALPHA = 0.0679
+DEFAULT_WINDOW_SIZE = 10
+
+LOOKING_FOR_FIRST_MAX = "LOOKING_FOR_FIRST_MAX"
+LOOKING_FOR_MIN = "LOOKING_FOR_MIN"
+LOOKING_FOR_SECOND_MAX = "LOOKING_FOR_SECOND_MAX"
+
+N_FEATURES = 11
+
+
+# ==========================================================
+# MODEL
+# ==========================================================
+def _parse_cpp_array(source, name):
+    """Returns the float values of `const float name[...] = { ... };` in source."""
+    match = re.search(r"\b" + re.escape(name) + r"\s*(\[[^=]*\])\s*=\s*\{(.*?)\};", source, re.S)
+    if match is None:
+        raise ValueError(f"array '{name}' not found")
+    shape = [int(n) for n in re.findall(r"\[(\d+)\]", match.group(1))]
+    values = [float(v.rstrip("fF")) for v in re.findall(r"[-+]?[\d.]+(?:[eE][-+]?\d+)?[fF]?", match.group(2))]
+    return np.array(values, dtype=np.float32).reshape(shape)
+
+
+def sigmoid(x):
+    """Logistic function; exp() only sees -|x|, so it never overflows."""
+    z = np.exp(-np.abs(x))
+    return np.where(x >= 0, 1.0 / (1.0 + z), z / (1.0 + z))
+
+
+class NeuralNetwork:
+    """
+    Dense ReLU network with a sigmoid output, same as NeuralNetwork.cpp.
+
+    Args:
+        weights (list): Weight matrices, W[i] has shape (in_size, out_size).
+        biases (list): Bias vectors, one per layer.
+        scaler_means (np.array): StandardScaler means applied to the features.
+        scaler_stds (np.array): StandardScaler scales applied to the features.
+    """
+
+    def __init__(self, weights, biases, scaler_means, scaler_stds):
+        self.weights = [np.asarray(W, dtype=np.float32) for W in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.scaler_means = np.asarray(scaler_means, dtype=np.float32)
+        self.scaler_stds = np.asarray(scaler_stds, dtype=np.float32)
+
+    @classmethod
+    def from_firmware(cls, step_detector_cpp=STEP_DETECTOR_CPP, neural_network_cpp=NEURAL_NETWORK_CPP):
+        """Loads the weights compiled into the board (scaler from StepDetector.cpp)."""
+        with open(step_detector_cpp) as f:
+            sd_source = f.read()
+        with open(neural_network_cpp) as f:
+            nn_source = f.read()
+
+        weights, biases = [], []
+        layer = 0
+        while re.search(rf"\bW{layer}\s*\[", nn_source):
+            weights.append(_parse_cpp_array(nn_source, f"W{layer}"))
+            biases.append(_parse_cpp_array(nn_source, f"b{layer}"))
+            layer += 1
+
+        return cls(weights, biases,
+                   _parse_cpp_array(sd_source, "SCALER_MEANS"),
+                   _parse_cpp_array(sd_source, "SCALER_STDS"))
+
+    @classmethod
+    def load(cls, path):
+        """Loads a model saved with save()."""
+        data = np.load(path)
+        n_layers = len([k for k in data.files if k.startswith("W")])
+        return cls([data[f"W{i}"] for i in range(n_layers)],
+                   [data[f"b{i}"] for i in range(n_layers)],
+                   data["scaler_means"], data["scaler_stds"])
+
+    def save(self, path):
+        arrays = {"scaler_means": self.scaler_means, "scaler_stds": self.scaler_stds}
+        for i, (W, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"W{i}"] = W
+            arrays[f"b{i}"] = b
+        np.savez(path, **arrays)
+
+    def predict_batch(self, features):
+        """Returns the step probability for each row of a (n, 11) feature matrix."""
+        h = (np.asarray(features, dtype=np.float32) - self.scaler_means) / self.scaler_stds
+        last = len(self.weights) - 1
+        for i, (W, b) in enumerate(zip(self.weights, self.biases)):
+            h = h @ W + b
+            if i < last:
+                h = np.maximum(h, 0.0)
+        return sigmoid(h[:, 0])
+
+    def predict(self, features):
+        """Returns the step probability of a single 11-feature vector."""
+        return float(self.predict_batch(np.asarray(features, dtype=np.float32)[None, :])[0])
+
+
+# ==========================================================
+# STREAMING DETECTOR
+# ==========================================================
+class StepDetector:
+    """
+    Sample-by-sample step detector, a line by line port of StepDetector::process().
+
+    Args:
+        alpha (float): EMA smoothing factor applied to each axis.
+        window_size (int): SMA window applied to the acceleration magnitude.
+        model (NeuralNetwork): Interval classifier, defaults to the firmware one.
+        threshold (float): Probability above which an interval counts as a step.
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA, window_size=DEFAULT_WINDOW_SIZE, model=None, threshold=0.5):
+        self.alpha = alpha
+        self.model = model if model is not None else NeuralNetwork.from_firmware()
+        self.threshold = threshold
+        self.set_window_size(window_size)
+        self.reset()
+
+    def set_window_size(self, size):
+        self.window_size = max(1, int(size))
+        self._sma_buffer = [0.0] * self.window_size
+        self._sma_index = 0
+        self._sma_sum = 0.0
+        self._sma_buffer_full = False
+
+    def reset(self):
+        self.set_window_size(self.window_size)
+        self.state = LOOKING_FOR_FIRST_MAX
+        self.sample_count = 0
+        self.last_probability = None
+        self._first_sample = True
+        self._ax_lp = self._ay_lp = self._az_lp = 0.0
+        self._prev_sma = 0.0
+        self._current_sma = 0.0
+        self._last_sma_value = 0.0
+        self._max1_val = 0.0
+        self._max1_sample = 0
+        self._min_val = 0.0
+        self._min_sample = 0
+
+    def features(self, max2_val, max2_sample):
+        """Builds the 11 features of the current Max1 -> Min -> Max2 candidate."""
+        val_max1 = self._max1_val
+        val_min = self._min_val
+        t1 = float(self._min_sample - self._max1_sample)
+        t2 = float(max2_sample - self._min_sample)
+        duration = t1 + t2
+
+        f3 = val_max1 - val_min
+        f4 = max2_val - val_min
+        return [
+            val_max1, val_min, max2_val,
+            f3, f4, abs(val_max1 - max2_val),
+            f3 / t1 if t1 > 0 else 0.0,
+            f4 / t2 if t2 > 0 else 0.0,
+            t1 / duration if duration > 0 else 0.0,
+            t2 / duration if duration > 0 else 0.0,
+            duration,
+        ]
+
+    def process(self, ax, ay, az):
+        """Feeds one accelerometer sample (in g). Returns True when a step is detected."""
+        step_detected = False
+        self.sample_count += 1
+
+        # EMA
+        if self._first_sample:
+            self._ax_lp, self._ay_lp, self._az_lp = ax, ay, az
+            self._first_sample = False
+        else:
+            a = self.alpha
+            self._ax_lp = a * ax + (1.0 - a) * self._ax_lp
+            self._ay_lp = a * ay + (1.0 - a) * self._ay_lp
+            self._az_lp = a * az + (1.0 - a) * self._az_lp
+
+        magnitude_lp = math.sqrt(self._ax_lp ** 2 + self._ay_lp ** 2 + self._az_lp ** 2) - 1.0
+
+        # SMA to magnitude
+        self._sma_sum -= self._sma_buffer[self._sma_index]
+        self._sma_buffer[self._sma_index] = magnitude_lp
+        self._sma_sum += magnitude_lp
+        self._sma_index += 1
+        if self._sma_index >= self.window_size:
+            self._sma_index = 0
+            self._sma_buffer_full = True
+        if not self._sma_buffer_full:
+            return False
+
+        self._prev_sma = self._current_sma
+        self._current_sma = self._sma_sum / self.window_size
+        prev_sma = self._prev_sma
+        peak_sample = self.sample_count - 1
+
+        # Local maximum
+        if prev_sma > self._current_sma and prev_sma > self._last_sma_value:
+            if self.state in (LOOKING_FOR_FIRST_MAX, LOOKING_FOR_MIN):
+                self.state = LOOKING_FOR_MIN
+                self._max1_val = prev_sma
+                self._max1_sample = peak_sample
+            elif self.state == LOOKING_FOR_SECOND_MAX:
+                self.last_probability = self.model.predict(self.features(prev_sma, peak_sample))
+                step_detected = self.last_probability > self.threshold
+
+                self.state = LOOKING_FOR_MIN
+                self._max1_val = prev_sma
+                self._max1_sample = peak_sample
+
+        # Local minimum
+        if prev_sma < self._current_sma and prev_sma < self._last_sma_value:
+            if self.state == LOOKING_FOR_MIN:
+                self.state = LOOKING_FOR_SECOND_MAX
+                self._min_val = prev_sma
+                self._min_sample = peak_sample
+
+        self._last_sma_value = prev_sma
+        return step_detected
+
+    def process_array(self, ax, ay, az):
+        """Runs a whole recording through the detector. Returns a 0/1 array per sample."""
+        out = np.zeros(len(ax), dtype=np.int8)
+        for i, (x, y, z) in enumerate(zip(np.asarray(ax, dtype=float), np.asarray(ay, dtype=float),
+                                          np.asarray(az, dtype=float))):
+            out[i] = self.process(x, y, z)
+        return out
+
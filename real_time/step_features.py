@@ -0,0 +1,120 @@
+"""
+Per-interval feature extraction for the step classifier.
+
+The 11 accelerometer features are the ones the firmware computes
+(StepDetector.cpp). The gyroscope features use the gx/gy/gz columns of the
+6-axis high-rate captures (operate_highmode.ino, 952 Hz, deg/s).
+
+Everything is computed for all intervals at once: sums come from prefix sums
+indexed by the interval bounds and maxima from np.maximum.reduceat over the
+interval index array, so there is no Python loop per interval.
+"""
+import numpy as np
+
+# operate_highmode.ino sample rate
+HIGH_RATE_HZ = 952.0
+
+FEATURE_NAMES = [
+    "max1", "min", "max2",
+    "max1_min_diff", "max2_min_diff", "max1_max2_diff",
+    "max1_min_slope", "max2_min_slope",
+    "t1_ratio", "t2_ratio", "duration",
+]
+
+GYRO_FEATURE_NAMES = [
+    "gyro_peak_rate",                               # max |w| (deg/s)
+    "gyro_rotation",                                # integral of |w| (deg)
+    "gyro_rotation_x", "gyro_rotation_y", "gyro_rotation_z",  # signed integral per axis (deg)
+    "gyro_energy_x", "gyro_energy_y", "gyro_energy_z",        # mean w^2 per axis
+]
+
+
+def interval_features(signal, triples):
+    """
+    Builds the 11 features of each Max1 -> Min -> Max2 candidate.
+
+    Args:
+        signal (np.array): Filtered signal the candidates were found on.
+        triples (np.array): (n, 3) [max1_index, min_index, max2_index].
+    Returns:
+        np.array: (n, 11) float array, columns as in FEATURE_NAMES.
+    """
+    signal = np.asarray(signal, dtype=np.float64)
+    val_max1 = signal[triples[:, 0]]
+    val_min = signal[triples[:, 1]]
+    val_max2 = signal[triples[:, 2]]
+    t1 = (triples[:, 1] - triples[:, 0]).astype(np.float64)
+    t2 = (triples[:, 2] - triples[:, 1]).astype(np.float64)
+    duration = t1 + t2
+
+    return np.column_stack([
+        val_max1, val_min, val_max2,
+        val_max1 - val_min, val_max2 - val_min, np.abs(val_max1 - val_max2),
+        (val_max1 - val_min) / t1,
+        (val_max2 - val_min) / t2,
+        t1 / duration, t2 / duration, duration,
+    ])
+
+
+def _interval_sums(values, starts, stops):
+    """Sum of values[start:stop] for every interval, from one prefix sum. values is (n,) or (n, k)."""
+    prefix = np.zeros((len(values) + 1,) + values.shape[1:], dtype=np.float64)
+    np.cumsum(values, axis=0, out=prefix[1:])
+    return prefix[stops] - prefix[starts]
+
+
+def _interval_max(values, starts, stops):
+    """Max of values[start:stop] for every (non empty) interval with a single reduceat."""
+    padded = np.append(values, values[-1:])  # reduceat indices must stay < len
+    bounds = np.column_stack([starts, stops]).ravel()
+    return np.maximum.reduceat(padded, bounds)[::2]
+
+
+def gyro_features(gx, gy, gz, intervals, sample_rate=HIGH_RATE_HZ):
+    """
+    Gyroscope features over each [start, end] interval (both ends included).
+
+    Args:
+        gx, gy, gz (np.array): Angular rates in deg/s.
+        intervals (np.array): (n, 2) [start, end] sample indices.
+        sample_rate (float): Samples per second, to integrate rates into degrees.
+    Returns:
+        np.array: (n, 8) float array, columns as in GYRO_FEATURE_NAMES.
+    """
+    gyro = np.column_stack([gx, gy, gz]).astype(np.float64)
+    intervals = np.asarray(intervals, dtype=np.int64).reshape(-1, 2)
+    if len(intervals) == 0:
+        return np.zeros((0, len(GYRO_FEATURE_NAMES)))
+
+    starts = intervals[:, 0]
+    stops = intervals[:, 1] + 1
+    lengths = (stops - starts).astype(np.float64)
+    dt = 1.0 / sample_rate
+
+    rate = np.sqrt(np.einsum("ij,ij->i", gyro, gyro))
+    sums = _interval_sums(np.column_stack([rate, gyro, gyro ** 2]), starts, stops)
+
+    return np.column_stack([
+        _interval_max(rate, starts, stops),
+        sums[:, 0] * dt,
+        sums[:, 1:4] * dt,
+        sums[:, 4:7] / lengths[:, None],
+    ])
+
+
+def extract_features(signal, triples, gyro=None, sample_rate=HIGH_RATE_HZ):
+    """
+    The 11 accelerometer features, plus the 8 gyro features when gyro is given.
+
+    Args:
+        signal (np.array): Filtered accelerometer signal.
+        triples (np.array): Candidate intervals from step_analysis.candidate_intervals().
+        gyro (tuple): Optional (gx, gy, gz) arrays aligned with the signal.
+        sample_rate (float): Sample rate of the gyro arrays.
+    Returns:
+        np.array: (n, 11) or (n, 19) float array.
+    """
+    features = interval_features(signal, triples)
+    if gyro is None:
+        return features
+    return np.hstack([features, gyro_features(*gyro, triples[:, [0, 2]], sample_rate=sample_rate)])
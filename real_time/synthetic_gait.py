@@ -0,0 +1,292 @@
+"""
+Synthetic accelerometer sessions with labelled steps.
+
+Generates ax/ay/az streams (in g) that look like the board on a walking,
+running or idle person: gravity along a random device orientation, one
+vertical oscillation per step (max -> min -> max, the shape the detector
+looks for) with a heel-strike harmonic, lateral sway at half the cadence, a
+cadence that drifts from step to step, sensor noise and gaps where samples
+were lost (like dropped BLE notifications).
+
+The step label of each cycle is the sample of its minimum, so every
+max -> min -> max cycle contains exactly one label, like the manual labels.
+
+Sessions are produced lazily in chunks, so hours-long multi-million-sample
+recordings can be streamed into the analysis code or the streaming detector
+without being held in memory.
+
+Usage:
+    python synthetic_gait.py --minutes 60 --output ../data/synthetic/hour_
+    (writes hour_sensor_data.csv and hour_manual_step_samples.csv)
+"""
+import argparse
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# ==============================
+# CONFIG
+# ==============================
+SAMPLE_RATE_HZ = 200.0  # main.ino
+CHUNK_SIZE = 1 << 16
+
+ACTIVITIES = ["idle", "walk", "run"]
+ACTIVITY_PROBABILITIES = (0.2, 0.6, 0.2)
+# Steps per minute and vertical amplitude (g) ranges of each activity
+CADENCE_RANGES = {"walk": (90.0, 125.0), "run": (150.0, 185.0)}
+AMPLITUDE_RANGES = {"walk": (0.15, 0.35), "run": (0.6, 1.2)}
+# Relative step to step cadence change (standard deviation)
+CADENCE_JITTER = 0.03
+SEGMENT_SECONDS = (10.0, 120.0)
+NOISE_G = 0.01
+
+# Sample loss: expected gaps per minute and their duration range
+GAPS_PER_MINUTE = 0.5
+GAP_SECONDS = (0.05, 2.0)
+
+GaitChunk = namedtuple("GaitChunk", ["start", "t", "ax", "ay", "az", "activity", "steps"])
+GaitChunk.__doc__ = """
+One chunk of a synthetic session.
+
+start: index of the first sample in the session. t: time of each sample in
+seconds (jumps over gaps). ax, ay, az: float32 accelerations in g.
+activity: int8 index into ACTIVITIES per sample. steps: session sample
+indices of the steps whose label falls in this chunk.
+"""
+
+
+def _orientation(rng):
+    """Random orthonormal (vertical, lateral, forward) axes of the device frame."""
+    vertical = rng.normal(size=3)
+    vertical /= np.linalg.norm(vertical)
+    lateral = np.cross(vertical, rng.normal(size=3))
+    lateral /= np.linalg.norm(lateral)
+    return vertical, lateral, np.cross(vertical, lateral)
+
+
+class GaitGenerator:
+    """
+    Lazily generated synthetic session.
+
+    Args:
+        sample_rate (float): Samples per second.
+        seed (int): Seed of the random generator, same seed -> same session.
+        activity_probabilities (tuple): Chance of idle/walk/run for each segment.
+        segment_seconds (tuple): (min, max) duration of an activity segment.
+        noise_g (float): Standard deviation of the white sensor noise.
+        gaps_per_minute (float): Expected number of sample-loss gaps per minute.
+        gap_seconds (tuple): (min, max) duration of a gap.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE_HZ, seed=None,
+                 activity_probabilities=ACTIVITY_PROBABILITIES,
+                 segment_seconds=SEGMENT_SECONDS,
+                 noise_g=NOISE_G,
+                 gaps_per_minute=GAPS_PER_MINUTE,
+                 gap_seconds=GAP_SECONDS):
+        self.sample_rate = sample_rate
+        self.activity_probabilities = np.asarray(activity_probabilities, dtype=np.float64)
+        self.activity_probabilities /= self.activity_probabilities.sum()
+        self.segment_seconds = segment_seconds
+        self.noise_g = noise_g
+        self.gaps_per_minute = gaps_per_minute
+        self.gap_seconds = gap_seconds
+        # Separate streams so the session doesn't depend on the chunk size
+        schedule_seed, noise_seed = np.random.SeedSequence(seed).spawn(2)
+        self.rng = np.random.default_rng(schedule_seed)
+        self.noise_rng = np.random.default_rng(noise_seed)
+
+        # Cycles still to be emitted, on the virtual clock (samples, gaps included)
+        self._cycle_start = np.zeros(0)
+        self._cycle_length = np.zeros(0)
+        self._cycle_amplitude = np.zeros(0)
+        self._cycle_activity = np.zeros(0, dtype=np.int8)
+        self._cycle_index = np.zeros(0, dtype=np.int64)
+        self._cycle_axes = np.zeros((0, 3, 3))
+        self._gaps = np.zeros((0, 2))
+        self._scheduled_until = 0.0
+        self._n_cycles = 0
+        self._virtual = 0      # next virtual sample
+        self._emitted = 0      # samples emitted so far
+
+    # ==========================================================
+    # SCHEDULE
+    # ==========================================================
+    def _schedule_segment(self):
+        """Appends the cycles (and gaps) of one activity segment."""
+        rng = self.rng
+        fs = self.sample_rate
+        activity = rng.choice(len(ACTIVITIES), p=self.activity_probabilities)
+        name = ACTIVITIES[activity]
+        seconds = rng.uniform(*self.segment_seconds)
+        axes = np.stack(_orientation(rng))
+
+        if name == "idle":
+            lengths = np.array([seconds * fs])
+            amplitudes = np.zeros(1)
+        else:
+            cadence = rng.uniform(*CADENCE_RANGES[name])
+            n = max(1, int(seconds * cadence / 60.0))
+            drift = np.exp(np.cumsum(rng.normal(0.0, CADENCE_JITTER, n)))
+            low, high = CADENCE_RANGES[name]
+            cadences = np.clip(cadence * drift, 0.9 * low, 1.1 * high)
+            lengths = 60.0 * fs / cadences
+            amplitudes = rng.uniform(*AMPLITUDE_RANGES[name]) * rng.uniform(0.85, 1.15, n)
+
+        starts = self._scheduled_until + np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+        self._cycle_start = np.concatenate((self._cycle_start, starts))
+        self._cycle_length = np.concatenate((self._cycle_length, lengths))
+        self._cycle_amplitude = np.concatenate((self._cycle_amplitude, amplitudes))
+        self._cycle_activity = np.concatenate((self._cycle_activity, np.full(len(lengths), activity, dtype=np.int8)))
+        self._cycle_index = np.concatenate((self._cycle_index, self._n_cycles + np.arange(len(lengths))))
+        self._cycle_axes = np.concatenate((self._cycle_axes, np.repeat(axes[None], len(lengths), axis=0)))
+        self._n_cycles += len(lengths)
+
+        segment_end = self._scheduled_until + lengths.sum()
+        n_gaps = rng.poisson(self.gaps_per_minute * seconds / 60.0)
+        if n_gaps:
+            gap_starts = rng.uniform(self._scheduled_until, segment_end, n_gaps)
+            gap_ends = gap_starts + rng.uniform(*self.gap_seconds, n_gaps) * fs
+            gaps = np.column_stack([gap_starts, gap_ends])
+            self._gaps = np.concatenate((self._gaps, gaps[np.argsort(gap_starts)]))
+        self._scheduled_until = segment_end
+
+    def _drop_before(self, virtual):
+        keep = self._cycle_start + self._cycle_length > virtual
+        self._cycle_start = self._cycle_start[keep]
+        self._cycle_length = self._cycle_length[keep]
+        self._cycle_amplitude = self._cycle_amplitude[keep]
+        self._cycle_activity = self._cycle_activity[keep]
+        self._cycle_index = self._cycle_index[keep]
+        self._cycle_axes = self._cycle_axes[keep]
+        self._gaps = self._gaps[self._gaps[:, 1] > virtual]
+
+    # ==========================================================
+    # SIGNAL
+    # ==========================================================
+    def next_chunk(self, chunk_size=CHUNK_SIZE):
+        """
+        Generates the next chunk_size virtual samples; samples falling in a
+        gap are dropped, so the chunk can be shorter.
+
+        Returns:
+            GaitChunk
+        """
+        while self._scheduled_until < self._virtual + chunk_size:
+            self._schedule_segment()
+
+        virtual = self._virtual + np.arange(chunk_size, dtype=np.float64)
+        cycle = np.searchsorted(self._cycle_start, virtual, side="right") - 1
+        phase = (virtual - self._cycle_start[cycle]) / self._cycle_length[cycle]
+        amplitude = self._cycle_amplitude[cycle]
+        stride = self._cycle_index[cycle] + phase
+        two_pi_phase = 2.0 * np.pi * phase
+
+        # Max at the start of the cycle, min in the middle, back to max at the end
+        vertical = amplitude * (np.cos(two_pi_phase) + 0.15 * np.cos(2.0 * two_pi_phase + 0.6))
+        lateral = 0.3 * amplitude * np.sin(np.pi * stride)
+        forward = 0.4 * amplitude * np.sin(two_pi_phase + np.pi / 2.0)
+
+        axes = self._cycle_axes[cycle]
+        acceleration = axes[:, 0, :] * (1.0 + vertical)[:, None] \
+            + axes[:, 1, :] * lateral[:, None] \
+            + axes[:, 2, :] * forward[:, None] \
+            + self.noise_rng.normal(0.0, self.noise_g, (chunk_size, 3))
+
+        in_gap = np.zeros(chunk_size, dtype=bool)
+        for gap_start, gap_end in self._gaps:
+            if gap_start >= virtual[-1] + 1:
+                break
+            in_gap |= (virtual >= gap_start) & (virtual < gap_end)
+        kept = ~in_gap
+        emitted_index = self._emitted + np.cumsum(kept) - 1
+
+        # Labels: the minimum of every moving cycle that starts in or before this chunk
+        labels = np.round(self._cycle_start + 0.5 * self._cycle_length).astype(np.int64)
+        moving = (self._cycle_amplitude > 0) & (labels >= self._virtual) & (labels < self._virtual + chunk_size)
+        offsets = labels[moving] - self._virtual
+        steps = emitted_index[offsets[kept[offsets]]]
+
+        chunk = GaitChunk(
+            start=self._emitted,
+            t=virtual[kept] / self.sample_rate,
+            ax=acceleration[kept, 0].astype(np.float32),
+            ay=acceleration[kept, 1].astype(np.float32),
+            az=acceleration[kept, 2].astype(np.float32),
+            activity=self._cycle_activity[cycle][kept],
+            steps=steps,
+        )
+        self._virtual += chunk_size
+        self._emitted += int(kept.sum())
+        self._drop_before(self._virtual)
+        return chunk
+
+    def chunks(self, n_samples, chunk_size=CHUNK_SIZE):
+        """Yields chunks until n_samples samples have been emitted (the last one is trimmed)."""
+        while self._emitted < n_samples:
+            start = self._emitted
+            chunk = self.next_chunk(chunk_size)
+            keep = min(len(chunk.t), n_samples - start)
+            if keep < len(chunk.t):
+                chunk = GaitChunk(chunk.start, chunk.t[:keep], chunk.ax[:keep], chunk.ay[:keep],
+                                  chunk.az[:keep], chunk.activity[:keep], chunk.steps[chunk.steps < start + keep])
+            yield chunk
+
+
+def generate_session(n_samples, sample_rate=SAMPLE_RATE_HZ, seed=None, **kwargs):
+    """
+    A whole synthetic session in memory.
+
+    Returns:
+        tuple: (DataFrame with t, ax, ay, az, activity columns, step sample numbers np.array)
+    """
+    chunks = list(GaitGenerator(sample_rate, seed, **kwargs).chunks(n_samples))
+    df = pd.DataFrame({
+        "t": np.concatenate([c.t for c in chunks]),
+        "ax": np.concatenate([c.ax for c in chunks]),
+        "ay": np.concatenate([c.ay for c in chunks]),
+        "az": np.concatenate([c.az for c in chunks]),
+        "activity": np.concatenate([c.activity for c in chunks]),
+    })
+    return df, np.concatenate([c.steps for c in chunks])
+
+
+def write_session(prefix, n_samples, sample_rate=SAMPLE_RATE_HZ, seed=None, chunk_size=CHUNK_SIZE, **kwargs):
+    """
+    Streams a session to <prefix>sensor_data.csv and <prefix>manual_step_samples.csv,
+    the file layout step_analysis.list_sessions() reads.
+    """
+    sensor_csv = prefix + "sensor_data.csv"
+    manual_csv = prefix + "manual_step_samples.csv"
+    os.makedirs(os.path.dirname(os.path.abspath(sensor_csv)), exist_ok=True)
+    generator = GaitGenerator(sample_rate, seed, **kwargs)
+    n_steps = 0
+    for i, chunk in enumerate(generator.chunks(n_samples, chunk_size)):
+        pd.DataFrame({"ax": chunk.ax, "ay": chunk.ay, "az": chunk.az}).to_csv(
+            sensor_csv, mode="w" if i == 0 else "a", header=i == 0, index=False, float_format="%.6f")
+        pd.DataFrame({"sample_number": chunk.steps}).to_csv(
+            manual_csv, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        n_steps += len(chunk.steps)
+    return sensor_csv, manual_csv, n_steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic labelled accelerometer session")
+    parser.add_argument("--output", required=True, help="file prefix, e.g. ../data/synthetic/long_")
+    parser.add_argument("--minutes", type=float, default=10.0)
+    parser.add_argument("--rate", type=float, default=SAMPLE_RATE_HZ, help="sample rate (Hz)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--noise", type=float, default=NOISE_G, help="sensor noise (g)")
+    parser.add_argument("--gaps-per-minute", type=float, default=GAPS_PER_MINUTE)
+    args = parser.parse_args()
+
+    n_samples = int(args.minutes * 60 * args.rate)
+    sensor_csv, manual_csv, n_steps = write_session(args.output, n_samples, args.rate, args.seed,
+                                                    noise_g=args.noise, gaps_per_minute=args.gaps_per_minute)
+    print(f"{n_samples} samples, {n_steps} steps -> {sensor_csv}, {manual_csv}")
+
+
+if __name__ == "__main__":
+    main()